@@ -4,11 +4,11 @@ from django.utils import timezone
 from datetime import timedelta
 from django.contrib import messages
 from django.urls import reverse
-from django.core.mail import send_mail
 from django.template.loader import render_to_string
 from .models import Invitation
 from league.models import Team
 from users.models import User
+from users.services.email_outbox import enqueue_email
 
 @transaction.atomic
 def process_invitation(request, email, role, team_id=None):
@@ -65,14 +65,13 @@ def process_invitation(request, email, role, team_id=None):
         f"Please use the following link to accept: {invite_link}"
     )
 
-    send_mail(
+    # Sent by the outbox worker, and only if the invitation is committed
+    enqueue_email(
         'You have been invited to join the AUN League',
         plain_message,
-        None,
         [email],
-        fail_silently=False,
-        html_message=html_message
+        html_body=html_message,
     )
 
-    messages.success(request, 'Invitation sent successfully.')
+    messages.success(request, 'Invitation queued for delivery.')
     return True
\ No newline at end of file
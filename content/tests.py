@@ -4,10 +4,11 @@ from django.contrib.auth import get_user_model
 from .models import Invitation
 from league.models import Team, League, SessionChoice, Coach, CoachSeasonParticipation
 import uuid
-from unittest.mock import patch, MagicMock
+from unittest.mock import MagicMock
 from django.utils import timezone
 from datetime import timedelta
 from .services import process_invitation
+from users.models import OutboundEmail
 
 User = get_user_model()
 
@@ -84,8 +85,7 @@ class ProcessInvitationTest(TestCase):
         self.user = User.objects.create_user(username='testuser', email='test@user.com', password='password', role='admin')
         self.team = Team.objects.create(name='Test Team')
 
-    @patch('content.services.send_mail')
-    def test_process_invitation_success(self, mock_send_mail):
+    def test_process_invitation_success(self):
         request = MagicMock()
         request.user = self.user
         request.build_absolute_uri.return_value = 'http://testserver/accept/some-token'
@@ -97,7 +97,7 @@ class ProcessInvitationTest(TestCase):
         
         self.assertTrue(result)
         self.assertTrue(Invitation.objects.filter(email=email, role=role, team=self.team).exists())
-        mock_send_mail.assert_called_once()
+        self.assertEqual(list(OutboundEmail.objects.values_list('to', flat=True)), [[email]])
 
     def test_process_invitation_user_exists(self):
         request = MagicMock()
@@ -120,8 +120,7 @@ class ProcessInvitationTest(TestCase):
         # Make sure we have only one invitation object
         self.assertEqual(Invitation.objects.filter(email=email).count(), 1)
 
-    @patch('content.services.send_mail')
-    def test_process_invitation_expired_invitation_deleted(self, mock_send_mail):
+    def test_process_invitation_expired_invitation_deleted(self):
         request = MagicMock()
         request.user = self.user
         request.build_absolute_uri.return_value = 'http://testserver/accept/some-token'
@@ -138,10 +137,9 @@ class ProcessInvitationTest(TestCase):
         self.assertTrue(Invitation.objects.filter(email=email, role='player', team=self.team).exists())
         # The old one should be deleted, and a new one created.
         self.assertEqual(Invitation.objects.filter(email=email).count(), 1)
-        mock_send_mail.assert_called_once()
+        self.assertEqual(OutboundEmail.objects.count(), 1)
 
-    @patch('content.services.send_mail')
-    def test_cannot_invite_when_active_invite_exists(self, mock_send_mail):
+    def test_cannot_invite_when_active_invite_exists(self):
         request = MagicMock()
         request.user = self.user
         request.build_absolute_uri.return_value = 'http://testserver/accept/some-token'
@@ -152,4 +150,4 @@ class ProcessInvitationTest(TestCase):
         result = process_invitation(request, email, 'player', self.team.id)
         self.assertFalse(result)
         # no additional sends
-        mock_send_mail.assert_not_called()
+        self.assertFalse(OutboundEmail.objects.exists())
@@ -6,8 +6,10 @@ from .models import (
     FantasyPlayer,
     FantasyMatchWeek,
     FantasyPlayerStats,
+    PlayerWeekScore,
     FantasyLeaderboard,
     FantasyTransfer,
+    PlayerOwnership,
 )
 from .services import example_scoring_rules
 
@@ -81,6 +83,15 @@ class FantasyPlayerStatsAdmin(admin.ModelAdmin):
     raw_id_fields = ("fantasy_player", "fantasy_match_week")
 
 
+@admin.register(PlayerWeekScore)
+class PlayerWeekScoreAdmin(admin.ModelAdmin):
+    list_display = ("player", "fantasy_match_week", "points", "updated_at")
+    list_filter = ("fantasy_match_week",)
+    search_fields = ("player__first_name", "player__last_name")
+    readonly_fields = ("rules_hash", "breakdown", "updated_at")
+    raw_id_fields = ("player", "fantasy_match_week")
+
+
 @admin.register(FantasyLeaderboard)
 class FantasyLeaderboardAdmin(admin.ModelAdmin):
     list_display = ("fantasy_team", "fantasy_match_week", "is_overall", "points_week", "cumulative_points", "rank", "updated_at")
@@ -96,3 +107,12 @@ class FantasyTransferAdmin(admin.ModelAdmin):
     search_fields = ("fantasy_team__name", "player_in__first_name", "player_in__last_name")
     raw_id_fields = ("fantasy_team", "fantasy_match_week", "player_in", "player_out")
 
+
+
+@admin.register(PlayerOwnership)
+class PlayerOwnershipAdmin(admin.ModelAdmin):
+    list_display = ("player", "fantasy_league", "owners")
+    list_filter = ("fantasy_league",)
+    search_fields = ("player__first_name", "player__last_name")
+    readonly_fields = ("owners",)
+    raw_id_fields = ("player", "fantasy_league")
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import django
+from django.db import connections
+from django.utils import timezone
+
+from .models import FantasyLeague, FantasyMatchWeek
+from .services import FantasyScoringService
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class LeagueWeekResult:
+    league_id: int
+    league_name: str
+    week_index: Optional[int]
+    rows: Dict[str, int]
+    seconds: float
+    error: Optional[str] = None
+
+    @property
+    def failed(self) -> bool:
+        return self.error is not None
+
+
+def _failed_result(league_id: int, week_id: int, exc: BaseException) -> LeagueWeekResult:
+    logger.error("Scoring fantasy league %s (week id %s) failed", league_id, week_id, exc_info=exc)
+    return LeagueWeekResult(
+        league_id=league_id, league_name="", week_index=None, rows={}, seconds=0.0, error=f"{type(exc).__name__}: {exc}"
+    )
+
+
+def select_league_weeks(
+    league_ids: Optional[Sequence[int]] = None, week_index: Optional[int] = None
+) -> List[Tuple[int, int]]:
+    """Return (league id, week id) pairs to score.
+
+    Uses the given week index when set, otherwise each league's current week
+    (same rule as utils.get_current_week, resolved in one query).
+    """
+    leagues = FantasyLeague.objects.all()
+    if league_ids:
+        leagues = leagues.filter(id__in=league_ids)
+    weeks = FantasyMatchWeek.objects.filter(fantasy_league__in=leagues)
+    if week_index is not None:
+        weeks = weeks.filter(index=week_index)
+    else:
+        today = timezone.now().date()
+        weeks = weeks.filter(start_date__lte=today, end_date__gte=today)
+
+    week_by_league: Dict[int, int] = {}
+    for league_id, week_id in weeks.order_by("fantasy_league_id", "index").values_list("fantasy_league_id", "id"):
+        week_by_league.setdefault(league_id, week_id)
+    return list(week_by_league.items())
+
+
+def score_league_week(league_id: int, week_id: int, dry_run: bool = False) -> LeagueWeekResult:
+    """Score one league week in this process; with dry_run only the expected row counts are computed."""
+    week = FantasyMatchWeek.objects.select_related("fantasy_league").get(id=week_id, fantasy_league_id=league_id)
+    service = FantasyScoringService(week.fantasy_league)
+
+    start = time.perf_counter()
+    rows = service.estimate_week_rows(week)
+    if not dry_run:
+        service.calculate_week(week)
+    return LeagueWeekResult(
+        league_id=league_id,
+        league_name=week.fantasy_league.name,
+        week_index=week.index,
+        rows=rows,
+        seconds=time.perf_counter() - start,
+    )
+
+
+def run_league_weeks(jobs: Sequence[Tuple[int, int]], workers: int = 1, dry_run: bool = False) -> Iterator[LeagueWeekResult]:
+    """Score league weeks serially, or sharded across a pool of `workers` processes.
+
+    Results are yielded as each league finishes. Every league is scored in its own transaction,
+    so a failing league does not roll back the others; it is yielded as a failed result and
+    the remaining leagues are still scored.
+    """
+    if workers <= 1 or len(jobs) <= 1:
+        for league_id, week_id in jobs:
+            try:
+                yield score_league_week(league_id, week_id, dry_run)
+            except Exception as exc:
+                yield _failed_result(league_id, week_id, exc)
+        return
+
+    # Workers must not inherit open sockets from this process; each one connects on first query
+    connections.close_all()
+    # django.setup is a no-op in forked workers and loads the apps in spawned ones
+    with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as pool:
+        futures = {
+            pool.submit(score_league_week, league_id, week_id, dry_run): (league_id, week_id)
+            for league_id, week_id in jobs
+        }
+        for future in as_completed(futures):
+            try:
+                yield future.result()
+            except Exception as exc:
+                yield _failed_result(*futures[future], exc)
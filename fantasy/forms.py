@@ -6,6 +6,7 @@ from django.contrib.auth import get_user_model
 from django.db.models import Count, F
 
 from league.models import Player
+from .market import change_ownership
 from .models import FantasyLeague, FantasyTeam, FantasyPlayer
 from .utils import get_current_week, is_before_deadline
 
@@ -84,6 +85,7 @@ class AddFantasyPlayerForm(forms.Form):
         # Deduct balance
         self.fantasy_team.balance = (self.fantasy_team.balance or Decimal("0")) - player.price
         self.fantasy_team.save(update_fields=["balance", "updated_at"])
+        change_ownership(self.fantasy_team.fantasy_league_id, player.id, 1)
         # Log transfer
         if week:
             from .models import FantasyTransfer
@@ -131,6 +133,7 @@ class RemoveFantasyPlayerForm(forms.Form):
         team.save(update_fields=["balance", "updated_at"])
         fp.active_to = team.fantasy_league.end_date
         fp.save(update_fields=["active_to"])
+        change_ownership(league.id, fp.player_id, -1)
 
         # Log transfer out if week exists
         if week:
@@ -1,23 +1,41 @@
-from django.core.management.base import BaseCommand
+import time
 
-from fantasy.models import FantasyLeague
-from fantasy.services import FantasyScoringService
-from fantasy.utils import get_current_week
+from django.core.management.base import BaseCommand, CommandError
+
+from fantasy.batch import run_league_weeks, select_league_weeks
 
 
 class Command(BaseCommand):
     help = "Calculate fantasy points and leaderboards for current weeks across all leagues"
 
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=1, help="Number of processes to shard leagues across (needs a database with concurrent writers, e.g. PostgreSQL)")
+        parser.add_argument("--league", type=int, action="append", dest="league_ids", help="FantasyLeague id to score (repeatable)")
+        parser.add_argument("--week", type=int, dest="week_index", help="Week index to score instead of the current week")
+        parser.add_argument("--dry-run", action="store_true", help="Report expected row counts without writing anything")
+
     def handle(self, *args, **options):
-        leagues = FantasyLeague.objects.all()
-        processed = 0
-        for league in leagues:
-            week = get_current_week(league)
-            if not week:
-                continue
-            service = FantasyScoringService(league)
-            service.calculate_week(week)
-            processed += 1
-        self.stdout.write(self.style.SUCCESS(f"Processed {processed} league(s) current week"))
+        if options["workers"] < 1:
+            raise CommandError("--workers must be at least 1")
 
+        jobs = select_league_weeks(options["league_ids"], options["week_index"])
+        if not jobs:
+            self.stdout.write("No matching weeks found.")
+            return
+
+        start = time.perf_counter()
+        failed = 0
+        for result in run_league_weeks(jobs, workers=options["workers"], dry_run=options["dry_run"]):
+            if result.failed:
+                failed += 1
+                self.stderr.write(self.style.ERROR(f"League {result.league_id} failed: {result.error}"))
+                continue
+            rows = ", ".join(f"{name}={count}" for name, count in result.rows.items())
+            self.stdout.write(f"{result.league_name} – GW{result.week_index}: {rows} ({result.seconds * 1000:.0f} ms)")
 
+        verb = "Checked" if options["dry_run"] else "Processed"
+        self.stdout.write(
+            self.style.SUCCESS(f"{verb} {len(jobs) - failed} league week(s) in {time.perf_counter() - start:.2f}s")
+        )
+        if failed:
+            raise CommandError(f"{failed} of {len(jobs)} league week(s) failed")
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from fantasy.market import rebuild_ownership
+
+
+class Command(BaseCommand):
+    help = "Recount the per-league player ownership counters of the transfer market from the active squads"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--league", type=int, action="append", dest="league_ids", help="FantasyLeague id to rebuild (repeatable)")
+
+    def handle(self, *args, **options):
+        written = rebuild_ownership(options["league_ids"])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {written} ownership counter(s)"))
@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from django.core.cache import cache
+from django.db.models import Count, F, Max, Min, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from league.models import Player, PlayerSeasonParticipation, Team
+from league.search import search_filter
+
+from .models import FantasyLeague, FantasyMatchWeek, FantasyPlayer, PlayerOwnership, PlayerWeekScore
+from .services import FantasyScoringService
+
+MARKET_PAGE_SIZE = 25
+MARKET_MAX_PAGE_SIZE = 100
+# Sort names accepted by the market, prefixed with "-" for descending, and the annotation each sorts on
+MARKET_SORTS = {"price": "price", "points": "last_week_points", "ownership": "owners"}
+MARKET_DEFAULT_SORT = "-points"
+MARKET_FACETS_KEY = "fantasy_market_facets"
+MARKET_FACETS_TIMEOUT = 60 * 5
+
+
+# --- Ownership ---
+
+def change_ownership(fantasy_league_id: int, player_id: int, delta: int) -> None:
+    """Add `delta` owners to a player's counter in a fantasy league (never below zero)."""
+    counters = PlayerOwnership.objects.filter(fantasy_league_id=fantasy_league_id, player_id=player_id)
+    if delta < 0:
+        counters.filter(owners__gte=-delta).update(owners=F("owners") + delta)
+        return
+    if not counters.update(owners=F("owners") + delta):
+        _, created = PlayerOwnership.objects.get_or_create(
+            fantasy_league_id=fantasy_league_id, player_id=player_id, defaults={"owners": delta}
+        )
+        if not created:
+            # Another request created the counter first
+            counters.update(owners=F("owners") + delta)
+
+
+def rebuild_ownership(league_ids: Optional[Sequence[int]] = None) -> int:
+    """Recount the ownership counters from the active squads; returns the number of counters written."""
+    leagues = FantasyLeague.objects.all()
+    if league_ids:
+        leagues = leagues.filter(id__in=league_ids)
+    rows = (
+        FantasyPlayer.objects.filter(fantasy_team__fantasy_league__in=leagues, active_to__isnull=True)
+        .values("fantasy_team__fantasy_league_id", "player_id")
+        .annotate(owners=Count("fantasy_team_id", distinct=True))
+        .order_by()
+    )
+    counters = [
+        PlayerOwnership(fantasy_league_id=row["fantasy_team__fantasy_league_id"], player_id=row["player_id"], owners=row["owners"])
+        for row in rows
+    ]
+    PlayerOwnership.objects.filter(fantasy_league__in=leagues).delete()
+    PlayerOwnership.objects.bulk_create(counters)
+    return len(counters)
+
+
+# --- Real teams ---
+
+def _current_participations():
+    # A player's current team is their latest active season participation
+    return PlayerSeasonParticipation.objects.filter(is_active=True).order_by("-id")
+
+
+def get_current_teams(player_ids: Iterable[int]) -> Dict[int, Team]:
+    """Return {player_id: current real team} in one query; players without an active participation are left out."""
+    teams: Dict[int, Team] = {}
+    participations = _current_participations().filter(player_id__in=set(player_ids)).select_related("team")
+    for participation in participations:
+        teams.setdefault(participation.player_id, participation.team)
+    return teams
+
+
+# --- Market ---
+
+def last_gameweek(league: FantasyLeague) -> Optional[FantasyMatchWeek]:
+    """The league's most recent match week that has ended."""
+    return league.match_weeks.filter(end_date__lt=timezone.now().date()).order_by("-index").first()
+
+
+def market_queryset(league: FantasyLeague, week: Optional[FantasyMatchWeek] = None):
+    """Active players annotated with their current team, owners in `league` and points in `week`, as one query."""
+    current = _current_participations().filter(player=OuterRef("pk"))
+    owners = PlayerOwnership.objects.filter(fantasy_league=league, player=OuterRef("pk")).values("owners")[:1]
+    if week is not None:
+        scores = PlayerWeekScore.objects.filter(
+            player=OuterRef("pk"), fantasy_match_week=week, rules_hash=FantasyScoringService(league).rules_hash
+        ).values("points")[:1]
+        last_week_points = Coalesce(Subquery(scores), Value(0))
+    else:
+        last_week_points = Value(0)
+    return Player.objects.filter(is_active=True).annotate(
+        current_team_id=Subquery(current.values("team_id")[:1]),
+        current_team_name=Subquery(current.values("team__name")[:1]),
+        owners=Coalesce(Subquery(owners), Value(0)),
+        last_week_points=last_week_points,
+    )
+
+
+@dataclass
+class MarketPage:
+    """One keyset page of the market, sorted on `sort` and then on player id."""
+    sort: str
+    players: List[Player] = field(default_factory=list)
+    next_cursor: Optional[str] = None
+    team_count: int = 0
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def parse_market_sort(sort: Optional[str]):
+    """Return (sort name, annotation, descending) of a sort parameter, falling back to the default sort."""
+    sort = sort if sort and sort.lstrip("-") in MARKET_SORTS else MARKET_DEFAULT_SORT
+    return sort, MARKET_SORTS[sort.lstrip("-")], sort.startswith("-")
+
+
+def _decode_market_cursor(cursor: Optional[str], key: str):
+    try:
+        value, player_id = cursor.rsplit("_", 1)
+        value = Decimal(value) if key == "price" else int(value)
+        if key == "price" and not value.is_finite():
+            return None
+        return value, int(player_id)
+    except (AttributeError, ValueError, InvalidOperation):
+        return None
+
+
+def get_market_page(
+    league: FantasyLeague,
+    sort: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = MARKET_PAGE_SIZE,
+    position: Optional[str] = None,
+    team_id: Optional[int] = None,
+    max_price: Optional[Decimal] = None,
+    q: Optional[str] = None,
+) -> MarketPage:
+    """
+    Load one page of the market with keyset pagination on (sort value, id).
+
+    Players get `ownership` (percent of the league's teams owning them) on top
+    of the market_queryset annotations.
+    """
+    sort, key, descending = parse_market_sort(sort)
+    players = market_queryset(league, last_gameweek(league))
+    if position:
+        players = players.filter(position=position)
+    if team_id:
+        players = players.filter(current_team_id=team_id)
+    if max_price is not None:
+        players = players.filter(price__lte=max_price)
+    if q:
+        players = players.filter(search_filter(Player, q))
+
+    position_after = _decode_market_cursor(cursor, key)
+    if position_after is not None:
+        value, player_id = position_after
+        op = "lt" if descending else "gt"
+        players = players.filter(Q(**{f"{key}__{op}": value}) | Q(**{key: value, f"id__{op}": player_id}))
+    order = (f"-{key}", "-id") if descending else (key, "id")
+    rows = list(players.order_by(*order)[:limit + 1])
+
+    page = MarketPage(sort=sort, players=rows[:limit], team_count=league.teams.count())
+    if len(rows) > limit:
+        last = page.players[-1]
+        page.next_cursor = f"{getattr(last, key)}_{last.id}"
+    for player in page.players:
+        player.ownership = round(100 * player.owners / page.team_count, 1) if page.team_count else 0.0
+    return page
+
+
+def get_market_facets() -> Dict:
+    """Positions, real teams and price range of the market, cached for a few minutes."""
+    facets = cache.get(MARKET_FACETS_KEY)
+    if facets is None:
+        players = Player.objects.filter(is_active=True)
+        teams = (
+            PlayerSeasonParticipation.objects.filter(is_active=True, player__is_active=True)
+            .values("team_id", "team__name")
+            .annotate(players=Count("player_id", distinct=True))
+            .order_by("team__name")
+        )
+        prices = players.aggregate(min=Min("price"), max=Max("price"))
+        facets = {
+            "positions": {
+                row["position"]: row["n"]
+                for row in players.values("position").annotate(n=Count("id")).order_by("position")
+            },
+            "teams": [{"id": row["team_id"], "name": row["team__name"], "players": row["players"]} for row in teams],
+            # Formatted like Player.price, aggregates come back unquantized on some backends
+            "price": {"min": f"{prices['min'] or 0:.2f}", "max": f"{prices['max'] or 0:.2f}"},
+        }
+        cache.set(MARKET_FACETS_KEY, facets, MARKET_FACETS_TIMEOUT)
+    return facets
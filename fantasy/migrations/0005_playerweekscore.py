@@ -0,0 +1,31 @@
+# Generated by Django 5.2.2 on 2026-10-17 15:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fantasy', '0004_fantasytransfer_action_and_more'),
+        ('league', '0019_teamoftheweek_teamoftheweekplayer_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlayerWeekScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rules_hash', models.CharField(help_text='Hash of the scoring rules the points were computed with', max_length=64)),
+                ('points', models.IntegerField(default=0)),
+                ('breakdown', models.JSONField(default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('fantasy_match_week', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='player_scores', to='fantasy.fantasymatchweek')),
+                ('player', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fantasy_week_scores', to='league.player')),
+            ],
+            options={
+                'ordering': ['-fantasy_match_week_id', '-points'],
+                'constraints': [models.UniqueConstraint(fields=('player', 'fantasy_match_week', 'rules_hash'), name='unique_score_per_player_per_week_per_rules')],
+            },
+        ),
+    ]
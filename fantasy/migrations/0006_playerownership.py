@@ -0,0 +1,46 @@
+# Generated by Django 5.2.2 on 2026-10-17 18:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_ownership(apps, schema_editor):
+    """Count the teams currently owning each player in each league."""
+    FantasyPlayer = apps.get_model('fantasy', 'FantasyPlayer')
+    PlayerOwnership = apps.get_model('fantasy', 'PlayerOwnership')
+    rows = (
+        FantasyPlayer.objects.filter(active_to__isnull=True)
+        .values('fantasy_team__fantasy_league_id', 'player_id')
+        .annotate(owners=Count('fantasy_team_id', distinct=True))
+        .order_by()
+    )
+    PlayerOwnership.objects.bulk_create(
+        PlayerOwnership(fantasy_league_id=row['fantasy_team__fantasy_league_id'], player_id=row['player_id'], owners=row['owners'])
+        for row in rows
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fantasy', '0005_playerweekscore'),
+        ('league', '0023_search_name'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlayerOwnership',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('owners', models.PositiveIntegerField(default=0)),
+                ('fantasy_league', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='player_ownership', to='fantasy.fantasyleague')),
+                ('player', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fantasy_ownership', to='league.player')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['fantasy_league', 'owners'], name='fantasy_pla_fantasy_1cf22c_idx')],
+                'constraints': [models.UniqueConstraint(fields=('fantasy_league', 'player'), name='unique_ownership_per_league_per_player')],
+            },
+        ),
+        migrations.RunPython(backfill_ownership, migrations.RunPython.noop),
+    ]
@@ -135,6 +135,29 @@ class FantasyPlayerStats(models.Model):
         return f"Stats {self.fantasy_player} – {self.fantasy_match_week}"
 
 
+class PlayerWeekScore(models.Model):
+    """Points a real player earned in a match week, computed once and shared by every team that owns them."""
+    player = models.ForeignKey('league.Player', on_delete=models.CASCADE, related_name="fantasy_week_scores")
+    fantasy_match_week = models.ForeignKey(FantasyMatchWeek, on_delete=models.CASCADE, related_name="player_scores")
+    rules_hash = models.CharField(max_length=64, help_text="Hash of the scoring rules the points were computed with")
+    points = models.IntegerField(default=0)
+    breakdown = models.JSONField(default=dict)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["player", "fantasy_match_week", "rules_hash"],
+                name="unique_score_per_player_per_week_per_rules",
+            ),
+        ]
+        ordering = ["-fantasy_match_week_id", "-points"]
+
+    def __str__(self) -> str:
+        return f"{self.player} – {self.fantasy_match_week}: {self.points}"
+
+
 class FantasyLeaderboard(models.Model):
     fantasy_team = models.ForeignKey(FantasyTeam, on_delete=models.CASCADE, related_name="leaderboard_entries")
     fantasy_match_week = models.ForeignKey(FantasyMatchWeek, on_delete=models.CASCADE, null=True, blank=True, related_name="leaderboard_entries")
@@ -189,3 +212,21 @@ class FantasyTransfer(models.Model):
         return f"{self.fantasy_team} transfer in {self.player_in} (out {self.player_out or '-'}), GW{self.fantasy_match_week.index}"
 
 
+
+
+class PlayerOwnership(models.Model):
+    """How many teams of a fantasy league currently own a real player, updated as players are added and removed."""
+    fantasy_league = models.ForeignKey(FantasyLeague, on_delete=models.CASCADE, related_name="player_ownership")
+    player = models.ForeignKey('league.Player', on_delete=models.CASCADE, related_name="fantasy_ownership")
+    owners = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["fantasy_league", "player"], name="unique_ownership_per_league_per_player"),
+        ]
+        indexes = [
+            models.Index(fields=["fantasy_league", "owners"]),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.player} – {self.fantasy_league}: {self.owners} owners"
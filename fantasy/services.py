@@ -1,11 +1,15 @@
 from __future__ import annotations
 
+import hashlib
+import json
 from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Dict, Iterable, List, Optional, Tuple
+from typing import Dict, Iterable, List, Optional
 
 from django.db import transaction
-from django.db.models import Q, Sum
+from django.db.models import Case, Count, F, OuterRef, Q, Subquery, Sum, When, Window
+from django.db.models.functions import Coalesce, Rank
+from django.utils import timezone
 
 from .models import (
     FantasyLeague,
@@ -14,10 +18,11 @@ from .models import (
     FantasyMatchWeek,
     FantasyPlayerStats,
     FantasyLeaderboard,
+    PlayerWeekScore,
 )
 
 # Real league models
-from league.models import Match, Player, PlayerStats, Lineup, PlayerSeasonParticipation
+from league.models import Match, Player, PlayerAppearance, PlayerStats
 
 
 DEFAULT_SCORING_RULES: Dict = {
@@ -45,6 +50,7 @@ class FantasyScoringService:
     def __init__(self, fantasy_league: FantasyLeague) -> None:
         self.fantasy_league = fantasy_league
         self.rules = self._merge_rules(DEFAULT_SCORING_RULES, fantasy_league.scoring_rules or {})
+        self.rules_hash = hashlib.sha256(json.dumps(self.rules, sort_keys=True).encode()).hexdigest()
 
     @staticmethod
     def _merge_rules(defaults: Dict, overrides: Dict) -> Dict:
@@ -65,62 +71,39 @@ class FantasyScoringService:
         end_dt = datetime.combine(match_week.end_date, datetime.max.time())
         return Match.objects.filter(date__range=(start_dt, end_dt))
 
-    def _get_player_team_for_match(self, player: Player, match: Match) -> Optional[int]:
-        participation = PlayerSeasonParticipation.objects.filter(
-            player=player, league=match.season, is_active=True
-        ).first()
-        return participation.team_id if participation else None
+    def _load_week_stats(self, player_ids: Iterable[int], matches: List[Match]) -> Dict[int, Dict[str, int]]:
+        """Load the week's stats for all given players in a fixed number of queries.
 
-    def _player_was_in_lineup(self, player: Player, match: Match, team_id: Optional[int]) -> bool:
-        if team_id is None:
-            return False
-        return Lineup.objects.filter(match=match, team_id=team_id, players=player).exists()
-
-    def _compute_clean_sheets(self, player: Player, matches: Iterable[Match]) -> int:
-        """Count clean sheets for GK/DF based on team conceding zero and player in lineup.
-
-        We rely on Lineup to determine appearance; if not present, we do not award a clean sheet.
+        Reads PlayerStats rows once for the counting stats and the materialized
+        PlayerAppearance rows once for clean sheets (the player's team conceded zero).
         """
-        if player.position not in ("GK", "DF", "MF", "FW"):
-            return 0
-
-        clean_sheets = 0
-        for match in matches:
-            team_id = self._get_player_team_for_match(player, match)
-            if team_id is None:
-                continue
-            # Determine conceded by player's team
-            conceded = 0
-            if match.home_team_id == team_id:
-                conceded = match.away_score
-            elif match.away_team_id == team_id:
-                conceded = match.home_score
-            else:
-                continue
-
-            if conceded == 0 and self._player_was_in_lineup(player, match, team_id):
-                clean_sheets += 1
-        return clean_sheets
+        player_ids = set(player_ids)
+        week_stats = {
+            player_id: {"goals": 0, "assists": 0, "yellow_cards": 0, "red_cards": 0, "clean_sheets": 0}
+            for player_id in player_ids
+        }
+        if not player_ids or not matches:
+            return week_stats
 
-    def _aggregate_player_match_stats(self, player: Player, matches: Iterable[Match]) -> Dict[str, int]:
         match_ids = [m.id for m in matches]
-        if not match_ids:
-            return {"goals": 0, "assists": 0, "yellow_cards": 0, "red_cards": 0, "clean_sheets": 0}
-
-        aggregates = PlayerStats.objects.filter(player=player, match_id__in=match_ids).aggregate(
-            goals=Sum("goals"), assists=Sum("assists"), yellow_cards=Sum("yellow_cards"), red_cards=Sum("red_cards")
-        )
-
-        # Compute clean sheets from matches/lineups
-        clean_sheets = self._compute_clean_sheets(player, [m for m in matches])
-
-        return {
-            "goals": aggregates.get("goals") or 0,
-            "assists": aggregates.get("assists") or 0,
-            "yellow_cards": aggregates.get("yellow_cards") or 0,
-            "red_cards": aggregates.get("red_cards") or 0,
-            "clean_sheets": clean_sheets,
-        }
+        for player_id, goals, assists, yellow_cards, red_cards in PlayerStats.objects.filter(
+            player_id__in=player_ids, match_id__in=match_ids
+        ).values_list("player_id", "goals", "assists", "yellow_cards", "red_cards"):
+            stats = week_stats[player_id]
+            stats["goals"] += goals or 0
+            stats["assists"] += assists or 0
+            stats["yellow_cards"] += yellow_cards or 0
+            stats["red_cards"] += red_cards or 0
+
+        for player_id, clean_sheets in (
+            PlayerAppearance.objects.filter(match_id__in=match_ids, player_id__in=player_ids, clean_sheet=True)
+            .values("player_id")
+            .annotate(clean_sheets=Count("id"))
+            .order_by()
+            .values_list("player_id", "clean_sheets")
+        ):
+            week_stats[player_id]["clean_sheets"] = clean_sheets
+        return week_stats
 
     def _calculate_points_from_stats(self, player: Player, stats: Dict[str, int]) -> PlayerWeekPoints:
         position = player.position
@@ -160,87 +143,217 @@ class FantasyScoringService:
     def _active_in_week_filter(self, week: FantasyMatchWeek) -> Q:
         return Q(active_from__lte=week.end_date) & (Q(active_to__isnull=True) | Q(active_to__gte=week.start_date))
 
-    @transaction.atomic
-    def calculate_week(self, match_week: FantasyMatchWeek) -> None:
-        matches = list(self.get_matches_for_week(match_week))
+    def _scored_under_current_rules(self, match_week: FantasyMatchWeek) -> bool:
+        hashes = set(
+            PlayerWeekScore.objects.filter(fantasy_match_week=match_week).values_list("rules_hash", flat=True).distinct()
+        )
+        return hashes == {self.rules_hash}
+
+    def _store_player_scores(self, match_week: FantasyMatchWeek, scores: Dict[int, PlayerWeekPoints], full: bool) -> None:
+        if full:
+            # Scores computed under previous scoring rules are no longer reachable
+            PlayerWeekScore.objects.filter(fantasy_match_week=match_week).exclude(rules_hash=self.rules_hash).delete()
+        PlayerWeekScore.objects.bulk_create(
+            [
+                PlayerWeekScore(
+                    player_id=player_id,
+                    fantasy_match_week=match_week,
+                    rules_hash=self.rules_hash,
+                    points=week_points.total_points,
+                    breakdown=week_points.breakdown,
+                )
+                for player_id, week_points in scores.items()
+            ],
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=["player", "fantasy_match_week", "rules_hash"],
+            update_fields=["points", "breakdown", "updated_at"],
+        )
 
-        # Calculate per player stats and persist FantasyPlayerStats
-        league_teams: List[FantasyTeam] = list(self.fantasy_league.teams.all())
+    def _team_week_points(self, match_week: FantasyMatchWeek, teams) -> Dict[int, int]:
+        """Sum the shared PlayerWeekScore rows of each team's active players, applying the captain multiplier."""
+        owned = Q(fantasy_players__active_from__lte=match_week.end_date) & (
+            Q(fantasy_players__active_to__isnull=True) | Q(fantasy_players__active_to__gte=match_week.start_date)
+        )
+        scored = Q(
+            fantasy_players__player__fantasy_week_scores__fantasy_match_week=match_week,
+            fantasy_players__player__fantasy_week_scores__rules_hash=self.rules_hash,
+        )
+        points = F("fantasy_players__player__fantasy_week_scores__points")
+        if self.fantasy_league.allow_captain_multiplier:
+            multiplier = int(self.fantasy_league.captain_multiplier or 2)
+            points = Case(
+                When(
+                    fantasy_players__is_captain=True,
+                    fantasy_players__player__fantasy_week_scores__points__gt=0,
+                    then=points * multiplier,
+                ),
+                default=points,
+            )
+        return dict(
+            teams.order_by().annotate(week_points=Sum(points, filter=owned & scored, default=0)).values_list("id", "week_points")
+        )
 
-        team_week_points: Dict[int, int] = {}
+    def score_week(self, match_week: FantasyMatchWeek, player_ids: Optional[Iterable[int]] = None) -> Dict[int, int]:
+        """Score a week and return week points keyed by fantasy team id.
 
-        for team in league_teams:
-            week_points_sum = 0
-            active_players: List[FantasyPlayer] = list(
-                team.fantasy_players.filter(self._active_in_week_filter(match_week)).select_related("player")
-            )
+        Each distinct real player is scored once into a PlayerWeekScore row keyed by the
+        scoring rules hash; FantasyPlayerStats rows are fanned out from it and team totals
+        are a join over those scores. When player_ids is given only those players and the
+        teams that own them are rescored, unless the week was scored under other rules (or
+        not at all): team totals need every player's score under the current rules, so the
+        whole week is rescored. The query count does not grow with league size.
+        """
+        if player_ids is not None and not self._scored_under_current_rules(match_week):
+            player_ids = None
+        matches = list(self.get_matches_for_week(match_week))
 
-            for fplayer in active_players:
-                player = fplayer.player
-                stats = self._aggregate_player_match_stats(player, matches)
-                week_points = self._calculate_points_from_stats(player, stats)
-                final_points = self._apply_captain_multiplier(fplayer, week_points.total_points)
+        active = FantasyPlayer.objects.filter(fantasy_team__fantasy_league=self.fantasy_league).filter(
+            self._active_in_week_filter(match_week)
+        )
+        if player_ids is not None:
+            active = active.filter(player_id__in=set(player_ids))
+        active_players: List[FantasyPlayer] = list(active.select_related("player"))
+
+        players = {fp.player_id: fp.player for fp in active_players}
+        week_stats = self._load_week_stats(players, matches)
+        scores = {
+            player_id: self._calculate_points_from_stats(player, week_stats[player_id])
+            for player_id, player in players.items()
+        }
+        self._store_player_scores(match_week, scores, full=player_ids is None)
 
-                FantasyPlayerStats.objects.update_or_create(
+        FantasyPlayerStats.objects.bulk_create(
+            [
+                FantasyPlayerStats(
                     fantasy_player=fplayer,
                     fantasy_match_week=match_week,
-                    defaults={"points": final_points, "breakdown": week_points.breakdown},
+                    points=self._apply_captain_multiplier(fplayer, scores[fplayer.player_id].total_points),
+                    breakdown=scores[fplayer.player_id].breakdown,
                 )
+                for fplayer in active_players
+            ],
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=["fantasy_player", "fantasy_match_week"],
+            update_fields=["points", "breakdown", "updated_at"],
+        )
+
+        if player_ids is None:
+            teams = self.fantasy_league.teams.all()
+        else:
+            teams = FantasyTeam.objects.filter(id__in={fp.fantasy_team_id for fp in active_players})
+        return self._team_week_points(match_week, teams)
+
+    def estimate_week_rows(self, match_week: FantasyMatchWeek) -> Dict[str, int]:
+        """Count the rows calculate_week would write for a week, without scoring anything."""
+        rows = (
+            FantasyPlayer.objects.filter(fantasy_team__fantasy_league=self.fantasy_league)
+            .filter(self._active_in_week_filter(match_week))
+            .aggregate(player_stats=Count("id"), player_scores=Count("player_id", distinct=True))
+        )
+        # One weekly and one overall entry per team
+        rows["leaderboard"] = 2 * self.fantasy_league.teams.count()
+        return rows
 
-                week_points_sum += final_points
+    @transaction.atomic
+    def rescore_players(self, match_week: FantasyMatchWeek, player_ids: Iterable[int]) -> Dict[int, int]:
+        """Rescore only the given real players (e.g. after a stat correction) and the teams that own them."""
+        team_week_points = self.score_week(match_week, player_ids=player_ids)
+        self._update_leaderboard(match_week, team_week_points)
+        return team_week_points
 
-            team_week_points[team.id] = week_points_sum
+    @transaction.atomic
+    def calculate_week(self, match_week: FantasyMatchWeek) -> None:
+        team_week_points = self.score_week(match_week)
 
         # Update leaderboard weekly and overall
         self._update_leaderboard(match_week, team_week_points)
 
     def _update_leaderboard(self, match_week: FantasyMatchWeek, week_points_by_team_id: Dict[int, int]) -> None:
-        # Update/insert weekly entries and compute cumulative
-        for team_id, points_week in week_points_by_team_id.items():
-            team = FantasyTeam.objects.get(id=team_id)
+        """Upsert the week's leaderboard rows and re-rank the week's league in a fixed number of queries.
 
-            # Compute new cumulative total from previous overall entry
-            overall, _ = FantasyLeaderboard.objects.get_or_create(
-                fantasy_team=team, is_overall=True, defaults={"cumulative_points": 0}
-            )
+        Cumulative points are re-derived from the stored weekly rows instead of being added to
+        the previous total, so scoring the same week again does not double count.
+        """
+        team_ids = list(week_points_by_team_id)
+        FantasyLeaderboard.objects.bulk_create(
+            [
+                FantasyLeaderboard(
+                    fantasy_team_id=team_id,
+                    fantasy_match_week=match_week,
+                    points_week=int(points_week),
+                    is_overall=False,
+                )
+                for team_id, points_week in week_points_by_team_id.items()
+            ],
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=["fantasy_team", "fantasy_match_week"],
+            update_fields=["points_week", "updated_at"],
+        )
+        # The overall uniqueness is a partial constraint, so only insert the missing rows here
+        FantasyLeaderboard.objects.bulk_create(
+            [FantasyLeaderboard(fantasy_team_id=team_id, is_overall=True) for team_id in team_ids],
+            batch_size=500,
+            ignore_conflicts=True,
+        )
 
-            cumulative_points = (overall.cumulative_points or 0) + int(points_week)
-
-            # Weekly entry for this week
-            FantasyLeaderboard.objects.update_or_create(
-                fantasy_team=team,
-                fantasy_match_week=match_week,
-                defaults={
-                    "points_week": int(points_week),
-                    "cumulative_points": cumulative_points,
-                    "is_overall": False,
-                },
+        # Running totals per team, ordered by week; later weeks change too when an earlier week is rescored
+        weekly_totals = (
+            FantasyLeaderboard.objects.filter(fantasy_team_id__in=team_ids, is_overall=False)
+            .annotate(
+                running_total=Window(
+                    Sum("points_week"),
+                    partition_by=[F("fantasy_team_id")],
+                    order_by=F("fantasy_match_week__index").asc(),
+                )
             )
+            .values_list("id", "cumulative_points", "running_total")
+        )
+        FantasyLeaderboard.objects.bulk_update(
+            [
+                FantasyLeaderboard(id=entry_id, cumulative_points=running_total)
+                for entry_id, cumulative_points, running_total in weekly_totals
+                if cumulative_points != running_total
+            ],
+            ["cumulative_points"],
+            batch_size=500,
+        )
+
+        team_total = (
+            FantasyLeaderboard.objects.filter(fantasy_team_id=OuterRef("fantasy_team_id"), is_overall=False)
+            .order_by()
+            .values("fantasy_team_id")
+            .annotate(total=Sum("points_week"))
+            .values("total")
+        )
+        FantasyLeaderboard.objects.filter(fantasy_team_id__in=team_ids, is_overall=True).update(
+            cumulative_points=Coalesce(Subquery(team_total), 0), updated_at=timezone.now()
+        )
+
+        self._rerank(FantasyLeaderboard.objects.filter(fantasy_match_week=match_week, is_overall=False), "points_week")
+        self._rerank(
+            FantasyLeaderboard.objects.filter(
+                fantasy_team__fantasy_league_id=match_week.fantasy_league_id, is_overall=True
+            ),
+            "cumulative_points",
+        )
 
-            # Update overall
-            overall.cumulative_points = cumulative_points
-            overall.save(update_fields=["cumulative_points", "updated_at"])
-
-        # Re-rank weekly entries (by points_week desc, then team name)
-        weekly_entries = list(FantasyLeaderboard.objects.filter(fantasy_match_week=match_week, is_overall=False).select_related("fantasy_team"))
-        weekly_entries.sort(key=lambda e: (-e.points_week, e.fantasy_team.name))
-        self._assign_ranks(weekly_entries)
-
-        # Re-rank overall entries (by cumulative_points desc)
-        overall_entries = list(FantasyLeaderboard.objects.filter(is_overall=True).select_related("fantasy_team"))
-        overall_entries.sort(key=lambda e: (-e.cumulative_points, e.fantasy_team.name))
-        self._assign_ranks(overall_entries)
-
-    def _assign_ranks(self, entries: List[FantasyLeaderboard]) -> None:
-        current_rank = 0
-        last_points: Optional[int] = None
-        for index, entry in enumerate(entries, start=1):
-            points_value = entry.points_week if not entry.is_overall else entry.cumulative_points
-            if last_points is None or points_value < last_points:
-                current_rank = index
-            entry.rank = current_rank
-            last_points = points_value
-        FantasyLeaderboard.objects.bulk_update(entries, ["rank", "updated_at"])  # updated_at auto-updates on save; bulk_update ignores
+    def _rerank(self, entries, points_field: str) -> None:
+        """Rank entries by points_field within each fantasy league; ties share a rank and leave a gap."""
+        ranked = entries.annotate(
+            new_rank=Window(
+                Rank(),
+                partition_by=[F("fantasy_team__fantasy_league_id")],
+                order_by=F(points_field).desc(),
+            )
+        ).values_list("id", "rank", "new_rank")
+        FantasyLeaderboard.objects.bulk_update(
+            [FantasyLeaderboard(id=entry_id, rank=new_rank) for entry_id, rank, new_rank in ranked if rank != new_rank],
+            ["rank"],
+            batch_size=500,
+        )
 
 
 def example_scoring_rules() -> Dict:
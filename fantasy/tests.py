@@ -1,9 +1,18 @@
-from django.test import TestCase
+import os
+from io import StringIO
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
 from datetime import date, timedelta, datetime
 from django.utils import timezone
 
-from league.models import Team, League as RealLeague, Player, Match, PlayerStats
+from league.models import Team, League as RealLeague, Player, Match, PlayerStats, PlayerSeasonParticipation, Lineup, LineupPlayer
 from .models import (
     FantasyLeague,
     FantasyTeam,
@@ -11,7 +20,12 @@ from .models import (
     FantasyMatchWeek,
     FantasyPlayerStats,
     FantasyLeaderboard,
+    PlayerWeekScore,
+    PlayerOwnership,
 )
+from .batch import LeagueWeekResult, run_league_weeks
+from .forms import AddFantasyPlayerForm, RemoveFantasyPlayerForm
+from .market import get_market_page
 from .services import FantasyScoringService, example_scoring_rules
 
 
@@ -88,4 +102,401 @@ class FantasyCoreTests(TestCase):
         self.assertTrue(form.is_valid())
         form.save()
         fp.refresh_from_db()
-        self.assertTrue(fp.is_captain)
\ No newline at end of file
+        self.assertTrue(fp.is_captain)
+
+class FantasyBatchScoringTests(TestCase):
+    """calculate_week scores each real player once, with a query count independent of league size."""
+
+    def setUp(self):
+        User = get_user_model()
+        self.real_league = RealLeague.objects.create(year=2025, session='F')
+        self.team_a = Team.objects.create(name="Team A")
+        self.team_b = Team.objects.create(name="Team B")
+
+        self.keeper = Player.objects.create(first_name="Gary", last_name="Keeper", position="GK", price=5)
+        self.striker = Player.objects.create(first_name="Sam", last_name="Striker", position="FW", price=10)
+        self.defender = Player.objects.create(first_name="Dan", last_name="Back", position="DF", price=6)
+        PlayerSeasonParticipation.objects.create(player=self.keeper, team=self.team_a, league=self.real_league)
+        PlayerSeasonParticipation.objects.create(player=self.striker, team=self.team_a, league=self.real_league)
+        PlayerSeasonParticipation.objects.create(player=self.defender, team=self.team_b, league=self.real_league)
+
+        # Team A keeps a clean sheet; the keeper started, the striker scored twice
+        self.match = Match.objects.create(
+            season=self.real_league, home_team=self.team_a, away_team=self.team_b,
+            home_score=2, away_score=0, date=date.today(),
+        )
+        # Appearances are materialized when the transaction commits
+        with self.captureOnCommitCallbacks(execute=True):
+            lineup_a = Lineup.objects.create(match=self.match, team=self.team_a)
+            LineupPlayer.objects.create(lineup=lineup_a, player=self.keeper)
+            LineupPlayer.objects.create(lineup=lineup_a, player=self.striker)
+            lineup_b = Lineup.objects.create(match=self.match, team=self.team_b)
+            LineupPlayer.objects.create(lineup=lineup_b, player=self.defender)
+            PlayerStats.objects.create(match=self.match, player=self.striker, goals=2, yellow_cards=1)
+
+        self.fantasy_league = FantasyLeague.objects.create(
+            name="Batch Fantasy", scoring_rules=example_scoring_rules(), start_date=date.today(),
+            end_date=date.today() + timedelta(days=30),
+        )
+        self.week = FantasyMatchWeek.objects.create(
+            fantasy_league=self.fantasy_league, index=1, name="Week 1", start_date=date.today(),
+            end_date=date.today() + timedelta(days=7), deadline_at=timezone.now(),
+        )
+        self.week.matches.add(self.match)
+        self.users = [User.objects.create(username=f"manager{i}", email=f"manager{i}@example.com") for i in range(40)]
+
+    def _create_teams(self, count, offset=0):
+        teams = []
+        for user in self.users[offset:offset + count]:
+            team = FantasyTeam.objects.create(name=f"FT {user.username}", user=user, fantasy_league=self.fantasy_league)
+            for player in (self.keeper, self.striker, self.defender):
+                FantasyPlayer.objects.create(
+                    fantasy_team=team, player=player, price_at_purchase=player.price,
+                    active_from=self.fantasy_league.start_date, is_captain=player == self.striker,
+                )
+            teams.append(team)
+        return teams
+
+    def test_points_and_breakdown(self):
+        team = self._create_teams(1)[0]
+        FantasyScoringService(self.fantasy_league).calculate_week(self.week)
+
+        points = {
+            fps.fantasy_player.player_id: fps
+            for fps in FantasyPlayerStats.objects.filter(fantasy_match_week=self.week).select_related("fantasy_player")
+        }
+        self.assertEqual(points[self.keeper.id].points, 4)  # clean sheet
+        self.assertEqual(points[self.striker.id].points, 14)  # (2 * 4 - 1) * captain 2
+        self.assertEqual(points[self.striker.id].breakdown["goals"]["count"], 2)
+        self.assertEqual(points[self.defender.id].points, 0)  # conceded
+        weekly = FantasyLeaderboard.objects.get(fantasy_team=team, fantasy_match_week=self.week)
+        self.assertEqual(weekly.points_week, 18)
+
+    def test_scoring_query_count_is_independent_of_team_count(self):
+        self._create_teams(5)
+        service = FantasyScoringService(self.fantasy_league)
+        with CaptureQueriesContext(connection) as small:
+            service.score_week(self.week)
+
+        self._create_teams(35, offset=5)
+        with CaptureQueriesContext(connection) as large:
+            team_points = service.score_week(self.week)
+
+        self.assertEqual(len(small), len(large))
+        self.assertLess(len(large), 30)
+        self.assertEqual(set(team_points.values()), {18})
+
+    def test_rescoring_updates_existing_rows(self):
+        self._create_teams(2)
+        service = FantasyScoringService(self.fantasy_league)
+        service.score_week(self.week)
+
+        PlayerStats.objects.filter(player=self.striker).update(goals=3)
+        service.score_week(self.week)
+
+        self.assertEqual(FantasyPlayerStats.objects.filter(fantasy_match_week=self.week).count(), 6)
+        self.assertEqual(
+            set(FantasyPlayerStats.objects.filter(fantasy_player__player=self.striker).values_list("points", flat=True)),
+            {22},
+        )
+
+    def test_each_real_player_is_scored_once(self):
+        self._create_teams(10)
+        FantasyScoringService(self.fantasy_league).score_week(self.week)
+
+        scores = dict(PlayerWeekScore.objects.filter(fantasy_match_week=self.week).values_list("player_id", "points"))
+        self.assertEqual(scores, {self.keeper.id: 4, self.striker.id: 7, self.defender.id: 0})
+        self.assertEqual(FantasyPlayerStats.objects.filter(fantasy_match_week=self.week).count(), 30)
+
+    def test_rescore_touches_only_owning_teams(self):
+        teams = self._create_teams(3)
+        winger = Player.objects.create(first_name="Wes", last_name="Winger", position="MF", price=7)
+        PlayerSeasonParticipation.objects.create(player=winger, team=self.team_b, league=self.real_league)
+        FantasyPlayer.objects.create(
+            fantasy_team=teams[0], player=winger, price_at_purchase=7, active_from=self.fantasy_league.start_date
+        )
+        service = FantasyScoringService(self.fantasy_league)
+        service.calculate_week(self.week)
+        untouched = FantasyPlayerStats.objects.get(fantasy_player__fantasy_team=teams[1], fantasy_player__player=self.striker)
+
+        # Stat correction: the winger is credited with an assist
+        PlayerStats.objects.create(match=self.match, player=winger, assists=1)
+        team_points = service.rescore_players(self.week, [winger.id])
+
+        self.assertEqual(team_points, {teams[0].id: 21})
+        self.assertEqual(PlayerWeekScore.objects.get(player=winger, fantasy_match_week=self.week).points, 3)
+        untouched_after = FantasyPlayerStats.objects.get(pk=untouched.pk)
+        self.assertEqual(untouched_after.updated_at, untouched.updated_at)
+
+        # The corrected team moves ahead in both the weekly and the overall leaderboard
+        entries = FantasyLeaderboard.objects.filter(fantasy_team=teams[0])
+        self.assertEqual(len(entries), 2)
+        for entry in entries:
+            points = entry.cumulative_points if entry.is_overall else entry.points_week
+            self.assertEqual((points, entry.rank), (21, 1))
+        self.assertEqual(
+            set(FantasyLeaderboard.objects.exclude(fantasy_team=teams[0]).values_list("rank", flat=True)), {2}
+        )
+
+    def test_rule_change_replaces_stale_scores(self):
+        self._create_teams(1)
+        FantasyScoringService(self.fantasy_league).score_week(self.week)
+
+        self.fantasy_league.scoring_rules = {**example_scoring_rules(), "yellow_card": -2}
+        self.fantasy_league.save()
+        service = FantasyScoringService(self.fantasy_league)
+        service.score_week(self.week)
+
+        striker_scores = PlayerWeekScore.objects.filter(player=self.striker, fantasy_match_week=self.week)
+        self.assertEqual(list(striker_scores.values_list("rules_hash", "points")), [(service.rules_hash, 6)])
+
+    def test_partial_rescore_after_a_rule_change_rescores_the_week(self):
+        teams = self._create_teams(2)
+        FantasyScoringService(self.fantasy_league).calculate_week(self.week)
+
+        self.fantasy_league.scoring_rules = {**example_scoring_rules(), "yellow_card": -2}
+        self.fantasy_league.save()
+        service = FantasyScoringService(self.fantasy_league)
+        team_points = service.rescore_players(self.week, [self.keeper.id])
+
+        # Keeper 4, striker (2 * 4 - 2) * captain 2, defender 0
+        self.assertEqual(team_points, {teams[0].id: 16, teams[1].id: 16})
+        self.assertEqual(
+            set(PlayerWeekScore.objects.filter(fantasy_match_week=self.week).values_list("rules_hash", flat=True)),
+            {service.rules_hash},
+        )
+        self.assertEqual(
+            set(FantasyLeaderboard.objects.filter(is_overall=True).values_list("cumulative_points", flat=True)), {16}
+        )
+
+    def test_leaderboard_is_idempotent_and_ranked(self):
+        teams = self._create_teams(3)
+        # Third team loses its captain, so it trails the other two
+        FantasyPlayer.objects.filter(fantasy_team=teams[2]).update(is_captain=False)
+        service = FantasyScoringService(self.fantasy_league)
+        service.calculate_week(self.week)
+        service.calculate_week(self.week)
+
+        overall = {e.fantasy_team_id: e for e in FantasyLeaderboard.objects.filter(is_overall=True)}
+        self.assertEqual({t.id: overall[t.id].cumulative_points for t in teams}, {teams[0].id: 18, teams[1].id: 18, teams[2].id: 11})
+        self.assertEqual([overall[t.id].rank for t in teams], [1, 1, 3])
+        weekly = FantasyLeaderboard.objects.get(fantasy_team=teams[2], fantasy_match_week=self.week)
+        self.assertEqual((weekly.points_week, weekly.cumulative_points, weekly.rank), (11, 11, 3))
+
+    def test_leaderboard_cumulative_follows_week_order(self):
+        team = self._create_teams(1)[0]
+        week2 = FantasyMatchWeek.objects.create(
+            fantasy_league=self.fantasy_league, index=2, name="Week 2", start_date=self.week.start_date,
+            end_date=self.week.end_date, deadline_at=timezone.now(),
+        )
+        week2.matches.add(self.match)
+        service = FantasyScoringService(self.fantasy_league)
+        service.calculate_week(week2)
+        service.calculate_week(self.week)
+
+        cumulative = dict(
+            FantasyLeaderboard.objects.filter(fantasy_team=team, is_overall=False)
+            .values_list("fantasy_match_week__index", "cumulative_points")
+        )
+        self.assertEqual(cumulative, {1: 18, 2: 36})
+        self.assertEqual(FantasyLeaderboard.objects.get(fantasy_team=team, is_overall=True).cumulative_points, 36)
+
+    def test_leaderboard_reranks_only_the_scored_league(self):
+        self._create_teams(1)
+        other_league = FantasyLeague.objects.create(
+            name="Other", start_date=self.fantasy_league.start_date, end_date=self.fantasy_league.end_date
+        )
+        other_team = FantasyTeam.objects.create(name="Other FT", user=self.users[-1], fantasy_league=other_league)
+        other_entry = FantasyLeaderboard.objects.create(fantasy_team=other_team, is_overall=True, cumulative_points=5, rank=7)
+
+        FantasyScoringService(self.fantasy_league).calculate_week(self.week)
+
+        other_entry.refresh_from_db()
+        self.assertEqual(other_entry.rank, 7)
+        self.assertEqual(FantasyLeaderboard.objects.get(fantasy_team__fantasy_league=self.fantasy_league, is_overall=True).rank, 1)
+
+
+class FantasyScoringCommandTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.leagues = []
+        for i in range(2):
+            league = FantasyLeague.objects.create(
+                name=f"League {i}", start_date=date.today(), end_date=date.today() + timedelta(days=30)
+            )
+            FantasyMatchWeek.objects.create(
+                fantasy_league=league, index=1, name="Week 1", start_date=date.today(),
+                end_date=date.today() + timedelta(days=7), deadline_at=timezone.now(),
+            )
+            user = User.objects.create(username=f"owner{i}", email=f"owner{i}@example.com")
+            team = FantasyTeam.objects.create(name=f"FT {i}", user=user, fantasy_league=league)
+            player = Player.objects.create(first_name="P", last_name=str(i), position="FW", price=5)
+            FantasyPlayer.objects.create(fantasy_team=team, player=player, price_at_purchase=5, active_from=league.start_date)
+            self.leagues.append(league)
+
+    def test_dry_run_reports_rows_without_writing(self):
+        out = StringIO()
+        call_command("calc_fantasy_current_weeks", "--dry-run", stdout=out)
+
+        self.assertIn("League 0 – GW1: player_stats=1, player_scores=1, leaderboard=2", out.getvalue())
+        self.assertIn("Checked 2 league week(s)", out.getvalue())
+        self.assertFalse(FantasyLeaderboard.objects.exists())
+
+    def test_league_and_week_selection(self):
+        out = StringIO()
+        call_command("calc_fantasy_current_weeks", "--league", str(self.leagues[1].id), "--week", "1", stdout=out)
+
+        self.assertEqual(
+            set(FantasyLeaderboard.objects.values_list("fantasy_team__fantasy_league_id", flat=True)),
+            {self.leagues[1].id},
+        )
+        self.assertIn("Processed 1 league week(s)", out.getvalue())
+
+
+    def test_failing_league_is_reported_and_the_others_still_scored(self):
+        calculate_week = FantasyScoringService.calculate_week
+
+        def fail_first_league(service, week):
+            if service.fantasy_league.id == self.leagues[0].id:
+                raise RuntimeError("bad scoring rules")
+            return calculate_week(service, week)
+
+        out, err = StringIO(), StringIO()
+        with mock.patch.object(FantasyScoringService, "calculate_week", autospec=True, side_effect=fail_first_league):
+            with self.assertRaisesMessage(CommandError, "1 of 2 league week(s) failed"):
+                call_command("calc_fantasy_current_weeks", stdout=out, stderr=err)
+
+        self.assertIn(f"League {self.leagues[0].id} failed: RuntimeError: bad scoring rules", err.getvalue())
+        self.assertIn("League 1 – GW1", out.getvalue())
+        self.assertEqual(
+            set(FantasyLeaderboard.objects.values_list("fantasy_team__fantasy_league_id", flat=True)),
+            {self.leagues[1].id},
+        )
+
+
+def _score_in_worker(league_id, week_id, dry_run=False):
+    """Stands in for score_league_week in pool workers, which cannot see the test database."""
+    if league_id < 0:
+        raise ValueError(f"no league {league_id}")
+    return LeagueWeekResult(league_id, f"League {league_id}", week_id, {"pid": os.getpid()}, 0.0)
+
+
+class FantasyWorkerPoolTests(SimpleTestCase):
+    def test_leagues_are_scored_in_worker_processes(self):
+        jobs = [(1, 1), (2, 1), (-3, 1)]
+        with mock.patch("fantasy.batch.score_league_week", _score_in_worker):
+            results = {result.league_id: result for result in run_league_weeks(jobs, workers=2)}
+
+        self.assertEqual(set(results), {1, 2, -3})
+        self.assertEqual(results[-3].error, "ValueError: no league -3")
+        for league_id in (1, 2):
+            self.assertFalse(results[league_id].failed)
+            self.assertNotEqual(results[league_id].rows["pid"], os.getpid())
+
+
+class FantasyMarketTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        User = get_user_model()
+        self.real_league = RealLeague.objects.create(year=2025, session="F")
+        self.team_a = Team.objects.create(name="Team A")
+        self.team_b = Team.objects.create(name="Team B")
+        self.league = FantasyLeague.objects.create(
+            name="Market", start_date=date.today() - timedelta(days=14), end_date=date.today() + timedelta(days=30),
+            budget_cap=100, transfer_limit=10,
+        )
+        self.last_week = FantasyMatchWeek.objects.create(
+            fantasy_league=self.league, index=1, name="Week 1", start_date=date.today() - timedelta(days=14),
+            end_date=date.today() - timedelta(days=8), deadline_at=timezone.now() - timedelta(days=14),
+        )
+        self.players = []
+        for i, (position, price, team) in enumerate([
+            ("FW", 10, self.team_a), ("MF", 8, self.team_a), ("DF", 6, self.team_b), ("GK", 5, self.team_b), ("FW", 8, None),
+        ]):
+            player = Player.objects.create(first_name="Player", last_name=f"No{i}", position=position, price=price)
+            if team:
+                PlayerSeasonParticipation.objects.create(player=player, team=team, league=self.real_league)
+            self.players.append(player)
+        rules_hash = FantasyScoringService(self.league).rules_hash
+        for player, points in zip(self.players, [3, 12, 7, 0, 12]):
+            PlayerWeekScore.objects.create(player=player, fantasy_match_week=self.last_week, rules_hash=rules_hash, points=points)
+        self.teams = [
+            FantasyTeam.objects.create(name=f"FT {i}", user=User.objects.create(username=f"m{i}", email=f"m{i}@example.com"),
+                                       fantasy_league=self.league, balance=100)
+            for i in range(4)
+        ]
+
+    def add(self, team, player):
+        form = AddFantasyPlayerForm({"player_id": player.id}, fantasy_team=team)
+        self.assertTrue(form.is_valid(), form.errors)
+        return form.save()
+
+    def test_ownership_counter_follows_adds_and_removes(self):
+        fw, mf = self.players[:2]
+        for team in self.teams[:3]:
+            self.add(team, fw)
+        fp = self.add(self.teams[0], mf)
+        form = RemoveFantasyPlayerForm({"fantasy_player_id": fp.id}, fantasy_team=self.teams[0])
+        self.assertTrue(form.is_valid(), form.errors)
+        form.save()
+
+        owners = dict(PlayerOwnership.objects.filter(fantasy_league=self.league).values_list("player_id", "owners"))
+        self.assertEqual(owners, {fw.id: 3, mf.id: 0})
+        self.assertEqual(get_market_page(self.league, sort="-ownership", limit=1).players[0].ownership, 75.0)
+
+        call_command("rebuild_fantasy_ownership", "--league", str(self.league.id), stdout=StringIO())
+        self.assertEqual(
+            dict(PlayerOwnership.objects.filter(fantasy_league=self.league).values_list("player_id", "owners")), {fw.id: 3}
+        )
+
+    def test_players_come_from_one_annotated_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            page = get_market_page(self.league, sort="-points")
+        players = {player.id: player for player in page.players}
+        # The last match week, the page and the team count
+        self.assertEqual(len(queries), 3)
+        self.assertEqual(players[self.players[0].id].current_team_name, "Team A")
+        self.assertIsNone(players[self.players[4].id].current_team_id)
+        self.assertEqual([player.last_week_points for player in page.players], [12, 12, 7, 3, 0])
+
+    def test_search_stays_in_the_page_query(self):
+        for q in ("no4", "n"):
+            with CaptureQueriesContext(connection) as queries:
+                page = get_market_page(self.league, q=q, position="FW")
+            self.assertEqual(len(queries), 3, q)
+            self.assertIn(self.players[4].id, {player.id for player in page.players}, q)
+        self.assertEqual(get_market_page(self.league, q="zzz").players, [])
+
+    def test_keyset_pages_walk_every_sort_once(self):
+        for sort in ("price", "-price", "points", "-points", "ownership", "-ownership"):
+            seen, cursor = [], None
+            while True:
+                page = get_market_page(self.league, sort=sort, cursor=cursor, limit=2)
+                seen.extend(page.players)
+                cursor = page.next_cursor
+                if not cursor:
+                    break
+            self.assertEqual(len({player.id for player in seen}), len(self.players), sort)
+            key = {"price": "price", "points": "last_week_points", "ownership": "owners"}[sort.lstrip("-")]
+            values = [getattr(player, key) for player in seen]
+            self.assertEqual(values, sorted(values, reverse=sort.startswith("-")), sort)
+
+    def test_market_endpoint_filters_and_facets(self):
+        url = reverse("fantasy:market", args=[self.league.id])
+        data = self.client.get(url, {"team": self.team_b.id, "sort": "price"}).json()
+        self.assertEqual([row["id"] for row in data["results"]], [self.players[3].id, self.players[2].id])
+        self.assertEqual(data["results"][0]["team"], {"id": self.team_b.id, "name": "Team B"})
+        self.assertEqual(data["facets"]["positions"], {"DF": 1, "FW": 2, "GK": 1, "MF": 1})
+        self.assertEqual(data["facets"]["price"], {"min": "5.00", "max": "10.00"})
+
+        data = self.client.get(url, {"position": "FW", "max_price": "9", "q": "no4"}).json()
+        self.assertEqual([row["id"] for row in data["results"]], [self.players[4].id])
+        self.assertEqual(self.client.get(url, {"limit": "x"}).status_code, 400)
+        for max_price in ("NaN", "sNaN", "Infinity", "-inf"):
+            self.assertEqual(self.client.get(url, {"max_price": max_price}).status_code, 400, max_price)
+        first = self.client.get(url, {"sort": "price"}).json()
+        self.assertEqual(self.client.get(url, {"sort": "price", "cursor": "NaN_1"}).json()["results"], first["results"])
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        self.assertEqual(len(queries), 4)  # league, match week, page, team count; facets are cached
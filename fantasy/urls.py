@@ -11,6 +11,7 @@ urlpatterns = [
     path("<int:league_id>/leaderboard/", views.fantasy_leaderboard, name="leaderboard"),
     path("<int:league_id>/week/<int:week_index>/", views.fantasy_week_summary, name="week_summary"),
     path("<int:league_id>/transfers/", views.fantasy_transfers, name="transfers"),
+    path("<int:league_id>/market/", views.fantasy_market, name="market"),
 ]
 
 
@@ -3,12 +3,11 @@ from __future__ import annotations
 from decimal import Decimal
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.http import HttpRequest, HttpResponse, HttpResponseForbidden
+from django.http import HttpRequest, HttpResponse, HttpResponseForbidden, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse
 
 from .models import FantasyLeague, FantasyTeam, FantasyMatchWeek, FantasyLeaderboard, FantasyPlayer
-from django.db import models
 from .forms import (
     FantasyTeamCreateForm,
     AddFantasyPlayerForm,
@@ -17,6 +16,7 @@ from .forms import (
     SetViceCaptainForm,
 )
 from league.models import Player
+from .market import MARKET_MAX_PAGE_SIZE, MARKET_PAGE_SIZE, get_market_facets, get_market_page, get_current_teams
 from .utils import get_current_week, is_before_deadline
 
 
@@ -93,14 +93,7 @@ def my_fantasy_team(request: HttpRequest, league_id: int) -> HttpResponse:
     # Filters for available players
     q = request.GET.get("q", "").strip()
     pos = request.GET.get("position", "").strip()
-    available_players_qs = Player.objects.all()
-    if pos:
-        available_players_qs = available_players_qs.filter(position=pos)
-    if q:
-        available_players_qs = available_players_qs.filter(
-            models.Q(first_name__icontains=q) | models.Q(last_name__icontains=q)
-        )
-    available_players = available_players_qs.order_by("last_name", "first_name")[:100]
+    available_players = get_market_page(league, limit=100, position=pos or None, q=q or None).players
 
     active_players = team.fantasy_players.filter(active_to__isnull=True).select_related("player") if team else []
 
@@ -132,15 +125,8 @@ def my_fantasy_team(request: HttpRequest, league_id: int) -> HttpResponse:
             position_counts[pos_code] += 1
 
     real_team_counts = {}
-    try:
-        from league.models import PlayerSeasonParticipation
-        for fp in active_players:
-            psp = PlayerSeasonParticipation.objects.filter(player=fp.player, is_active=True).first()
-            if psp and psp.team:
-                name = psp.team.name
-                real_team_counts[name] = real_team_counts.get(name, 0) + 1
-    except Exception:
-        real_team_counts = {}
+    for real_team in get_current_teams(fp.player_id for fp in active_players).values():
+        real_team_counts[real_team.name] = real_team_counts.get(real_team.name, 0) + 1
 
     return render(
         request,
@@ -219,3 +205,49 @@ def fantasy_transfers(request: HttpRequest, league_id: int) -> HttpResponse:
     return render(request, "fantasy/transfers.html", {"league": league, "team": team, "transfers": transfers})
 
 
+
+
+def fantasy_market(request: HttpRequest, league_id: int) -> JsonResponse:
+    """Transfer market as JSON: one keyset page of players plus the cached filter facets.
+
+    Query parameters: position, team, q, max_price, sort (price, points or ownership,
+    "-" prefix for descending), cursor (next_cursor of the previous page) and limit.
+    """
+    league = get_object_or_404(FantasyLeague, id=league_id)
+    try:
+        team_id = int(request.GET.get("team") or 0) or None
+        limit = min(max(int(request.GET.get("limit") or MARKET_PAGE_SIZE), 1), MARKET_MAX_PAGE_SIZE)
+        max_price = Decimal(request.GET["max_price"]) if request.GET.get("max_price") else None
+        if max_price is not None and not max_price.is_finite():
+            raise ValueError(f"max_price must be a number, got {max_price}")
+    except (ValueError, ArithmeticError):
+        return JsonResponse({"error": "Invalid team, limit or max_price"}, status=400)
+
+    page = get_market_page(
+        league,
+        sort=request.GET.get("sort"),
+        cursor=request.GET.get("cursor"),
+        limit=limit,
+        position=request.GET.get("position", "").strip() or None,
+        team_id=team_id,
+        max_price=max_price,
+        q=request.GET.get("q", "").strip() or None,
+    )
+    return JsonResponse({
+        "sort": page.sort,
+        "next_cursor": page.next_cursor,
+        "results": [
+            {
+                "id": player.id,
+                "name": f"{player.first_name} {player.last_name}",
+                "position": player.position,
+                "price": str(player.price),
+                "team": {"id": player.current_team_id, "name": player.current_team_name} if player.current_team_id else None,
+                "owners": player.owners,
+                "ownership": player.ownership,
+                "last_week_points": player.last_week_points,
+            }
+            for player in page.players
+        ],
+        "facets": get_market_facets(),
+    })
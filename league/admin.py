@@ -1,8 +1,11 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.db.models import Q
+from .live import pause_match_clock, resume_match_clock, start_match_phase
+from .search import search_filter
 from .models import (
     Player, PlayerStats, Coach, Team, League, TeamSeasonParticipation, Match,
     PlayerSeasonParticipation, CoachSeasonParticipation, Lineup, LineupPlayer,
-    TeamOfTheWeek, TeamOfTheWeekPlayer, MatchEvent
+    TeamOfTheWeek, TeamOfTheWeekPlayer, MatchEvent, MatchPhase
 )
 
 # Inlines
@@ -42,9 +45,23 @@ class LineupInline(admin.TabularInline):
     raw_id_fields = ('team',)
     readonly_fields = ('formation',)
 
+# Search
+class IndexedSearchMixin:
+    """Search the changelist (and autocompletes) through league.search instead of icontains on search_fields."""
+
+    def search_condition(self, search_term):
+        """The rows matching search_term, as a filter the changelist query runs as a subquery."""
+        return search_filter(self.model, search_term)
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return super().get_search_results(request, queryset, search_term)
+        return queryset.filter(self.search_condition(search_term)), False
+
+
 # ModelAdmins
 @admin.register(Player)
-class PlayerAdmin(admin.ModelAdmin):
+class PlayerAdmin(IndexedSearchMixin, admin.ModelAdmin):
     list_display = ("first_name", "last_name", "position", "price", "is_active")
     list_filter = ("position", "is_active")
     search_fields = ("first_name", "last_name")
@@ -58,7 +75,7 @@ class CoachAdmin(admin.ModelAdmin):
     inlines = [CoachSeasonParticipationInline]
 
 @admin.register(Team)
-class TeamAdmin(admin.ModelAdmin):
+class TeamAdmin(IndexedSearchMixin, admin.ModelAdmin):
     list_display = ("name", "is_active")
     list_filter = ("is_active",)
     search_fields = ("name",)
@@ -71,8 +88,8 @@ class LeagueAdmin(admin.ModelAdmin):
     inlines = [TeamSeasonParticipationInline]
 
 @admin.register(Match)
-class MatchAdmin(admin.ModelAdmin):
-    list_display = ('season', 'match_day', 'home_team', 'away_team', 'home_score', 'away_score', 'date', 'status')
+class MatchAdmin(IndexedSearchMixin, admin.ModelAdmin):
+    list_display = ('season', 'match_day', 'home_team', 'away_team', 'home_score', 'away_score', 'date', 'status', 'clock_phase')
     list_filter = ('status', 'season', 'match_day')
     search_fields = ('home_team__name', 'away_team__name')
     raw_id_fields = ('season', 'home_team', 'away_team')
@@ -90,8 +107,57 @@ class MatchAdmin(admin.ModelAdmin):
         ('Timestamps', {
             'fields': ('actual_kickoff_time',)
         }),
+        ('Live Clock', {
+            'fields': ('clock_phase', 'clock_started_at', 'clock_paused_at')
+        }),
     )
-    readonly_fields = ('actual_kickoff_time',)
+    readonly_fields = ('actual_kickoff_time', 'clock_phase', 'clock_started_at', 'clock_paused_at')
+    actions = [
+        'kick_off', 'half_time', 'start_second_half', 'start_extra_time', 'full_time',
+        'pause_clock', 'resume_clock',
+    ]
+
+    def search_condition(self, search_term):
+        # Matches are found by the teams playing them
+        teams = Team.objects.filter(search_filter(Team, search_term)).values('id')
+        return Q(home_team_id__in=teams) | Q(away_team_id__in=teams)
+
+    def _start_phase(self, request, queryset, phase):
+        for match in queryset:
+            start_match_phase(match, phase)
+        self.message_user(request, f"{queryset.count()} matches moved to {phase.label}.", messages.SUCCESS)
+
+    def kick_off(self, request, queryset):
+        self._start_phase(request, queryset, MatchPhase.FIRST_HALF)
+    kick_off.short_description = "Kick off (start first half clock)"
+
+    def half_time(self, request, queryset):
+        self._start_phase(request, queryset, MatchPhase.HALF_TIME)
+    half_time.short_description = "Half time"
+
+    def start_second_half(self, request, queryset):
+        self._start_phase(request, queryset, MatchPhase.SECOND_HALF)
+    start_second_half.short_description = "Start second half clock"
+
+    def start_extra_time(self, request, queryset):
+        self._start_phase(request, queryset, MatchPhase.EXTRA_TIME)
+    start_extra_time.short_description = "Start extra time clock"
+
+    def full_time(self, request, queryset):
+        self._start_phase(request, queryset, MatchPhase.FULL_TIME)
+    full_time.short_description = "Full time (stop clock)"
+
+    def pause_clock(self, request, queryset):
+        for match in queryset:
+            pause_match_clock(match)
+        self.message_user(request, f"Clock paused for {queryset.count()} matches.", messages.SUCCESS)
+    pause_clock.short_description = "Pause clock (stoppage)"
+
+    def resume_clock(self, request, queryset):
+        for match in queryset:
+            resume_match_clock(match)
+        self.message_user(request, f"Clock resumed for {queryset.count()} matches.", messages.SUCCESS)
+    resume_clock.short_description = "Resume clock"
 
 @admin.register(PlayerStats)
 class PlayerStatsAdmin(admin.ModelAdmin):
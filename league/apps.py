@@ -1,4 +1,5 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class LeagueConfig(AppConfig):
@@ -8,3 +9,12 @@ class LeagueConfig(AppConfig):
     def ready(self):
         # This imports the signals so they are registered when Django starts.
         import league.signals
+        post_migrate.connect(repair_search_index, sender=self)
+
+
+def repair_search_index(using, **kwargs):
+    # Migrations that rebuild the player or team table drop the SQLite search triggers;
+    # an intact index is left alone, rebuild_search_index rebuilds it on demand
+    from django.db import connections
+    from league.search import install_search_index
+    install_search_index(connections[using], only_missing=True)
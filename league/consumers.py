@@ -0,0 +1,23 @@
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+
+from .live import match_group_name
+
+
+class MatchConsumer(AsyncJsonWebsocketConsumer):
+    """Read-only feed of score changes, events and minute ticks for one match; open to anonymous spectators."""
+
+    async def connect(self):
+        self.match_group = match_group_name(self.scope['url_route']['kwargs']['match_id'])
+        await self.channel_layer.group_add(self.match_group, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, close_code):
+        if hasattr(self, 'match_group'):
+            await self.channel_layer.group_discard(self.match_group, self.channel_name)
+
+    async def receive_json(self, content, **kwargs):
+        # Spectators only listen; updates come from the server
+        pass
+
+    async def match_update(self, event):
+        await self.send_json(event['data'])
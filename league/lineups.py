@@ -0,0 +1,122 @@
+# league/lineups.py
+"""
+Lineup persistence by diff.
+
+A saved lineup is compared with the rows it already has: players that stay keep
+their LineupPlayer row and are only updated when their role or position moved.
+Every affected player gets one LineupChange, sent together in one
+`lineup_changed` signal once the rows are written.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Iterable, List, Optional, Sequence
+
+from django.db import transaction
+from django.dispatch import Signal
+
+from .models import Lineup, LineupPlayer
+from .services import mark_match_dirty
+
+ADDED = 'added'
+REMOVED = 'removed'
+ROLE_CHANGED = 'role_changed'
+MOVED = 'moved'
+
+# Sent with `lineup` and `changes` (a list of LineupChange, one per affected player)
+lineup_changed = Signal()
+
+_applying_diff = ContextVar('applying_lineup_diff', default=False)
+
+
+@dataclass(frozen=True)
+class LineupChange:
+    """What happened to one player of a lineup; the previous fields are None for added players."""
+    kind: str
+    player_id: int
+    is_starter: Optional[bool] = None
+    position: Optional[int] = None
+    previous_is_starter: Optional[bool] = None
+    previous_position: Optional[int] = None
+
+
+@dataclass
+class LineupDiff:
+    """Rows to create, update and delete to turn a lineup's current rows into the saved one."""
+    to_create: List[LineupPlayer] = field(default_factory=list)
+    to_update: List[LineupPlayer] = field(default_factory=list)
+    to_delete: List[LineupPlayer] = field(default_factory=list)
+    changes: List[LineupChange] = field(default_factory=list)
+
+    def __bool__(self):
+        return bool(self.changes)
+
+
+def applying_lineup_diff() -> bool:
+    """True while apply_lineup_diff writes rows, so per-row LineupPlayer signal handlers can stand down."""
+    return _applying_diff.get()
+
+
+@contextmanager
+def _applying():
+    token = _applying_diff.set(True)
+    try:
+        yield
+    finally:
+        _applying_diff.reset(token)
+
+
+def diff_lineup(lineup: Lineup, starter_ids: Sequence[int], substitute_ids: Sequence[int],
+                current: Optional[Iterable[LineupPlayer]] = None) -> LineupDiff:
+    """
+    Compare the saved starters and substitutes (in order) with the lineup's rows.
+    `current` defaults to the lineup's rows as stored.
+    """
+    if current is None:
+        current = lineup.lineupplayer_set.all() if lineup.pk else []
+    current = {row.player_id: row for row in current}
+    wanted = {player_id: (True, i) for i, player_id in enumerate(starter_ids)}
+    wanted.update({player_id: (False, i) for i, player_id in enumerate(substitute_ids)})
+
+    diff = LineupDiff()
+    for player_id, (is_starter, position) in wanted.items():
+        row = current.get(player_id)
+        if row is None:
+            diff.to_create.append(LineupPlayer(lineup=lineup, player_id=player_id, is_starter=is_starter, position=position))
+            diff.changes.append(LineupChange(ADDED, player_id, is_starter, position))
+        elif (row.is_starter, row.position) != (is_starter, position):
+            kind = ROLE_CHANGED if row.is_starter != is_starter else MOVED
+            diff.changes.append(LineupChange(kind, player_id, is_starter, position, row.is_starter, row.position))
+            row.is_starter, row.position = is_starter, position
+            diff.to_update.append(row)
+
+    for player_id, row in current.items():
+        if player_id not in wanted:
+            diff.to_delete.append(row)
+            diff.changes.append(LineupChange(REMOVED, player_id, None, None, row.is_starter, row.position))
+    return diff
+
+
+def apply_lineup_diff(lineup: Lineup, diff: LineupDiff) -> LineupDiff:
+    """Write a diff with one delete, one bulk update and one bulk insert at most, then send lineup_changed."""
+    if not diff:
+        return diff
+    with transaction.atomic():
+        with _applying():
+            if diff.to_delete:
+                LineupPlayer.objects.filter(id__in=[row.id for row in diff.to_delete]).delete()
+            if diff.to_update:
+                LineupPlayer.objects.bulk_update(diff.to_update, ['is_starter', 'position'])
+            if diff.to_create:
+                LineupPlayer.objects.bulk_create(diff.to_create)
+        mark_match_dirty(lineup.match_id)
+        # Receivers write in the same transaction, e.g. notifications and queued emails
+        lineup_changed.send(sender=Lineup, lineup=lineup, changes=diff.changes)
+    return diff
+
+
+def save_lineup(lineup: Lineup, starter_ids: Sequence[int], substitute_ids: Sequence[int]) -> LineupDiff:
+    """Persist a lineup's starters and substitutes, writing only the rows that changed."""
+    with transaction.atomic():
+        current = LineupPlayer.objects.select_for_update().filter(lineup=lineup)
+        return apply_lineup_diff(lineup, diff_lineup(lineup, starter_ids, substitute_ids, current))
@@ -0,0 +1,216 @@
+from dataclasses import dataclass
+from functools import partial
+from typing import Dict, Optional
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Match, MatchPhase, MatchStatus
+
+# Readings are refreshed by every tick; the timeout only bounds staleness when the ticker stops
+CLOCK_CACHE_TIMEOUT = 60
+
+# (minute the period starts at, minute its regulation time ends at)
+PERIODS = {
+    MatchPhase.FIRST_HALF: (0, 45),
+    MatchPhase.SECOND_HALF: (45, 90),
+    MatchPhase.EXTRA_TIME: (90, 120),
+}
+BREAK_MINUTES = {
+    MatchPhase.HALF_TIME: 45,
+    MatchPhase.FULL_TIME: 90,
+}
+
+
+@dataclass(frozen=True)
+class ClockReading:
+    """Phase and playing minute of a live match at one tick."""
+    phase: str
+    minute: int
+    period_end: Optional[int] = None
+    paused: bool = False
+
+    @property
+    def stoppage(self) -> int:
+        if self.period_end is None:
+            return 0
+        return max(0, self.minute - self.period_end)
+
+    @property
+    def display(self) -> str:
+        if self.phase in BREAK_MINUTES:
+            return self.phase
+        if self.stoppage:
+            return f"{self.period_end} + {self.stoppage}'"
+        return f"{self.minute}'"
+
+
+def _elapsed_minutes(start, end) -> int:
+    if start is None or start > end:
+        return 0
+    return int((end - start).total_seconds() // 60)
+
+
+def _kickoff_reading(match, now) -> ClockReading:
+    """Reading for matches whose clock was never started: assumes a 15 minute break after 45 minutes."""
+    total_minutes = _elapsed_minutes(match.actual_kickoff_time or match.date, now)
+    minute = min(90, total_minutes - 15) if total_minutes > 45 else total_minutes
+    if 45 <= total_minutes < 60:
+        return ClockReading(MatchPhase.HALF_TIME, minute)
+    if total_minutes < 45:
+        return ClockReading(MatchPhase.FIRST_HALF, minute, 45)
+    return ClockReading(MatchPhase.SECOND_HALF, minute, 90)
+
+
+def read_match_clock(match, now=None) -> Optional[ClockReading]:
+    """Compute the clock of a LIVE match from its phase and clock timestamps; None for other matches."""
+    if match.status != MatchStatus.LIVE:
+        return None
+
+    now = now or timezone.now()
+    if not match.clock_phase:
+        return _kickoff_reading(match, now)
+    if match.clock_phase in BREAK_MINUTES:
+        return ClockReading(match.clock_phase, BREAK_MINUTES[match.clock_phase])
+
+    start, end = PERIODS[match.clock_phase]
+    stopped_at = match.clock_paused_at or now
+    return ClockReading(
+        match.clock_phase,
+        start + _elapsed_minutes(match.clock_started_at, stopped_at),
+        end,
+        paused=match.clock_paused_at is not None,
+    )
+
+
+def _clock_key(match) -> str:
+    # Keyed by the clock's anchor as well, so a phase change or pause never reads an older reading
+    anchor = match.clock_started_at if match.clock_phase else (match.actual_kickoff_time or match.date)
+    paused = match.clock_paused_at.timestamp() if match.clock_paused_at else ''
+    return f"live_clock:{match.pk}:{match.clock_phase}:{anchor.timestamp() if anchor else ''}:{paused}"
+
+
+def get_match_clock(match) -> Optional[ClockReading]:
+    """Reading of the last tick for a LIVE match, computed here only when the ticker has not run."""
+    if match.status != MatchStatus.LIVE:
+        return None
+    reading = cache.get(_clock_key(match))
+    if reading is None:
+        reading = read_match_clock(match)
+    return reading
+
+
+def match_group_name(match_id: int) -> str:
+    """Channel layer group shared by every spectator of a match."""
+    return f"match_{match_id}"
+
+
+def _clock_fields(match) -> dict:
+    reading = match.live_clock()
+    return {
+        "phase": reading.phase if reading else match.clock_phase,
+        "minute": reading.display if reading else "",
+        "paused": reading.paused if reading else False,
+    }
+
+
+def match_state_payload(match) -> dict:
+    """Score, status and clock of a match as pushed to spectators."""
+    return {
+        "type": "score",
+        "home_score": match.home_score,
+        "away_score": match.away_score,
+        "status": match.status,
+        **_clock_fields(match),
+    }
+
+
+def match_minute_payload(match) -> dict:
+    """Clock tick of a LIVE match."""
+    return {"type": "minute", "status": match.status, **_clock_fields(match)}
+
+
+def match_event_payload(event) -> dict:
+    """A recorded MatchEvent as pushed to spectators."""
+    player = event.player
+    return {
+        "type": "event",
+        "id": event.pk,
+        "event_type": event.event_type,
+        "label": event.get_event_type_display(),
+        "minute": event.minute,
+        "player": f"{player.first_name} {player.last_name}" if player else None,
+        "player_id": player.pk if player else None,
+        "commentary": event.commentary or "",
+    }
+
+
+def push_match_update(match_id: int, payload: dict) -> None:
+    """Push a realtime update to everyone watching a match."""
+    channel_layer = get_channel_layer()
+    if not channel_layer:
+        return
+    async_to_sync(channel_layer.group_send)(
+        match_group_name(match_id),
+        {"type": "match.update", "data": payload},
+    )
+
+
+def push_match_update_on_commit(match_id: int, payload: dict) -> None:
+    """Push once the write that produced the update has committed, so spectators never see rolled back data."""
+    transaction.on_commit(partial(push_match_update, match_id, payload))
+
+
+def tick_live_clocks(now=None, timeout=CLOCK_CACHE_TIMEOUT) -> Dict[int, ClockReading]:
+    """
+    Compute the clock of every LIVE match once, share the readings through the cache
+    and push them to spectators. Returns the readings by match id.
+
+    Renders in other processes only see the readings through a shared cache
+    (REDIS_URL); otherwise they compute the clock themselves.
+    """
+    now = now or timezone.now()
+    matches = Match.objects.filter(status=MatchStatus.LIVE).only(
+        'id', 'status', 'date', 'actual_kickoff_time', 'clock_phase', 'clock_started_at', 'clock_paused_at'
+    )
+    readings = {}
+    cached = {}
+    for match in matches:
+        match._live_clock = readings[match.pk] = read_match_clock(match, now)
+        cached[_clock_key(match)] = match._live_clock
+    cache.set_many(cached, timeout)
+
+    for match in matches:
+        push_match_update(match.pk, match_minute_payload(match))
+    return readings
+
+
+def start_match_phase(match, phase, now=None) -> None:
+    """Move the clock of a match to a new phase; kicking off the first half also puts the match LIVE."""
+    now = now or timezone.now()
+    if phase == MatchPhase.FIRST_HALF and match.status == MatchStatus.SCHEDULED:
+        match.status = MatchStatus.LIVE
+    match.clock_phase = phase
+    match.clock_started_at = now if phase in PERIODS else None
+    match.clock_paused_at = None
+    match.save(update_fields=['status', 'clock_phase', 'clock_started_at', 'clock_paused_at', 'actual_kickoff_time'])
+
+
+def pause_match_clock(match, now=None) -> None:
+    """Stop the clock, e.g. for an injury or a stoppage in play."""
+    if match.clock_phase not in PERIODS or match.clock_paused_at:
+        return
+    match.clock_paused_at = now or timezone.now()
+    match.save(update_fields=['clock_paused_at'])
+
+
+def resume_match_clock(match, now=None) -> None:
+    """Restart a stopped clock; the pause is skipped by moving the phase start forward."""
+    if not match.clock_paused_at:
+        return
+    match.clock_started_at += (now or timezone.now()) - match.clock_paused_at
+    match.clock_paused_at = None
+    match.save(update_fields=['clock_started_at', 'clock_paused_at'])
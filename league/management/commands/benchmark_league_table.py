@@ -0,0 +1,71 @@
+import random
+import time
+from itertools import permutations
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from league.models import League, Match, MatchStatus, Team, TeamSeasonParticipation
+from league.services import update_league_table
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Benchmark update_league_table against synthetic double round robin seasons (data is rolled back)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10, 20, 40], help='Team counts to benchmark')
+        parser.add_argument('--repeat', type=int, default=3, help='Rebuilds per size (best time is reported)')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'teams':>6} {'matches':>8} {'queries':>8} {'best ms':>9}")
+        for size in options['sizes']:
+            try:
+                with transaction.atomic():
+                    league, match_count = self._seed_season(size)
+                    best, queries = self._time_rebuild(league, options['repeat'])
+                    raise _Rollback
+            except _Rollback:
+                pass
+            self.stdout.write(f"{size:>6} {match_count:>8} {queries:>8} {best * 1000:>9.2f}")
+
+    def _seed_season(self, team_count):
+        league = League.objects.create(year=1900, session='S', is_active=False)
+        teams = Team.objects.bulk_create([Team(name=f"Bench Team {i}") for i in range(team_count)])
+        TeamSeasonParticipation.objects.bulk_create([
+            TeamSeasonParticipation(team=team, league=league) for team in teams
+        ])
+
+        # bulk_create skips the match signals, so the table starts out stale
+        now = timezone.now()
+        matches = [
+            Match(
+                season=league,
+                home_team=home,
+                away_team=away,
+                home_score=random.randint(0, 4),
+                away_score=random.randint(0, 4),
+                date=now,
+                status=MatchStatus.FINISHED,
+            )
+            for home, away in permutations(teams, 2)
+        ]
+        Match.objects.bulk_create(matches, batch_size=500)
+        return league, len(matches)
+
+    def _time_rebuild(self, league, repeat):
+        best = None
+        queries = 0
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as ctx:
+                start = time.perf_counter()
+                update_league_table(league)
+                elapsed = time.perf_counter() - start
+            queries = len(ctx.captured_queries)
+            best = elapsed if best is None else min(best, elapsed)
+        return best, queries
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from league.live import CLOCK_CACHE_TIMEOUT, tick_live_clocks
+from league.utils import cache_is_shared
+
+
+class Command(BaseCommand):
+    help = "Tick the clock of every LIVE match and push it to spectators, once or every --interval seconds"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0, help='Seconds between ticks; runs a single tick when 0')
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        if not cache_is_shared():
+            self.stderr.write(self.style.WARNING(
+                'The cache is local to this process (set REDIS_URL for a shared one): '
+                'page renders recompute the clock instead of reading these ticks.'
+            ))
+        # Readings must outlive the gap between two ticks
+        timeout = max(CLOCK_CACHE_TIMEOUT, interval * 2)
+        while True:
+            readings = tick_live_clocks(timeout=timeout)
+            self.stdout.write(self.style.SUCCESS(f'Pushed clock ticks for {len(readings)} live matches'))
+            if interval <= 0:
+                return
+            time.sleep(interval)
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from league.models import League, MatchStatus
+from league.utils import cache_is_shared, get_match_counts, rebuild_match_counts
+
+
+class Command(BaseCommand):
+    help = "Recount the cached per-status match counters (season progress) of every league, or the given ones"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--league', type=int, action='append', dest='league_ids', help='League id to rebuild (repeatable)')
+
+    def handle(self, *args, **options):
+        if not cache_is_shared():
+            self.stderr.write(self.style.WARNING(
+                'The cache is local to this process (set REDIS_URL for a shared one): '
+                'web processes keep their own counters and do not see this rebuild.'
+            ))
+
+        leagues = League.objects.all()
+        if options['league_ids']:
+            leagues = leagues.filter(id__in=options['league_ids'])
+
+        for league in leagues:
+            rebuild_match_counts(league.id)
+            counts = get_match_counts(league.id)
+            self.stdout.write(
+                f"{league}: {counts[MatchStatus.FINISHED]} / {counts['total']} finished, "
+                f"{counts[MatchStatus.LIVE]} live, {counts[MatchStatus.SCHEDULED]} scheduled"
+            )
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt match counters for {leagues.count()} leagues'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from league.search import install_search_index
+
+
+class Command(BaseCommand):
+    help = "Recreate the player and team search indexes and rebuild their contents"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Database to rebuild the indexes of')
+        parser.add_argument('--missing', action='store_true', help='Only install the indexes that are missing')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        installed = install_search_index(connection, only_missing=options['missing'])
+        for model in installed:
+            self.stdout.write(f"{model._meta.verbose_name}: search index installed")
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {len(installed)} search indexes'))
@@ -1,5 +1,7 @@
 from django.core.management.base import BaseCommand
 from league.models import League, TeamSeasonParticipation
+from league.services import update_league_table
+from league.utils import cache_is_shared
 
 
 class Command(BaseCommand):
@@ -19,13 +21,12 @@ class Command(BaseCommand):
         
         self.stdout.write(f'Recalculating stats for league: {league}....')
         
-         # Get all team participations for this league
-        participations = TeamSeasonParticipation.objects.filter(league=league)
-        
-        count = 0
-        for participation in participations:
-            self.stdout.write(f'Updating stats for {participation.team.name}...')
-            participation.update_stats()
-            count += 1
+        update_league_table(league)
+        count = TeamSeasonParticipation.objects.filter(league=league).count()
             
         self.stdout.write(self.style.SUCCESS(f'Successfully recalculated stats for {count} teams in {league}.'))
+        if not cache_is_shared():
+            self.stderr.write(self.style.WARNING(
+                'The cache is local to this process (set REDIS_URL for a shared one): '
+                'web processes keep serving their cached standings until they expire.'
+            ))
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from league.models import League
+from league.utils import cache_is_shared, get_league_standings, standings_cache_stats
+
+
+class Command(BaseCommand):
+    help = "Warm the standings cache for active leagues (or the given ones) and report hit/miss counters"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--league', type=int, action='append', dest='league_ids', help='League id to warm (repeatable)')
+        parser.add_argument('--all', action='store_true', help='Warm every league, not only active ones')
+
+    def handle(self, *args, **options):
+        if not cache_is_shared():
+            self.stderr.write(self.style.WARNING(
+                'The cache is local to this process (set REDIS_URL for a shared one): '
+                'the warmed standings are gone when this command exits.'
+            ))
+
+        leagues = League.objects.all()
+        if options['league_ids']:
+            leagues = leagues.filter(id__in=options['league_ids'])
+        elif not options['all']:
+            leagues = leagues.filter(is_active=True)
+
+        for league in leagues:
+            start = time.perf_counter()
+            standings = get_league_standings(league)
+            elapsed = time.perf_counter() - start
+            self.stdout.write(f'{league}: {len(standings)} teams ({elapsed * 1000:.1f} ms)')
+
+        stats = standings_cache_stats()
+        self.stdout.write(self.style.SUCCESS(f"Standings cache: {stats['hits']} hits, {stats['misses']} misses"))
@@ -0,0 +1,69 @@
+# Generated by Django 5.2.2 on 2026-10-17 17:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_appearances(apps, schema_editor):
+    """Materialize appearances for existing matches from their lineups and PlayerStats."""
+    Match = apps.get_model('league', 'Match')
+    LineupPlayer = apps.get_model('league', 'LineupPlayer')
+    PlayerStats = apps.get_model('league', 'PlayerStats')
+    PlayerSeasonParticipation = apps.get_model('league', 'PlayerSeasonParticipation')
+    PlayerAppearance = apps.get_model('league', 'PlayerAppearance')
+
+    matches = {
+        row[0]: row[1:]
+        for row in Match.objects.values_list('id', 'season_id', 'home_team_id', 'away_team_id', 'home_score', 'away_score')
+    }
+    appeared = {}
+    for match_id, player_id, team_id, is_starter in LineupPlayer.objects.order_by('is_starter').values_list(
+        'lineup__match_id', 'player_id', 'lineup__team_id', 'is_starter'
+    ):
+        appeared[(match_id, player_id)] = (team_id, is_starter)
+
+    team_by_player_league = {}
+    for player_id, league_id, team_id in PlayerSeasonParticipation.objects.filter(is_active=True).order_by('id').values_list(
+        'player_id', 'league_id', 'team_id'
+    ):
+        team_by_player_league.setdefault((player_id, league_id), team_id)
+    for match_id, player_id in PlayerStats.objects.values_list('match_id', 'player_id'):
+        if (match_id, player_id) not in appeared:
+            appeared[(match_id, player_id)] = (team_by_player_league.get((player_id, matches[match_id][0])), False)
+
+    rows = []
+    for (match_id, player_id), (team_id, is_starter) in appeared.items():
+        _, home_team_id, away_team_id, home_score, away_score = matches[match_id]
+        conceded = {home_team_id: away_score, away_team_id: home_score}.get(team_id) if team_id else None
+        rows.append(PlayerAppearance(
+            match_id=match_id, player_id=player_id, team_id=team_id,
+            is_starter=is_starter, conceded=conceded, clean_sheet=conceded == 0,
+        ))
+    PlayerAppearance.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('league', '0019_teamoftheweek_teamoftheweekplayer_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlayerAppearance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('is_starter', models.BooleanField(default=False)),
+                ('conceded', models.PositiveIntegerField(blank=True, help_text="Goals the player's team conceded, if it played in the match", null=True)),
+                ('clean_sheet', models.BooleanField(default=False)),
+                ('match', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='appearances', to='league.match')),
+                ('player', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='appearances', to='league.player')),
+                ('team', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='league.team')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['player', 'team'], name='league_play_player__ee9d71_idx')],
+                'unique_together': {('match', 'player')},
+            },
+        ),
+        migrations.RunPython(backfill_appearances, migrations.RunPython.noop),
+    ]
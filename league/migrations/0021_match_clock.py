@@ -0,0 +1,28 @@
+# Generated by Django 5.2.2 on 2026-10-17 17:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('league', '0020_playerappearance'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='match',
+            name='clock_paused_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='match',
+            name='clock_phase',
+            field=models.CharField(blank=True, choices=[('1H', 'First Half'), ('HT', 'Half Time'), ('2H', 'Second Half'), ('ET', 'Extra Time'), ('FT', 'Full Time')], default='', max_length=2),
+        ),
+        migrations.AddField(
+            model_name='match',
+            name='clock_started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
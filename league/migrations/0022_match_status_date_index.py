@@ -0,0 +1,17 @@
+# Generated by Django 5.2.2 on 2026-10-17 17:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('league', '0021_match_clock'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='match',
+            index=models.Index(fields=['status', 'date', 'id'], name='match_status_date_id_idx'),
+        ),
+    ]
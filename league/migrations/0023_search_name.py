@@ -0,0 +1,38 @@
+# Generated by Django 5.2.2 on 2026-10-17 18:00
+
+import django.db.models.functions.text
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+
+def install_search_index(apps, schema_editor):
+    from league.search import install_search_index
+    install_search_index(schema_editor.connection)
+
+
+def uninstall_search_index(apps, schema_editor):
+    from league.search import uninstall_search_index
+    uninstall_search_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('league', '0022_match_status_date_index'),
+    ]
+
+    operations = [
+        # Only runs on PostgreSQL, and only creates pg_trgm when it is not installed yet
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='player',
+            name='search_name',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.functions.text.Lower(django.db.models.functions.text.Concat('first_name', models.Value(' '), 'last_name')), output_field=models.CharField(max_length=101)),
+        ),
+        migrations.AddField(
+            model_name='team',
+            name='search_name',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.functions.text.Lower('name'), output_field=models.CharField(max_length=50)),
+        ),
+        migrations.RunPython(install_search_index, uninstall_search_index),
+    ]
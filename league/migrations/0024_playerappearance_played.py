@@ -0,0 +1,52 @@
+# Generated by Django 5.2.2 on 2026-10-17 18:51
+
+from django.db import migrations, models
+from django.db.models import Count, Exists, OuterRef, Q
+
+
+def backfill_played(apps, schema_editor):
+    """Mark who actually played, drop clean sheets of unused substitutes and recount the season totals."""
+    PlayerAppearance = apps.get_model('league', 'PlayerAppearance')
+    PlayerStats = apps.get_model('league', 'PlayerStats')
+    MatchEvent = apps.get_model('league', 'MatchEvent')
+    PlayerSeasonParticipation = apps.get_model('league', 'PlayerSeasonParticipation')
+
+    # The admin views create empty stats rows for the whole lineup, so only recorded stats count
+    has_stats = PlayerStats.objects.filter(
+        Q(goals__gt=0) | Q(assists__gt=0) | Q(yellow_cards__gt=0) | Q(red_cards__gt=0),
+        match_id=OuterRef('match_id'), player_id=OuterRef('player_id'),
+    )
+    came_on = MatchEvent.objects.filter(
+        match_id=OuterRef('match_id'), player_id=OuterRef('player_id'), event_type='SUBSTITUTION'
+    )
+    PlayerAppearance.objects.filter(Q(is_starter=True) | Exists(has_stats) | Exists(came_on)).update(played=True)
+    PlayerAppearance.objects.filter(played=False, clean_sheet=True).update(clean_sheet=False)
+
+    counts = {
+        (row['player_id'], row['team_id'], row['match__season_id']): row
+        for row in PlayerAppearance.objects.filter(played=True, match__status='FIN').values(
+            'player_id', 'team_id', 'match__season_id'
+        ).annotate(played_count=Count('id'), clean_sheet_count=Count('id', filter=Q(clean_sheet=True))).order_by()
+    }
+    participations = list(PlayerSeasonParticipation.objects.all())
+    for psp in participations:
+        row = counts.get((psp.player_id, psp.team_id, psp.league_id), {})
+        psp.matches_played = row.get('played_count', 0)
+        psp.clean_sheets = row.get('clean_sheet_count', 0)
+    PlayerSeasonParticipation.objects.bulk_update(participations, ['matches_played', 'clean_sheets'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('league', '0023_search_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='playerappearance',
+            name='played',
+            field=models.BooleanField(default=False, help_text='Started, came on or has recorded stats for the match'),
+        ),
+        migrations.RunPython(backfill_played, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,8 @@
 from django.db import models
 
 from django.core.exceptions import ValidationError
-from django.db.models import Sum, Q, F, Case, When, IntegerField
+from django.db.models import Sum, Q, F, Case, When, IntegerField, Value
+from django.db.models.functions import Concat, Lower
 from django.utils import timezone
 
 from datetime import datetime, date, time, timedelta
@@ -50,6 +51,14 @@ class MatchStatus(models.TextChoices):
     CANCELLED = "CAN", "Cancelled"
 
 
+class MatchPhase(models.TextChoices):
+    FIRST_HALF = "1H", "First Half"
+    HALF_TIME = "HT", "Half Time"
+    SECOND_HALF = "2H", "Second Half"
+    EXTRA_TIME = "ET", "Extra Time"
+    FULL_TIME = "FT", "Full Time"
+
+
    
 
 # --- League/Season Model ---
@@ -73,6 +82,10 @@ class Team(models.Model):
     logo = models.ImageField(upload_to='team_logos/', null=True, blank=True)
     bio = models.TextField(blank=True)
     is_active = models.BooleanField(default=True)
+    # Normalized name indexed for league.search, kept in sync by the database
+    search_name = models.GeneratedField(
+        expression=Lower('name'), output_field=models.CharField(max_length=50), db_persist=True,
+    )
 
     class Meta:
         verbose_name_plural = "Teams"
@@ -121,6 +134,12 @@ class Player(Personel):
 
     position = models.CharField(max_length=2, choices=POSITION_CHOICES)
     price = models.DecimalField(max_digits=10, decimal_places=2, default=0, help_text="Market price for fantasy budget calculations")
+    # Normalized full name indexed for league.search, kept in sync by the database
+    search_name = models.GeneratedField(
+        expression=Lower(Concat('first_name', Value(' '), 'last_name')),
+        output_field=models.CharField(max_length=101),
+        db_persist=True,
+    )
     
 
 
@@ -137,75 +156,117 @@ class Match(models.Model):
 
     actual_kickoff_time = models.DateTimeField(null=True, blank=True)  # Optional kickoff time, incase of timing issues
 
+    # Live clock, driven by the match officials through league.live; blank phase falls back to the kickoff heuristic
+    clock_phase = models.CharField(max_length=2, choices=MatchPhase.choices, blank=True, default='')
+    clock_started_at = models.DateTimeField(null=True, blank=True)  # When the current phase's clock started, shifted past pauses
+    clock_paused_at = models.DateTimeField(null=True, blank=True)  # Set while the clock is stopped
+
     class Meta:
         verbose_name_plural = "Matches"
         indexes = [
             models.Index(fields=['season']),
             models.Index(fields=['home_team', 'away_team']),
+            # Keyset pages of the match list: one status, ordered by (date, id)
+            models.Index(fields=['status', 'date', 'id'], name='match_status_date_id_idx'),
         ]
 
-    
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Capture the loaded column values so changes can be detected without re-reading the row."""
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def _refresh_loaded_values(self, update_fields=None):
+        """Reset the snapshot to the values that were just written, only `update_fields` when given."""
+        if update_fields is None:
+            deferred = self.get_deferred_fields()
+            self._loaded_values = {
+                field.attname: getattr(self, field.attname)
+                for field in self._meta.concrete_fields
+                if field.attname not in deferred
+            }
+            return
+        written = {self._meta.get_field(name).attname for name in update_fields}
+        self._loaded_values = {
+            **(getattr(self, '_loaded_values', None) or {}),
+            **{attname: getattr(self, attname) for attname in written},
+        }
+
+    def previous(self, field_name):
+        """
+        Returns the value `field_name` had when the match was loaded or last saved.
+        Unsaved matches have no previous values and return None.
+        """
+        if self.pk is None:
+            return None
+
+        attname = self._meta.get_field(field_name).attname
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None or attname not in loaded:
+            # Built in memory or loaded with deferred fields: fetch the stored row once
+            stored = Match._base_manager.filter(pk=self.pk).values(
+                *[field.attname for field in self._meta.concrete_fields]
+            ).first() or {}
+            self._loaded_values = {**stored, **(loaded or {})}
+            loaded = self._loaded_values
+        return loaded.get(attname)
+
+    def has_changed(self, field_name):
+        """Returns True if `field_name` differs from its loaded/last saved value."""
+        if self.pk is None:
+            return True
+        attname = self._meta.get_field(field_name).attname
+        return getattr(self, attname) != self.previous(field_name)
+
     def save(self, *args, **kwargs):
-        """Override save method to check live status and update kickoff time."""
-        
-        try:
-            old_instance = Match.objects.get(pk=self.pk)
-        except Match.DoesNotExist:
-            old_instance = None
-        
-       #Set kickoff time only when match status transitions to LIVE
-        is_going_live = self.status == MatchStatus.LIVE and (old_instance is None or old_instance.status != MatchStatus.LIVE)
+        """
+        Override save method to check live status and update kickoff time.
+        The change snapshot is reset only after post_save receivers have run,
+        so they can still use previous()/has_changed().
+        """
+        #Set kickoff time only when match status transitions to LIVE
+        is_going_live = self.status == MatchStatus.LIVE and self.has_changed('status')
 
         if is_going_live and not self.actual_kickoff_time:
             self.actual_kickoff_time = timezone.now()
         
+        # Drop the reading before post_save receivers, they push the new clock
+        self._live_clock = None
         super().save(*args, **kwargs)
+        self._refresh_loaded_values(kwargs.get('update_fields'))
 
-    def get_current_minute(self):
+    def live_clock(self):
         """
-        Returns the current minute of the match if the match is live, 
-        otherwise returns None. This version accounts for a 15-minute half-time break.
+        Returns the ClockReading of a live match, otherwise None.
+        Readings are computed once per tick by the clock ticker and shared through the cache;
+        the instance keeps its reading so repeated calls during a render cost nothing.
         """
         if self.status != MatchStatus.LIVE:
             return None
 
-        kickoff_time = self.actual_kickoff_time or self.date
-        now = timezone.now()
+        if getattr(self, '_live_clock', None) is None:
+            from .live import get_match_clock
+            self._live_clock = get_match_clock(self)
+        return self._live_clock
 
-        if kickoff_time > now:
-            return 0
-
-        elapsed_time = now - kickoff_time
-        total_minutes = int(elapsed_time.total_seconds() // 60)
-
-        # Standard match is 90 minutes + half-time.
-        # If elapsed time is greater than 45 minutes, we assume half-time has started or passed.
-        if total_minutes > 45:
-            # Subtract 15 minutes for the half-time break.
-            # We cap the result at 90 to handle post-match scenarios gracefully.
-            return min(90, total_minutes - 15)
-        
-        return total_minutes
+    def get_current_minute(self):
+        """
+        Returns the current minute of the match if the match is live, 
+        otherwise returns None.
+        """
+        reading = self.live_clock()
+        return reading.minute if reading else None
 
     @property
     def get_display_minute(self):
         """
         Returns a user-friendly string for displaying the match minute,
-        handling half-time and extra time formatting.
+        handling half-time, stoppage and extra time formatting.
         """
-        current_minutes = self.get_current_minute()
-
-        if current_minutes is None:
-            return ""
-
-        if self.status == MatchStatus.LIVE and 45 <= self.get_raw_elapsed_minutes() < 60:
-            return "HT"
-
-        if current_minutes > 90:
-            extra_time = current_minutes - 90
-            return f"90 + {extra_time}'"
-            
-        return f"{current_minutes}'"
+        reading = self.live_clock()
+        return reading.display if reading else ""
         
     def get_raw_elapsed_minutes(self):
         """Helper to get total elapsed minutes without half-time adjustment."""
@@ -327,18 +388,13 @@ class PlayerSeasonParticipation(models.Model):
         )
     
     def update_totals(self):
-        """Update aggregated stats from PlayerStats."""
-        stats = self.get_player_stats().aggregate(
-            total_goals=Sum('goals'),
-            total_assists=Sum('assists'),
-            total_yellow_cards=Sum('yellow_cards'),
-            total_red_cards=Sum('red_cards')
-        )
-        self.goals = stats['total_goals'] or 0
-        self.assists = stats['total_assists'] or 0
-        self.yellow_cards = stats['total_yellow_cards'] or 0
-        self.red_cards = stats['total_red_cards'] or 0
-        self.save(update_fields=['goals', 'assists', 'yellow_cards', 'red_cards'])
+        """Update aggregated stats (including appearances and clean sheets) from PlayerStats."""
+        from .services import PARTICIPATION_TOTAL_FIELDS, recompute_participation_totals
+        from .utils import bump_snapshot_versions_on_commit
+
+        recompute_participation_totals([(self.player_id, self.league_id)])
+        bump_snapshot_versions_on_commit([self.league_id])
+        self.refresh_from_db(fields=PARTICIPATION_TOTAL_FIELDS)
 
     class Meta:
         unique_together = ('player', 'team', 'league')
@@ -534,6 +590,34 @@ class Lineup(models.Model):
         return self.lineupplayer_set.filter(is_starter=False).select_related('player')
 
 
+# --- Player Appearance (materialized) ---
+class PlayerAppearance(models.Model):
+    """
+    One row per (match, player) who was named in a lineup or has PlayerStats for the match.
+    Rebuilt by league.services.rebuild_player_appearances; never edited by hand.
+
+    Only rows with `played` count as a match played or a clean sheet: starters,
+    players with PlayerStats, and substitutes named in a SUBSTITUTION event.
+    An unused substitute is named but did not play.
+    """
+    match = models.ForeignKey(Match, on_delete=models.CASCADE, related_name='appearances')
+    player = models.ForeignKey(Player, on_delete=models.CASCADE, related_name='appearances')
+    team = models.ForeignKey(Team, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    is_starter = models.BooleanField(default=False)
+    played = models.BooleanField(default=False, help_text="Started, came on or has recorded stats for the match")
+    conceded = models.PositiveIntegerField(null=True, blank=True, help_text="Goals the player's team conceded, if it played in the match")
+    clean_sheet = models.BooleanField(default=False)
+
+    class Meta:
+        unique_together = ('match', 'player')
+        indexes = [
+            models.Index(fields=['player', 'team']),
+        ]
+
+    def __str__(self):
+        return f"{self.player} appeared in {self.match}"
+
+
 # --- Team of the Week ---
 class TeamOfTheWeekPlayer(models.Model):
     class Position(models.TextChoices):
@@ -0,0 +1,207 @@
+# league/search.py
+"""
+Ranked player and team search over the normalized `search_name` columns.
+
+PostgreSQL matches through pg_trgm: GIN trigram indexes, ranked by similarity.
+SQLite matches through FTS5 tables with the trigram tokenizer, ranked by bm25,
+which triggers keep in sync with the tables. Other backends, and terms too short
+to have a trigram, fall back to a substring match ranked by prefix.
+"""
+from typing import List, Optional
+
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.expressions import RawSQL
+
+from .models import Player, Team
+
+SEARCH_LIMIT = 20
+# Neither pg_trgm nor the FTS5 trigram tokenizer can match terms shorter than a trigram
+MIN_TRIGRAM_LENGTH = 3
+
+SEARCH_TABLES = {
+    Player: 'league_player_search',
+    Team: 'league_team_search',
+}
+
+
+def normalize_search_text(text) -> str:
+    """Lowercase a search term and collapse its whitespace, as the search_name columns are stored."""
+    return ' '.join(str(text or '').lower().split())
+
+
+# --- Index ---
+
+def _install_sqlite_index(cursor, model, fts_table):
+    table = model._meta.db_table
+    cursor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} "
+        f"USING fts5(search_name, content='{table}', content_rowid='id', tokenize='trigram')"
+    )
+    # Django drops triggers when it rebuilds a table in a later migration, installing is idempotent
+    cursor.execute(
+        f"CREATE TRIGGER IF NOT EXISTS {fts_table}_ai AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts_table}(rowid, search_name) VALUES (new.id, new.search_name); END"
+    )
+    cursor.execute(
+        f"CREATE TRIGGER IF NOT EXISTS {fts_table}_ad AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts_table}({fts_table}, rowid, search_name) VALUES ('delete', old.id, old.search_name); END"
+    )
+    cursor.execute(
+        f"CREATE TRIGGER IF NOT EXISTS {fts_table}_au AFTER UPDATE ON {table} BEGIN "
+        f"INSERT INTO {fts_table}({fts_table}, rowid, search_name) VALUES ('delete', old.id, old.search_name); "
+        f"INSERT INTO {fts_table}(rowid, search_name) VALUES (new.id, new.search_name); END"
+    )
+    cursor.execute(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')")
+
+
+def _install_postgres_index(cursor, model, index_name):
+    # pg_trgm itself is created by migration 0023, which needs the rights to do so
+    cursor.execute(
+        f"CREATE INDEX IF NOT EXISTS {index_name}_trgm "
+        f"ON {model._meta.db_table} USING gin (search_name gin_trgm_ops)"
+    )
+
+
+def _search_index_missing(cursor, vendor, name):
+    if vendor == 'sqlite':
+        objects = [name] + [f'{name}_{suffix}' for suffix in ('ai', 'ad', 'au')]
+        cursor.execute(
+            f"SELECT COUNT(*) FROM sqlite_master WHERE name IN ({', '.join(['%s'] * len(objects))})", objects
+        )
+        return cursor.fetchone()[0] < len(objects)
+    if vendor == 'postgresql':
+        cursor.execute("SELECT 1 FROM pg_indexes WHERE indexname = %s", [f'{name}_trgm'])
+        return cursor.fetchone() is None
+    return False
+
+
+def install_search_index(using=None, only_missing=False):
+    """
+    Create (or repair) the search index of every searchable model and rebuild its contents.
+    With `only_missing`, only the indexes that are missing or incomplete are installed.
+    Returns the models whose index was installed.
+    """
+    conn = using or connection
+    installed = []
+    with conn.cursor() as cursor:
+        for model, name in SEARCH_TABLES.items():
+            if only_missing and not _search_index_missing(cursor, conn.vendor, name):
+                continue
+            if conn.vendor == 'sqlite':
+                _install_sqlite_index(cursor, model, name)
+            elif conn.vendor == 'postgresql':
+                _install_postgres_index(cursor, model, name)
+            else:
+                continue
+            installed.append(model)
+    return installed
+
+
+def uninstall_search_index(using=None):
+    conn = using or connection
+    with conn.cursor() as cursor:
+        for name in SEARCH_TABLES.values():
+            if conn.vendor == 'sqlite':
+                for suffix in ('ai', 'ad', 'au'):
+                    cursor.execute(f"DROP TRIGGER IF EXISTS {name}_{suffix}")
+                cursor.execute(f"DROP TABLE IF EXISTS {name}")
+            elif conn.vendor == 'postgresql':
+                cursor.execute(f"DROP INDEX IF EXISTS {name}_trgm")
+
+
+# --- Queries ---
+
+def _substring_search(queryset, term, order_by, limit):
+    """Substring match on search_name, names starting with the term first."""
+    matches = queryset.filter(search_name__contains=term).annotate(
+        search_rank=Case(When(search_name__startswith=term, then=Value(0)), default=Value(1), output_field=IntegerField())
+    ).order_by('search_rank', *order_by)
+    return list(matches[:limit] if limit else matches)
+
+
+def _postgres_match(model, term):
+    # Imported here, the module needs psycopg which only PostgreSQL deployments install
+    from django.contrib.postgres.lookups import TrigramSimilar
+
+    field = model._meta.get_field('search_name')
+    if 'trigram_similar' not in field.get_lookups():
+        field.register_lookup(TrigramSimilar)
+    # Both conditions can use the GIN trigram index: LIKE '%term%' and the % similarity operator,
+    # which matches above pg_trgm.similarity_threshold (0.3 unless the database sets another)
+    return Q(search_name__contains=term) | Q(search_name__trigram_similar=term)
+
+
+def _postgres_search(queryset, term, order_by, limit):
+    from django.contrib.postgres.search import TrigramSimilarity
+
+    matches = queryset.filter(_postgres_match(queryset.model, term)).annotate(
+        search_rank=TrigramSimilarity('search_name', term)
+    ).order_by('-search_rank', *order_by)
+    return list(matches[:limit] if limit else matches)
+
+
+def _fts_phrase(term):
+    # Quoted as one FTS5 string, so the term is matched as a substring and never parsed as a query
+    return '"%s"' % term.replace('"', '""')
+
+
+def _sqlite_match(model, term):
+    fts_table = SEARCH_TABLES[model]
+    return Q(pk__in=RawSQL(f"SELECT rowid FROM {fts_table} WHERE {fts_table} MATCH %s", [_fts_phrase(term)]))
+
+
+def _sqlite_search(queryset, term, limit):
+    model = queryset.model
+    fts_table = SEARCH_TABLES[model]
+    # bm25 rank of the row's own match; FTS5 answers MATCH with a rowid constraint from the index
+    rank = RawSQL(
+        f"SELECT rank FROM {fts_table} WHERE {fts_table} MATCH %s AND rowid = {model._meta.db_table}.id",
+        [_fts_phrase(term)],
+    )
+    ranked = queryset.filter(_sqlite_match(model, term)).annotate(search_rank=rank).order_by('search_rank', 'id')
+    return list(ranked[:limit] if limit else ranked)
+
+
+def search_filter(model, q) -> Q:
+    """
+    The rows of `model` matching `q`, unranked, as a filter condition. Unlike the
+    search functions it is not evaluated on its own, so it composes into a larger
+    query (e.g. the transfer market) as a subquery.
+    """
+    term = normalize_search_text(q)
+    if not term:
+        return Q(pk__in=[])
+    if len(term) < MIN_TRIGRAM_LENGTH:
+        return Q(search_name__contains=term)
+    if connection.vendor == 'postgresql':
+        return _postgres_match(model, term)
+    if connection.vendor == 'sqlite':
+        return _sqlite_match(model, term)
+    return Q(search_name__contains=term)
+
+
+def _search(queryset, q, order_by, limit):
+    term = normalize_search_text(q)
+    if not term:
+        return []
+    if len(term) < MIN_TRIGRAM_LENGTH:
+        return _substring_search(queryset, term, order_by, limit)
+    if connection.vendor == 'postgresql':
+        return _postgres_search(queryset, term, order_by, limit)
+    if connection.vendor == 'sqlite':
+        return _sqlite_search(queryset, term, limit)
+    return _substring_search(queryset, term, order_by, limit)
+
+
+def search_players(q, position: Optional[str] = None, limit: Optional[int] = SEARCH_LIMIT) -> List[Player]:
+    """Players whose name matches `q`, best match first; `limit=None` returns every match."""
+    players = Player.objects.all()
+    if position:
+        players = players.filter(position=position)
+    return _search(players, q, ('last_name', 'first_name', 'id'), limit)
+
+
+def search_teams(q, limit: Optional[int] = SEARCH_LIMIT) -> List[Team]:
+    """Teams whose name matches `q`, best match first; `limit=None` returns every match."""
+    return _search(Team.objects.all(), q, ('name', 'id'), limit)
@@ -1,65 +1,555 @@
-from league.models import Match, TeamSeasonParticipation, Team, League, MatchStatus
-from django.db.models import Q
+import logging
+import weakref
+from datetime import datetime, timedelta, timezone as dt_timezone
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from league.models import (
+    Match, TeamSeasonParticipation, Team, League, MatchStatus, PlayerSeasonParticipation, PlayerStats,
+    LineupPlayer, PlayerAppearance, MatchEvent,
+)
+from django.db import connection, transaction
+from django.db.models import Q, F, Sum, Count, Case, When, IntegerField, prefetch_related_objects
+from django.db.models.expressions import RawSQL
+from league.utils import bump_snapshot_version, bump_table_versions_on_commit
+
+logger = logging.getLogger(__name__)
+
+
+STANDINGS_FIELDS = [
+    'points',
+    'wins',
+    'draws',
+    'losses',
+    'goals_scored',
+    'goals_conceded',
+    'matches_played',
+]
+
+
+def _result_aggregates(team_score, opponent_score):
+    """Conditional aggregates for one side (home or away) of a FINISHED match."""
+    return {
+        'played': Count('id'),
+        'wins': Sum(Case(When(**{f'{team_score}__gt': F(opponent_score)}, then=1), default=0, output_field=IntegerField())),
+        'draws': Sum(Case(When(**{team_score: F(opponent_score)}, then=1), default=0, output_field=IntegerField())),
+        'losses': Sum(Case(When(**{f'{team_score}__lt': F(opponent_score)}, then=1), default=0, output_field=IntegerField())),
+        'goals_scored': Sum(team_score),
+        'goals_conceded': Sum(opponent_score),
+    }
+
+
+def compute_league_table(league: League):
+    """
+    Compute standings for every team with a FINISHED match in the league.
+
+    Uses two grouped aggregate queries (home side and away side) instead of
+    walking the matches in Python. Returns a dict keyed by team_id.
+    """
+    finished = Match.objects.filter(season=league, status=MatchStatus.FINISHED).order_by()
+
+    home_rows = finished.values('home_team_id').annotate(**_result_aggregates('home_score', 'away_score'))
+    away_rows = finished.values('away_team_id').annotate(**_result_aggregates('away_score', 'home_score'))
+
+    table = {}
+    for team_key, rows in (('home_team_id', home_rows), ('away_team_id', away_rows)):
+        for row in rows:
+            totals = table.setdefault(row[team_key], dict.fromkeys(STANDINGS_FIELDS, 0))
+            totals['matches_played'] += row['played']
+            totals['wins'] += row['wins'] or 0
+            totals['draws'] += row['draws'] or 0
+            totals['losses'] += row['losses'] or 0
+            totals['goals_scored'] += row['goals_scored'] or 0
+            totals['goals_conceded'] += row['goals_conceded'] or 0
+
+    for totals in table.values():
+        totals['points'] = totals['wins'] * 3 + totals['draws']
+    return table
 
 
 def update_league_table(league: League):
     """Recalculate team stats for a league based on all FINISHED matches."""
-    #Clear the old stats
-    team_participations = TeamSeasonParticipation.objects.filter(league=league)
-    team_participations.update(
-        points=0,
-        wins=0,
-        draws=0,
-        losses=0,
-        goals_scored=0,
-        goals_conceded=0,
-        matches_played=0,
+    table = compute_league_table(league)
+
+    with transaction.atomic():
+        participations = list(
+            TeamSeasonParticipation.objects.select_for_update().filter(league=league)
+        )
+
+        # Teams without a finished match are reset to zero
+        for participation in participations:
+            totals = table.pop(participation.team_id, None) or dict.fromkeys(STANDINGS_FIELDS, 0)
+            for field, value in totals.items():
+                setattr(participation, field, value)
+        TeamSeasonParticipation.objects.bulk_update(participations, STANDINGS_FIELDS)
+
+        # Ensure each team that played is registered in the league
+        TeamSeasonParticipation.objects.bulk_create([
+            TeamSeasonParticipation(team_id=team_id, league=league, **totals)
+            for team_id, totals in table.items()
+        ])
+        bump_table_versions_on_commit([league.id])
+
+    return True
+
+
+# --- Player season totals ---
+
+PARTICIPATION_TOTAL_FIELDS = [
+    'matches_played',
+    'goals',
+    'assists',
+    'yellow_cards',
+    'red_cards',
+    'clean_sheets',
+]
+
+
+def recompute_participation_totals(pairs):
+    """
+    Recompute season totals for the given (player_id, league_id) pairs.
+
+    Totals are grouped by (player, team, league), the team being the one the
+    player appeared for in each match, so a player who moved teams mid-season
+    has each participation count only its own matches. One grouped sum of
+    PlayerStats over the players' appearances, one grouped count of
+    appearances, then one bulk_update. Appearances and clean sheets only
+    count FINISHED matches the player played in (see PlayerAppearance.played).
+    """
+    pairs = set(pairs)
+    if not pairs:
+        return 0
+
+    player_ids = {player_id for player_id, _ in pairs}
+    league_ids = {league_id for _, league_id in pairs}
+
+    participations = [
+        psp for psp in PlayerSeasonParticipation.objects.filter(player_id__in=player_ids, league_id__in=league_ids)
+        if (psp.player_id, psp.league_id) in pairs
+    ]
+    appearances = PlayerAppearance.objects.filter(player_id__in=player_ids, match__season_id__in=league_ids)
+
+    # Every PlayerStats row has an appearance, which carries the team it was recorded for
+    stats = {
+        (row['player_id'], row['team_id'], row['match__season_id']): row
+        for row in appearances.filter(match__playerstats__player_id=F('player_id')).values(
+            'player_id', 'team_id', 'match__season_id'
+        ).annotate(**{
+            field: Sum(f'match__playerstats__{field}', default=0)
+            for field in ('goals', 'assists', 'yellow_cards', 'red_cards')
+        }).order_by()
+    }
+
+    played = {
+        (row['player_id'], row['team_id'], row['match__season_id']): row
+        for row in appearances.filter(played=True, match__status=MatchStatus.FINISHED).values(
+            'player_id', 'team_id', 'match__season_id'
+        ).annotate(
+            matches_played=Count('id'),
+            clean_sheets=Count('id', filter=Q(clean_sheet=True)),
+        ).order_by()
+    }
+
+    for psp in participations:
+        key = (psp.player_id, psp.team_id, psp.league_id)
+        totals = {**stats.get(key, {}), **played.get(key, {})}
+        for field in PARTICIPATION_TOTAL_FIELDS:
+            setattr(psp, field, totals.get(field, 0))
+    PlayerSeasonParticipation.objects.bulk_update(participations, PARTICIPATION_TOTAL_FIELDS)
+    return len(participations)
+
+
+# --- Fixtures ---
+
+def get_next_matches(team_ids, league=None, status=MatchStatus.SCHEDULED):
+    """
+    Return {team_id: next match} for the given teams, teams without a match are left out.
+
+    One query: each team's matches (a UNION ALL of its home and away fixtures) are
+    ranked with ROW_NUMBER() OVER (PARTITION BY team ORDER BY date), and the rank 1
+    matches are loaded with their teams.
+    """
+    team_ids = set(team_ids)
+    if not team_ids:
+        return {}
+
+    fixtures = Match.objects.filter(status=status)
+    if league is not None:
+        fixtures = fixtures.filter(season=league)
+    home = fixtures.filter(home_team_id__in=team_ids).annotate(team=F('home_team_id')).values_list('id', 'team', 'date')
+    away = fixtures.filter(away_team_id__in=team_ids).annotate(team=F('away_team_id')).values_list('id', 'team', 'date')
+    team_fixtures, params = home.union(away, all=True).order_by().query.sql_with_params()
+
+    ranked = RawSQL(
+        f"SELECT id FROM ("
+        f"SELECT id, ROW_NUMBER() OVER (PARTITION BY team ORDER BY date, id) AS position "
+        f"FROM ({team_fixtures}) team_fixtures"
+        f") ranked WHERE position = 1",
+        params,
+    )
+    next_matches = {}
+    # A match that is next for one team is never earlier than the other team's own next match
+    for match in Match.objects.filter(pk__in=ranked).select_related('home_team', 'away_team').order_by('date', 'id'):
+        for team_id in (match.home_team_id, match.away_team_id):
+            if team_id in team_ids:
+                next_matches.setdefault(team_id, match)
+    return next_matches
+
+
+# --- Match list ---
+
+MATCH_PAGE_SIZE = 10
+# Upcoming fixtures read forwards in time, live matches and results newest first
+MATCH_LIST_ORDER = {
+    MatchStatus.SCHEDULED: 'asc',
+    MatchStatus.LIVE: 'desc',
+    MatchStatus.FINISHED: 'desc',
+}
+_CURSOR_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+@dataclass
+class MatchPage:
+    """One page of a status tab, read with a (date, id) keyset instead of an offset."""
+    status: str
+    matches: List[Match] = field(default_factory=list)
+    next_cursor: Optional[str] = None
+    next_url: str = ''
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.matches)
+
+    def __len__(self):
+        return len(self.matches)
+
+
+def encode_datetime_cursor(value, pk):
+    """Keyset cursor of a (datetime, id) position: '<datetime in epoch microseconds>-<id>'."""
+    return f'{(value - _CURSOR_EPOCH) // timedelta(microseconds=1)}-{pk}'
+
+
+def decode_datetime_cursor(cursor):
+    """Return (datetime, id) of a cursor from encode_datetime_cursor, or None when it is missing or malformed."""
+    try:
+        micros, pk = cursor.split('-', 1)
+        return _CURSOR_EPOCH + timedelta(microseconds=int(micros)), int(pk)
+    except (AttributeError, ValueError, OverflowError):
+        return None
+
+
+def encode_match_cursor(match):
+    """Cursor of the page that starts after `match`."""
+    return encode_datetime_cursor(match.date, match.id)
+
+
+def decode_match_cursor(cursor):
+    """Return (date, id) of a cursor from encode_match_cursor, or None when it is missing or malformed."""
+    return decode_datetime_cursor(cursor)
+
+
+def get_match_page(queryset, status, cursor=None, limit=MATCH_PAGE_SIZE, prefetch=()):
+    """
+    Load one page of `queryset`'s matches with the given status.
+
+    The page is an ordered, limited query that seeks past the cursor's (date, id),
+    so every page costs the same however deep it is. One extra row is read to tell
+    whether there is a next page, and `prefetch` lookups only run for the page.
+    """
+    descending = MATCH_LIST_ORDER[status] == 'desc'
+    matches = queryset.filter(status=status)
+    position = decode_match_cursor(cursor)
+    if position is not None:
+        date, match_id = position
+        if descending:
+            matches = matches.filter(Q(date__lt=date) | Q(date=date, id__lt=match_id))
+        else:
+            matches = matches.filter(Q(date__gt=date) | Q(date=date, id__gt=match_id))
+    matches = list(matches.order_by(*(('-date', '-id') if descending else ('date', 'id')))[:limit + 1])
+
+    page = MatchPage(status=status, matches=matches[:limit])
+    if len(matches) > limit:
+        page.next_cursor = encode_match_cursor(page.matches[-1])
+    if prefetch and page.matches:
+        prefetch_related_objects(page.matches, *prefetch)
+    return page
+
+
+def count_matches_by_status(queryset):
+    """Count `queryset`'s matches per status in one conditional aggregate."""
+    return queryset.aggregate(
+        total_scheduled=Count('id', filter=Q(status=MatchStatus.SCHEDULED)),
+        total_live=Count('id', filter=Q(status=MatchStatus.LIVE)),
+        total_finished=Count('id', filter=Q(status=MatchStatus.FINISHED)),
+        total_matches=Count('id'),
+    )
+
+
+# --- Team season summary ---
+
+FORM_LENGTH = 5
+
+
+@dataclass
+class TeamSeasonSummary:
+    """A team's record in one league, built by get_team_season_summary."""
+    team: Team
+    league: League
+    matches_total: int = 0
+    matches_finished: int = 0
+    matches_live: int = 0
+    matches_scheduled: int = 0
+    wins: int = 0
+    draws: int = 0
+    losses: int = 0
+    goals_scored: int = 0
+    goals_conceded: int = 0
+    recent_results: List[Match] = field(default_factory=list)
+    next_match: Optional[Match] = None
+
+    @property
+    def points(self):
+        return self.wins * 3 + self.draws
+
+    @property
+    def goal_difference(self):
+        return self.goals_scored - self.goals_conceded
+
+    @property
+    def progress(self):
+        """Percentage of the team's fixtures that have been played."""
+        return round(100 * self.matches_finished / self.matches_total) if self.matches_total else 0
+
+    @property
+    def win_ratio(self):
+        """Percentage of played matches that were won."""
+        return round(100 * self.wins / self.matches_finished) if self.matches_finished else 0
+
+    @property
+    def form(self):
+        """Results of the last matches, most recent first, e.g. 'WWDLW'."""
+        return ''.join(match.result for match in self.recent_results)
+
+
+def _result_for(team_id, match):
+    scored, conceded = (
+        (match.home_score, match.away_score) if match.home_team_id == team_id else (match.away_score, match.home_score)
     )
+    return 'W' if scored > conceded else 'D' if scored == conceded else 'L'
 
-    #Get all Finished matches in this league
 
-    finished_matches = Match.objects.filter(season=league, status=MatchStatus.FINISHED)
+def get_team_season_summary(team, league, form_length=FORM_LENGTH):
+    """
+    Summarise a team's season: one conditional aggregate over its fixtures for the
+    counts, results and goals, the last `form_length` results for the form, and
+    the next fixture from get_next_matches.
+    """
+    summary = TeamSeasonSummary(team=team, league=league)
+    if league is None:
+        return summary
 
-    for match in finished_matches:
-        home = match.home_team
-        away = match.away_team
-        home_score = match.home_score
-        away_score = match.away_score
+    fixtures = Match.objects.filter(Q(home_team=team) | Q(away_team=team), season=league)
+    finished = Q(status=MatchStatus.FINISHED)
+    at_home = Q(home_team=team)
+    totals = fixtures.aggregate(
+        matches_total=Count('id'),
+        matches_finished=Count('id', filter=finished),
+        matches_live=Count('id', filter=Q(status=MatchStatus.LIVE)),
+        matches_scheduled=Count('id', filter=Q(status=MatchStatus.SCHEDULED)),
+        wins=Count('id', filter=finished & (
+            Q(at_home, home_score__gt=F('away_score')) | Q(~at_home, away_score__gt=F('home_score'))
+        )),
+        draws=Count('id', filter=finished & Q(home_score=F('away_score'))),
+        losses=Count('id', filter=finished & (
+            Q(at_home, home_score__lt=F('away_score')) | Q(~at_home, away_score__lt=F('home_score'))
+        )),
+        goals_scored=Sum(Case(When(at_home, then=F('home_score')), default=F('away_score')), filter=finished, default=0),
+        goals_conceded=Sum(Case(When(at_home, then=F('away_score')), default=F('home_score')), filter=finished, default=0),
+    )
+    for name, value in totals.items():
+        setattr(summary, name, value)
 
+    if summary.matches_finished:
+        summary.recent_results = list(
+            fixtures.filter(finished).select_related('home_team', 'away_team').order_by('-date')[:form_length]
+        )
+        for match in summary.recent_results:
+            match.result = _result_for(team.id, match)
+    if summary.matches_scheduled:
+        summary.next_match = get_next_matches([team.id], league=league).get(team.id)
+    return summary
 
 
-        #Ensure Each team is registered in the league
+# --- Player appearances ---
 
-        home_stats, _ = TeamSeasonParticipation.objects.get_or_create(team=home, league=league)
+def rebuild_player_appearances(match_ids):
+    """
+    Rebuild the PlayerAppearance rows of the given matches from their lineups and PlayerStats.
 
-        away_stats, _ = TeamSeasonParticipation.objects.get_or_create(team=away, league=league)
+    A player appears if they are named in a lineup or has PlayerStats for the match.
+    Their team is the lineup's team or, when they only have stats, the team of their
+    participation in the match's league: one of the two teams playing if they have
+    one, active participations first. A player with stats and no participation in the
+    league appears without a team and is left out of the season totals, with a warning. A named substitute only played if
+    they have recorded stats (the admin views create empty rows for the whole
+    lineup) or a SUBSTITUTION event; only players who played can keep a clean sheet. Returns the (player_id, league_id) pairs whose appearances
+    existed before or after the rebuild.
+    """
+    match_ids = set(match_ids)
+    if not match_ids:
+        return set()
 
-        # Update basic stats
-        home_stats.matches_played += 1
-        away_stats.matches_played += 1
+    matches = {
+        match_id: (season_id, home_team_id, away_team_id, home_score, away_score)
+        for match_id, season_id, home_team_id, away_team_id, home_score, away_score in Match.objects.filter(
+            id__in=match_ids
+        ).values_list('id', 'season_id', 'home_team_id', 'away_team_id', 'home_score', 'away_score')
+    }
+    old_rows = list(PlayerAppearance.objects.filter(match_id__in=match_ids).values_list('player_id', 'match_id'))
 
-        home_stats.goals_scored += home_score
-        home_stats.goals_conceded += away_score
+    # (match_id, player_id) -> [team_id, is_starter]; a starter wins over a duplicate substitute entry
+    appeared = {}
+    for match_id, player_id, team_id, is_starter in LineupPlayer.objects.filter(
+        lineup__match_id__in=matches
+    ).order_by('is_starter').values_list('lineup__match_id', 'player_id', 'lineup__team_id', 'is_starter'):
+        appeared[(match_id, player_id)] = [team_id, is_starter]
 
-        away_stats.goals_scored += away_score
-        away_stats.goals_conceded += home_score
+    # (match_id, player_id) -> whether the row has recorded stats
+    with_stats = dict(
+        ((match_id, player_id), bool(goals or assists or yellow_cards or red_cards))
+        for match_id, player_id, goals, assists, yellow_cards, red_cards in PlayerStats.objects.filter(
+            match_id__in=matches
+        ).values_list('match_id', 'player_id', 'goals', 'assists', 'yellow_cards', 'red_cards')
+    )
+    stats_only = [key for key in with_stats if key not in appeared]
+    if stats_only:
+        teams_by_player_league = {}
+        for player_id, league_id, team_id in PlayerSeasonParticipation.objects.filter(
+            player_id__in={player_id for _, player_id in stats_only},
+            league_id__in={matches[match_id][0] for match_id, _ in stats_only},
+        ).order_by('-is_active', 'id').values_list('player_id', 'league_id', 'team_id'):
+            teams_by_player_league.setdefault((player_id, league_id), []).append(team_id)
+        for match_id, player_id in stats_only:
+            season_id, home_team_id, away_team_id, _, _ = matches[match_id]
+            team_ids = teams_by_player_league.get((player_id, season_id), [])
+            playing = [team_id for team_id in team_ids if team_id in (home_team_id, away_team_id)]
+            team_id = (playing or team_ids or [None])[0]
+            if team_id is None:
+                logger.warning(
+                    "Player %s has stats for match %s but no participation in league %s; "
+                    "they are left out of the season totals", player_id, match_id, season_id,
+                )
+            appeared[(match_id, player_id)] = [team_id, False]
 
-        # Determine match result
-        if home_score > away_score:
-            home_stats.wins += 1
-            home_stats.points += 3
-            away_stats.losses += 1
-        elif home_score < away_score:
-            away_stats.wins += 1
-            away_stats.points += 3
-            home_stats.losses += 1
+    played = {key for key, (_, is_starter) in appeared.items() if is_starter}
+    played.update(key for key, recorded in with_stats.items() if recorded)
+    unused = {key for key in appeared if key not in played}
+    if unused:
+        played.update(MatchEvent.objects.filter(
+            match_id__in={match_id for match_id, _ in unused},
+            player_id__in={player_id for _, player_id in unused},
+            event_type='SUBSTITUTION',
+        ).values_list('match_id', 'player_id'))
+
+    rows = []
+    for (match_id, player_id), (team_id, is_starter) in appeared.items():
+        _, home_team_id, away_team_id, home_score, away_score = matches[match_id]
+        if team_id is not None and team_id == home_team_id:
+            conceded = away_score
+        elif team_id is not None and team_id == away_team_id:
+            conceded = home_score
         else:
-            home_stats.draws += 1
-            away_stats.draws += 1
-            home_stats.points += 1
-            away_stats.points += 1
+            conceded = None
+        has_played = (match_id, player_id) in played
+        rows.append(PlayerAppearance(
+            match_id=match_id,
+            player_id=player_id,
+            team_id=team_id,
+            is_starter=is_starter,
+            played=has_played,
+            conceded=conceded,
+            clean_sheet=has_played and conceded == 0,
+        ))
+
+    if old_rows:
+        with transaction.atomic():
+            PlayerAppearance.objects.filter(match_id__in=match_ids).delete()
+            PlayerAppearance.objects.bulk_create(rows, batch_size=500)
+    else:
+        PlayerAppearance.objects.bulk_create(rows, batch_size=500)
+
+    touched = {(player_id, match_id) for player_id, match_id in old_rows}
+    touched.update((player_id, match_id) for match_id, player_id in appeared)
+    return {(player_id, matches[match_id][0]) for player_id, match_id in touched if match_id in matches}
+
+
+class _DirtyParticipations:
+    """
+    Per-transaction set of participations and matches whose derived rows are stale.
+    Flushed once from transaction.on_commit; discarded with the transaction on rollback.
+    """
+
+    def __init__(self):
+        self.pairs = set()
+        self.matches = set()
+
+    def flush(self):
+        # Writes made while flushing belong to a new collector
+        ref = getattr(connection, 'dirty_participations', None)
+        if ref is not None and ref() is self:
+            connection.dirty_participations = None
+
+        # Every PlayerStats row has an appearance, so the rebuild also yields the players with stats
+        pairs = set(self.pairs)
+        pairs.update(rebuild_player_appearances(self.matches))
+        recompute_participation_totals(pairs)
+
+        # Leaders and live match stats are part of the league snapshots; the flush already runs after commit
+        for league_id in {league_id for _, league_id in pairs}:
+            bump_snapshot_version(league_id)
+
+
+def _get_collector():
+    """
+    The collector of the current transaction, registered with on_commit on first use.
+
+    Only the on_commit callback holds the collector; the connection keeps a weak
+    reference. Django drops the callback when the transaction or the savepoint it
+    was registered in rolls back, and once it has run, so a dead reference means
+    a new collector (and callback) is needed.
+    """
+    ref = getattr(connection, 'dirty_participations', None)
+    collector = ref() if ref is not None else None
+    if collector is None:
+        collector = _DirtyParticipations()
+        connection.dirty_participations = weakref.ref(collector)
+        transaction.on_commit(collector.flush)
+    return collector
+
+
+def mark_participations_dirty(pairs):
+    """Queue (player_id, league_id) pairs for one batched recompute when the transaction commits."""
+    if not connection.in_atomic_block:
+        collector = _DirtyParticipations()
+        collector.pairs.update(pairs)
+        collector.flush()
+        return
+    _get_collector().pairs.update(pairs)
+
+
+def mark_player_stats_dirty(player_id, match_id):
+    """Queue the participation behind a PlayerStats row; it is found through the match's rebuilt appearances."""
+    mark_match_dirty(match_id)
 
-        home_stats.save()
-        away_stats.save()
 
-    return True
\ No newline at end of file
+def mark_match_dirty(match_id):
+    """Queue a match's appearances and its players' totals, e.g. after its lineups, stats or score changed."""
+    if not connection.in_atomic_block:
+        collector = _DirtyParticipations()
+        collector.matches.add(match_id)
+        collector.flush()
+        return
+    _get_collector().matches.add(match_id)
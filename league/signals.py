@@ -1,56 +1,114 @@
+from django.db.models import F, Case, When, Value, IntegerField
 from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.db import transaction
 from django.dispatch import receiver
-from .models import Match, TeamSeasonParticipation, MatchStatus, PlayerStats, PlayerSeasonParticipation
+from .models import League, Match, TeamSeasonParticipation, MatchStatus, PlayerStats, Lineup, LineupPlayer, PlayerAppearance, MatchEvent
+from .lineups import ADDED, REMOVED, LineupChange, applying_lineup_diff, lineup_changed
+from .live import match_event_payload, match_state_payload, push_match_update_on_commit
+from .services import mark_match_dirty, mark_participations_dirty, mark_player_stats_dirty
+from .utils import (
+    apply_match_count_deltas_on_commit, bump_snapshot_versions_on_commit, bump_table_versions_on_commit,
+    clear_latest_league, match_count_deltas,
+)
 
-def _apply_match_results(match, multiplier=1):
+RESULT_STATE_FIELDS = ('season_id', 'home_team_id', 'away_team_id', 'home_score', 'away_score', 'status')
+LIVE_STATE_FIELDS = ('home_score', 'away_score', 'status', 'clock_phase', 'clock_started_at', 'clock_paused_at')
+COUNTER_STATE_FIELDS = ('season_id', 'home_team_id', 'away_team_id', 'status')
+TABLE_FIELDS = ('points', 'wins', 'draws', 'losses', 'goals_scored', 'goals_conceded', 'matches_played')
+
+
+def _result_state(match):
+    """Return the fields of a match that feed the league table as a plain dict."""
+    return {field: getattr(match, field) for field in RESULT_STATE_FIELDS}
+
+
+def _add_result_deltas(deltas, state, multiplier):
     """
-    Applies or reverts a match's results to the league table.
-    A multiplier of 1 adds the stats, -1 subtracts them.
+    Accumulate the table deltas for one FINISHED match result into `deltas`,
+    keyed by (league_id, team_id). A multiplier of 1 adds the result, -1 reverts it.
     """
-    if not all([match.home_team, match.away_team, match.season]):
+    if not all([state['home_team_id'], state['away_team_id'], state['season_id']]):
         return
 
-    home_stats, _ = TeamSeasonParticipation.objects.get_or_create(team=match.home_team, league=match.season)
-    away_stats, _ = TeamSeasonParticipation.objects.get_or_create(team=match.away_team, league=match.season)
-
-    # Update goals
-    home_stats.goals_scored += match.home_score * multiplier
-    home_stats.goals_conceded += match.away_score * multiplier
-    away_stats.goals_scored += match.away_score * multiplier
-    away_stats.goals_conceded += match.home_score * multiplier
-
-    # Update matches played
-    home_stats.matches_played += 1 * multiplier
-    away_stats.matches_played += 1 * multiplier
-
-    # Update points, wins, losses, draws
-    if match.home_score > match.away_score:
-        home_stats.points += 3 * multiplier
-        home_stats.wins += 1 * multiplier
-        away_stats.losses += 1 * multiplier
-    elif match.away_score > match.home_score:
-        away_stats.points += 3 * multiplier
-        away_stats.wins += 1 * multiplier
-        home_stats.losses += 1 * multiplier
-    else:
-        home_stats.points += 1 * multiplier
-        away_stats.points += 1 * multiplier
-        home_stats.draws += 1 * multiplier
-        away_stats.draws += 1 * multiplier
-
-    home_stats.save()
-    away_stats.save()
+    home_score, away_score = state['home_score'], state['away_score']
+    sides = (
+        (state['home_team_id'], home_score, away_score),
+        (state['away_team_id'], away_score, home_score),
+    )
+    for team_id, scored, conceded in sides:
+        team_deltas = deltas.setdefault((state['season_id'], team_id), dict.fromkeys(TABLE_FIELDS, 0))
+        won, drew, lost = scored > conceded, scored == conceded, scored < conceded
+        team_deltas['goals_scored'] += scored * multiplier
+        team_deltas['goals_conceded'] += conceded * multiplier
+        team_deltas['matches_played'] += multiplier
+        team_deltas['wins'] += won * multiplier
+        team_deltas['draws'] += drew * multiplier
+        team_deltas['losses'] += lost * multiplier
+        team_deltas['points'] += (3 * won + drew) * multiplier
+
+
+def _apply_table_deltas(deltas):
+    """
+    Apply accumulated deltas with one conditional UPDATE per league:
+    ``SET points = points + CASE team_id WHEN ... END`` for every changed column.
+    Rows are updated in the database, so concurrent edits never overwrite each other.
+    """
+    by_league = {}
+    for (league_id, team_id), team_deltas in deltas.items():
+        if any(team_deltas.values()):
+            by_league.setdefault(league_id, {})[team_id] = team_deltas
+
+    # Cached standings of these leagues are stale once the new rows are committed
+    bump_table_versions_on_commit(by_league)
+
+    for league_id, teams in by_league.items():
+        updates = {}
+        for field in TABLE_FIELDS:
+            whens = [When(team_id=team_id, then=Value(d[field])) for team_id, d in teams.items() if d[field]]
+            if whens:
+                updates[field] = F(field) + Case(*whens, default=Value(0), output_field=IntegerField())
+
+        updated = TeamSeasonParticipation.objects.filter(league_id=league_id, team_id__in=teams).update(**updates)
+        if updated == len(teams):
+            continue
+
+        # Ensure each team is registered in the league, then apply to the new rows only
+        existing = set(
+            TeamSeasonParticipation.objects.filter(league_id=league_id, team_id__in=teams).values_list('team_id', flat=True)
+        )
+        missing = {}
+        for team_id in set(teams) - existing:
+            _, created = TeamSeasonParticipation.objects.get_or_create(team_id=team_id, league_id=league_id)
+            if created:
+                missing[(league_id, team_id)] = teams[team_id]
+        if missing:
+            _apply_table_deltas(missing)
+
+
+def _apply_match_results(state, multiplier=1):
+    """
+    Applies or reverts a match result state to the league table.
+    A multiplier of 1 adds the stats, -1 subtracts them.
+    """
+    deltas = {}
+    _add_result_deltas(deltas, state, multiplier)
+    _apply_table_deltas(deltas)
+
+
+def _previous_result_state(instance):
+    """Result state as last loaded/saved, or None if the match was never stored."""
+    if instance.previous('status') is None:
+        return None
+    return {field: instance.previous(field) for field in RESULT_STATE_FIELDS}
 
 @receiver(pre_save, sender=Match)
 def store_old_match_state(sender, instance, **kwargs):
-    """Store the old state of the match instance before it's saved."""
-    if instance.pk:
-        try:
-            instance._old_state = sender.objects.get(pk=instance.pk)
-        except sender.DoesNotExist:
-            instance._old_state = None
-    else:
-        instance._old_state = None
+    """
+    Store the old state of the match instance before it's saved.
+    Reads the change-tracking snapshot on Match, so no extra SELECT is issued
+    for matches that were loaded from the database.
+    """
+    instance._old_state = _previous_result_state(instance)
 
 @receiver(post_save, sender=Match)
 def update_stats_on_match_save(sender, instance, created, **kwargs):
@@ -60,57 +118,182 @@ def update_stats_on_match_save(sender, instance, created, **kwargs):
     - A match becoming FINISHED.
     - A FINISHED match changing status.
     - A FINISHED match's score being updated.
+    The revert of the old result and the apply of the new one are netted
+    into a single set of deltas before touching the table.
     """
     if kwargs.get('raw', False): # Ignore fixture loading
         return
 
     old_state = getattr(instance, '_old_state', None)
+    if old_state and not any(instance.has_changed(field) for field in RESULT_STATE_FIELDS):
+        return
+
+    deltas = {}
 
     # Revert old state if it existed and was FINISHED
-    if old_state and old_state.status == MatchStatus.FINISHED:
-        _apply_match_results(old_state, multiplier=-1)
+    if old_state and old_state['status'] == MatchStatus.FINISHED:
+        _add_result_deltas(deltas, old_state, multiplier=-1)
 
     # Apply new state if it is FINISHED
     if instance.status == MatchStatus.FINISHED:
-        _apply_match_results(instance, multiplier=1)
+        _add_result_deltas(deltas, _result_state(instance), multiplier=1)
+
+    _apply_table_deltas(deltas)
+
+    # Appearances and clean sheets of the players in this match may have changed
+    if not created:
+        mark_match_dirty(instance.pk)
+
+@receiver(post_save, sender=Match)
+def push_match_state_on_save(sender, instance, created, **kwargs):
+    """Pushes the new score, status and clock to spectators of the match once the save has committed."""
+    if kwargs.get('raw', False) or created: # Ignore fixture loading
+        return
+
+    if any(instance.has_changed(field) for field in LIVE_STATE_FIELDS):
+        push_match_update_on_commit(instance.pk, match_state_payload(instance))
+
+@receiver(post_save, sender=Match)
+@receiver(post_delete, sender=Match)
+def bump_league_snapshot_on_match_change(sender, instance, **kwargs):
+    """Fixtures, results and the live match of the match's league (and the one it moved from) are in its snapshot."""
+    if kwargs.get('raw', False): # Ignore fixture loading
+        return
+
+    league_ids = {instance.season_id}
+    if kwargs.get('signal') is post_save and not kwargs.get('created'):
+        league_ids.add(instance.previous('season'))
+    bump_snapshot_versions_on_commit(league_ids - {None})
+
+
+@receiver(post_save, sender=Match)
+def count_match_on_save(sender, instance, created, **kwargs):
+    """Moves the match between the cached per-status counters of its league and teams."""
+    if kwargs.get('raw', False): # Ignore fixture loading
+        return
+
+    old_state = getattr(instance, '_old_state', None)
+    if old_state and not any(instance.has_changed(field) for field in COUNTER_STATE_FIELDS):
+        return
+
+    deltas = match_count_deltas(_result_state(instance), 1)
+    if old_state:
+        for key, delta in match_count_deltas(old_state, -1).items():
+            deltas[key] = deltas.get(key, 0) + delta
+    apply_match_count_deltas_on_commit(deltas)
+
+
+@receiver(pre_delete, sender=Match)
+def uncount_match_on_delete(sender, instance, **kwargs):
+    """Removes a deleted match from the cached counters."""
+    state = _previous_result_state(instance) or _result_state(instance)
+    apply_match_count_deltas_on_commit(match_count_deltas(state, -1))
+
+
+@receiver(post_save, sender=League)
+@receiver(post_delete, sender=League)
+def clear_latest_league_on_change(sender, instance, **kwargs):
+    """A new or (de)activated league may change which league is the latest one."""
+    transaction.on_commit(clear_latest_league)
+
 
 @receiver(pre_delete, sender=Match)
 def revert_stats_on_delete(sender, instance, **kwargs):
     """Revert league stats if a FINISHED match is deleted."""
-    if instance.status == MatchStatus.FINISHED:
-        _apply_match_results(instance, multiplier=-1)
+    # Revert what was last written to the table, not unsaved in-memory edits
+    state = _previous_result_state(instance) or _result_state(instance)
+    if state['status'] == MatchStatus.FINISHED:
+        _apply_match_results(state, multiplier=-1)
+
+    # The cascaded appearances can no longer be traced back to a league once the match is gone
+    mark_participations_dirty(
+        PlayerAppearance.objects.filter(match=instance).values_list('player_id', 'match__season_id')
+    )
 
 
 @receiver(post_save, sender=PlayerStats)
 def update_player_season_stats_on_save(sender, instance, created, **kwargs):
     """
-    Updates PlayerSeasonParticipation aggregated stats when a PlayerStats object is saved.
+    Marks the player's PlayerSeasonParticipation as stale when a PlayerStats object is saved.
+    Totals are recomputed in one batch when the transaction commits.
     """
     if kwargs.get('raw', False): # Ignore fixture loading
         return
 
-    # Get the PlayerSeasonParticipation instance
-    player_psp = PlayerSeasonParticipation.objects.filter(
-        player=instance.player,
-        league=instance.match.season
-    ).first()
-
-    if player_psp:
-        player_psp.update_totals()
+    mark_player_stats_dirty(instance.player_id, instance.match_id)
 
 @receiver(post_delete, sender=PlayerStats)
 def update_player_season_stats_on_delete(sender, instance, **kwargs):
     """
-    Updates PlayerSeasonParticipation aggregated stats when a PlayerStats object is deleted.
+    Marks the player's PlayerSeasonParticipation as stale when a PlayerStats object is deleted.
+    """
+    if kwargs.get('raw', False): # Ignore fixture loading
+        return
+
+    mark_player_stats_dirty(instance.player_id, instance.match_id)
+
+
+@receiver(post_save, sender=Lineup)
+@receiver(post_delete, sender=Lineup)
+def mark_lineup_match_dirty(sender, instance, **kwargs):
+    """
+    Marks the match's appearances as stale when a lineup is saved or deleted.
+    Saving the lineup also covers players that were bulk-created into it.
     """
     if kwargs.get('raw', False): # Ignore fixture loading
         return
 
-    # Get the PlayerSeasonParticipation instance
-    player_psp = PlayerSeasonParticipation.objects.filter(
-        player=instance.player,
-        league=instance.match.season
-    ).first()
+    mark_match_dirty(instance.match_id)
+
+
+@receiver(post_save, sender=LineupPlayer)
+@receiver(post_delete, sender=LineupPlayer)
+def mark_lineup_player_match_dirty(sender, instance, **kwargs):
+    """Marks the match's appearances as stale when a player is added to or removed from a lineup."""
+    if kwargs.get('raw', False) or applying_lineup_diff(): # Ignore fixture loading; diffs mark the match once
+        return
+
+    match_id = Lineup.objects.filter(pk=instance.lineup_id).values_list('match_id', flat=True).first()
+    if match_id is not None:
+        mark_match_dirty(match_id)
+
+
+@receiver(post_save, sender=LineupPlayer)
+def send_lineup_player_added(sender, instance, created, **kwargs):
+    """Reports a player added outside a lineup diff (admin, fixtures scripts) as a lineup change."""
+    if kwargs.get('raw', False) or not created or applying_lineup_diff():
+        return
+
+    lineup_changed.send(sender=Lineup, lineup=instance.lineup, changes=[
+        LineupChange(ADDED, instance.player_id, instance.is_starter, instance.position)
+    ])
+
+
+@receiver(post_delete, sender=LineupPlayer)
+def send_lineup_player_removed(sender, instance, **kwargs):
+    """Reports a player removed outside a lineup diff as a lineup change."""
+    if applying_lineup_diff():
+        return
+
+    lineup_changed.send(sender=Lineup, lineup=instance.lineup, changes=[
+        LineupChange(REMOVED, instance.player_id, None, None, instance.is_starter, instance.position)
+    ])
+
+
+@receiver(post_save, sender=MatchEvent)
+@receiver(post_delete, sender=MatchEvent)
+def mark_substitution_match_dirty(sender, instance, **kwargs):
+    """Marks the match's appearances as stale when a substitution decides whether a substitute played."""
+    if kwargs.get('raw', False) or instance.event_type != 'SUBSTITUTION': # Ignore fixture loading
+        return
+
+    mark_match_dirty(instance.match_id)
+
+
+@receiver(post_save, sender=MatchEvent)
+def push_match_event_on_save(sender, instance, created, **kwargs):
+    """Pushes newly recorded events to spectators of the match."""
+    if kwargs.get('raw', False) or not created: # Ignore fixture loading
+        return
 
-    if player_psp:
-        player_psp.update_totals()
+    push_match_update_on_commit(instance.match_id, match_event_payload(instance))
@@ -1,11 +1,18 @@
-from django.test import TestCase, Client
+from django.test import TestCase, TransactionTestCase, Client, override_settings
+from django.db import connection, OperationalError, transaction
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from django.contrib.auth import get_user_model
 
 from datetime import datetime, timedelta, time
 from unittest.mock import patch
 from django.urls import reverse
+from django.core.management import call_command
+from io import StringIO
 import json
+import tempfile
+import threading
+import time as time_module
 
 import pytest, pytz
 from freezegun import freeze_time
@@ -15,9 +22,14 @@ from league.views import TopStatsView
 
 from league.models import (Team, League, Match, MatchStatus, 
         TeamSeasonParticipation, Coach, Player, 
-        Lineup, CoachSeasonParticipation, PlayerSeasonParticipation, MatchEvent, LineupPlayer, PlayerStats)
-from users.models import UserProfile, Notification
-from league.services import update_league_table
+        Lineup, CoachSeasonParticipation, PlayerSeasonParticipation, MatchEvent, LineupPlayer, PlayerStats,
+        PlayerAppearance)
+from users.models import UserProfile, Notification, OutboundEmail
+from league.lineups import ADDED, MOVED, REMOVED, ROLE_CHANGED, lineup_changed, save_lineup
+from league.search import install_search_index, search_players, search_teams
+from league.services import get_next_matches, update_league_table
+from league.utils import get_league_standings, get_match_counts, get_table_version, standings_cache_stats
+from django.core.cache import cache
 from .forms import MatchEventForm, LineupFormSet, PlayerStatsFormSet
 
 
@@ -397,8 +409,7 @@ class LineupNotificationTests(TestCase):
         if not hasattr(settings, 'DEFAULT_FROM_EMAIL'):
             settings.DEFAULT_FROM_EMAIL = 'test@example.com'
 
-    @patch('users.signals.send_mail')
-    def test_notification_created_on_add_and_remove(self, mock_send_mail):
+    def test_notification_created_on_add_and_remove(self):
         initial_count = Notification.objects.filter(user=self.user).count()
 
         # Add to lineup -> should notify and email
@@ -419,8 +430,112 @@ class LineupNotificationTests(TestCase):
             Notification.objects.filter(user=self.user, title__icontains='removed').exists()                          
         )
                                                                                                                       
-        # Email + realtime called for both actions                                                                    
-        self.assertEqual(mock_send_mail.call_count, 2)
+        # An email queued for both actions
+        self.assertEqual(OutboundEmail.objects.filter(to=[self.user.email]).count(), 2)
+
+class LineupDiffTests(TestCase):
+    """Lineup saves only write the players that changed and report one change per player."""
+
+    def setUp(self):
+        self.league = League.objects.create(year=2025, session='S', is_active=True)
+        self.home = Team.objects.create(name='Diff Home')
+        self.away = Team.objects.create(name='Diff Away')
+        self.players = []
+        for i in range(13):
+            user = get_user_model().objects.create_user(
+                username=f'lineup{i}', email=f'lineup{i}@example.com', password='x', role='player'
+            )
+            player = UserProfile.objects.get(user=user).player
+            PlayerSeasonParticipation.objects.create(player=player, team=self.home, league=self.league, is_active=True)
+            self.players.append(player.id)
+        self.match = Match.objects.create(
+            season=self.league, home_team=self.home, away_team=self.away,
+            date=timezone.now() + timedelta(days=2), status=MatchStatus.SCHEDULED,
+        )
+        self.lineup = Lineup.objects.create(match=self.match, team=self.home)
+        save_lineup(self.lineup, self.players[:11], self.players[11:12])
+        self.row_ids = dict(LineupPlayer.objects.filter(lineup=self.lineup).values_list('player_id', 'id'))
+        Notification.objects.all().delete()
+        OutboundEmail.objects.all().delete()
+
+        self.events = []
+        lineup_changed.connect(self._record, dispatch_uid='lineup_diff_tests')
+        self.addCleanup(lineup_changed.disconnect, dispatch_uid='lineup_diff_tests')
+
+    def _record(self, sender, lineup, changes, **kwargs):
+        self.events.append(changes)
+
+    def _lineup_writes(self, queries):
+        return [
+            q['sql'] for q in queries
+            if 'league_lineupplayer' in q['sql'] and q['sql'].split()[0] in ('INSERT', 'UPDATE', 'DELETE')
+        ]
+
+    def test_unchanged_resave_writes_nothing(self):
+        with CaptureQueriesContext(connection) as ctx:
+            diff = save_lineup(self.lineup, self.players[:11], self.players[11:12])
+
+        self.assertFalse(diff)
+        self.assertEqual(self._lineup_writes(ctx.captured_queries), [])
+        self.assertEqual(self.events, [])
+        self.assertFalse(Notification.objects.exists())
+
+    def test_changes_are_applied_in_place_and_coalesced(self):
+        starters = self.players[:10] + [self.players[11]]
+        with CaptureQueriesContext(connection) as ctx:
+            save_lineup(self.lineup, starters, [self.players[12]])
+
+        # One delete, one bulk update and one insert
+        self.assertEqual(len(self._lineup_writes(ctx.captured_queries)), 3)
+        self.assertEqual(len(self.events), 1)
+        kinds = {change.player_id: change.kind for change in self.events[0]}
+        self.assertEqual(kinds, {self.players[10]: REMOVED, self.players[11]: ROLE_CHANGED, self.players[12]: ADDED})
+
+        rows = dict(LineupPlayer.objects.filter(lineup=self.lineup).values_list('player_id', 'id'))
+        # Players that stayed keep their row
+        for player_id in self.players[:10] + [self.players[11]]:
+            self.assertEqual(rows[player_id], self.row_ids[player_id])
+        self.assertTrue(LineupPlayer.objects.get(id=rows[self.players[11]]).is_starter)
+
+        titles = sorted(Notification.objects.values_list('title', flat=True))
+        self.assertEqual(titles, [
+            "You've been removed from a match lineup",
+            "You've been selected for a match lineup!",
+            "Your lineup role has changed",
+        ])
+        # Role changes are in-app only
+        self.assertEqual(OutboundEmail.objects.count(), 2)
+
+    def test_reordering_starters_only_moves_them(self):
+        starters = [self.players[1], self.players[0]] + self.players[2:11]
+        save_lineup(self.lineup, starters, self.players[11:12])
+
+        self.assertEqual([(c.kind, c.player_id) for c in self.events[0]], [(MOVED, self.players[1]), (MOVED, self.players[0])])
+        self.assertFalse(Notification.objects.exists())
+
+    def test_view_saves_through_diff(self):
+        admin = get_user_model().objects.create_user(
+            username='diffadmin', email='diffadmin@example.com', password='x', role='admin', is_staff=True
+        )
+        self.client.force_login(admin)
+        starters = self.players[:10] + [self.players[12]]
+        response = self.client.post(
+            reverse('manage_lineup', args=[self.match.id]),
+            data=json.dumps({'team_id': self.home.id, 'starters': starters, 'substitutes': self.players[10:12], 'formation': '4-3-3'}),
+            content_type='application/json',
+        )
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()['data']
+        self.assertEqual([p['id'] for p in data['starters']], starters)
+        self.lineup.refresh_from_db()
+        self.assertEqual(self.lineup.formation, '4-3-3')
+        kinds = sorted(change.kind for change in self.events[0])
+        self.assertEqual(kinds, [ADDED, MOVED, ROLE_CHANGED])
+        self.assertEqual(
+            LineupPlayer.objects.get(lineup=self.lineup, player_id=self.players[0]).id, self.row_ids[self.players[0]]
+        )
+
 
 class TestComprehensiveLeagueUpdate(TestCase):
     def setUp(self):
@@ -602,18 +717,20 @@ class PlayerStatsAggregationTests(TestCase):
         self.assertEqual(self.player1_psp.assists, 0)
 
         # 1. Create a PlayerStats object (Match 1)
-        player_stats1 = PlayerStats.objects.create(
-            match=self.match1, player=self.player1, goals=2, assists=1, yellow_cards=0, red_cards=0
-        )
+        with self.captureOnCommitCallbacks(execute=True):
+            player_stats1 = PlayerStats.objects.create(
+                match=self.match1, player=self.player1, goals=2, assists=1, yellow_cards=0, red_cards=0
+            )
 
         self._refresh_psp_stats()
         self.assertEqual(self.player1_psp.goals, 2)
         self.assertEqual(self.player1_psp.assists, 1)
 
         # 2. Create another PlayerStats object for the same player in a different match (Match 2)
-        player_stats2 = PlayerStats.objects.create(
-            match=self.match2, player=self.player1, goals=1, assists=1, yellow_cards=1, red_cards=0
-        )
+        with self.captureOnCommitCallbacks(execute=True):
+            player_stats2 = PlayerStats.objects.create(
+                match=self.match2, player=self.player1, goals=1, assists=1, yellow_cards=1, red_cards=0
+            )
 
         self._refresh_psp_stats()
         self.assertEqual(self.player1_psp.goals, 3)
@@ -623,7 +740,8 @@ class PlayerStatsAggregationTests(TestCase):
 
         # 3. Update an existing PlayerStats object
         player_stats1.goals = 3
-        player_stats1.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            player_stats1.save()
 
         self._refresh_psp_stats()
         self.assertEqual(self.player1_psp.goals, 4) # 3 from match1 + 1 from match2
@@ -631,18 +749,20 @@ class PlayerStatsAggregationTests(TestCase):
 
     def test_player_stats_update_aggregates_on_delete(self):
         # Create PlayerStats first
-        player_stats1 = PlayerStats.objects.create(
-            match=self.match1, player=self.player1, goals=2, assists=1, yellow_cards=0, red_cards=0
-        )
-        player_stats2 = PlayerStats.objects.create(
-            match=self.match2, player=self.player1, goals=1, assists=1, yellow_cards=1, red_cards=0
-        )
+        with self.captureOnCommitCallbacks(execute=True):
+            player_stats1 = PlayerStats.objects.create(
+                match=self.match1, player=self.player1, goals=2, assists=1, yellow_cards=0, red_cards=0
+            )
+            player_stats2 = PlayerStats.objects.create(
+                match=self.match2, player=self.player1, goals=1, assists=1, yellow_cards=1, red_cards=0
+            )
         self._refresh_psp_stats()
         self.assertEqual(self.player1_psp.goals, 3)
         self.assertEqual(self.player1_psp.assists, 2)
 
         # 1. Delete one PlayerStats object
-        player_stats1.delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            player_stats1.delete()
 
         self._refresh_psp_stats()
         self.assertEqual(self.player1_psp.goals, 1) # Only stats from player_stats2 remain
@@ -650,7 +770,8 @@ class PlayerStatsAggregationTests(TestCase):
         self.assertEqual(self.player1_psp.yellow_cards, 1)
 
         # 2. Delete the second PlayerStats object
-        player_stats2.delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            player_stats2.delete()
 
         self._refresh_psp_stats()
         self.assertEqual(self.player1_psp.goals, 0)
@@ -659,9 +780,10 @@ class PlayerStatsAggregationTests(TestCase):
 
     def test_top_stats_view_reflects_updated_player_season_stats(self):
         # Create multiple PlayerStats for different players
-        PlayerStats.objects.create(match=self.match1, player=self.player1, goals=3, assists=1)
-        PlayerStats.objects.create(match=self.match1, player=self.player2, goals=1, assists=2)
-        PlayerStats.objects.create(match=self.match2, player=self.player1, goals=1, assists=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            PlayerStats.objects.create(match=self.match1, player=self.player1, goals=3, assists=1)
+            PlayerStats.objects.create(match=self.match1, player=self.player2, goals=1, assists=2)
+            PlayerStats.objects.create(match=self.match2, player=self.player1, goals=1, assists=1)
 
         self._refresh_psp_stats() # Trigger aggregation via signals
 
@@ -814,4 +936,811 @@ class PlayerProfileViewTests(TestCase):
         self.assertEqual(response.context['total_red_cards'], 1) # 0 + 1
 
         # Check if the correct template is used
-        self.assertTemplateUsed(response, 'player_profile.html')
\ No newline at end of file
+        self.assertTemplateUsed(response, 'player_profile.html')
+
+class UpdateLeagueTableTests(TestCase):
+    """Tests the set-based league table rebuild in league.services."""
+
+    def setUp(self):
+        self.league = League.objects.create(year=2025, session='S', is_active=True)
+        self.teams = [Team.objects.create(name=f"Rebuild Team {i}") for i in range(4)]
+        for team in self.teams[:3]:
+            TeamSeasonParticipation.objects.create(team=team, league=self.league)
+
+        # bulk_create skips the signals, leaving the table stale until rebuilt
+        a, b, c, d = self.teams
+        Match.objects.bulk_create([
+            Match(season=self.league, home_team=a, away_team=b, home_score=2, away_score=1, date=timezone.now(), status=MatchStatus.FINISHED),
+            Match(season=self.league, home_team=b, away_team=a, home_score=0, away_score=0, date=timezone.now(), status=MatchStatus.FINISHED),
+            Match(season=self.league, home_team=c, away_team=a, home_score=3, away_score=1, date=timezone.now(), status=MatchStatus.FINISHED),
+            Match(season=self.league, home_team=d, away_team=c, home_score=1, away_score=2, date=timezone.now(), status=MatchStatus.FINISHED),
+            Match(season=self.league, home_team=b, away_team=c, home_score=5, away_score=0, date=timezone.now(), status=MatchStatus.LIVE),
+        ])
+
+    def _table(self):
+        return {
+            tsp.team_id: (tsp.points, tsp.wins, tsp.draws, tsp.losses, tsp.goals_scored, tsp.goals_conceded, tsp.matches_played)
+            for tsp in TeamSeasonParticipation.objects.filter(league=self.league)
+        }
+
+    def test_rebuild_computes_expected_table(self):
+        self.assertTrue(update_league_table(self.league))
+        a, b, c, d = self.teams
+        table = self._table()
+
+        self.assertEqual(table[a.id], (4, 1, 1, 1, 3, 4, 3))
+        self.assertEqual(table[b.id], (1, 0, 1, 1, 1, 2, 2))
+        self.assertEqual(table[c.id], (6, 2, 0, 0, 5, 2, 2))
+        # Team D played without a participation row; the rebuild registers it
+        self.assertEqual(table[d.id], (0, 0, 0, 1, 1, 2, 1))
+
+    def test_rebuild_matches_per_team_aggregation(self):
+        update_league_table(self.league)
+        rebuilt = self._table()
+
+        for tsp in TeamSeasonParticipation.objects.filter(league=self.league):
+            tsp.update_stats()
+        self.assertEqual(rebuilt, self._table())
+
+    def test_rebuild_resets_teams_without_finished_matches(self):
+        idle = Team.objects.create(name="Idle Team")
+        TeamSeasonParticipation.objects.create(team=idle, league=self.league, points=9, wins=3, matches_played=3)
+
+        update_league_table(self.league)
+        self.assertEqual(self._table()[idle.id], (0, 0, 0, 0, 0, 0, 0))
+
+    def test_rebuild_query_count_is_independent_of_match_count(self):
+        # savepoint, select participations, home/away aggregates, bulk update, bulk create, release
+        with self.assertNumQueries(7):
+            update_league_table(self.league)
+
+        a, b, c, d = self.teams
+        Match.objects.bulk_create([
+            Match(season=self.league, home_team=a, away_team=c, home_score=i, away_score=0, date=timezone.now(), status=MatchStatus.FINISHED)
+            for i in range(20)
+        ])
+        with self.assertNumQueries(6):
+            update_league_table(self.league)
+
+
+class ConcurrentMatchResultTests(TransactionTestCase):
+    """Parallel score edits must not lose updates to the league table."""
+
+    WORKERS = 8
+
+    def setUp(self):
+        self.league = League.objects.create(year=2025, session='S', is_active=True)
+        self.hub = Team.objects.create(name="Hub Team")
+        self.opponents = [Team.objects.create(name=f"Opponent {i}") for i in range(self.WORKERS)]
+        TeamSeasonParticipation.objects.create(team=self.hub, league=self.league)
+        for team in self.opponents:
+            TeamSeasonParticipation.objects.create(team=team, league=self.league)
+        self.match_ids = [
+            Match.objects.create(season=self.league, home_team=self.hub, away_team=opponent, date=timezone.now()).pk
+            for opponent in self.opponents
+        ]
+
+    def _finish_match(self, match_id, barrier, errors):
+        try:
+            match = Match.objects.get(pk=match_id)
+            match.home_score, match.away_score = 2, 1
+            match.status = MatchStatus.FINISHED
+            barrier.wait()
+            for attempt in range(50):
+                try:
+                    with transaction.atomic():
+                        match.save()
+                    break
+                except OperationalError:
+                    # SQLite locks the whole database for writers; retry instead of failing
+                    time_module.sleep(0.01 * (attempt + 1))
+            else:
+                errors.append(f"match {match_id} never saved")
+        except Exception as exc:
+            errors.append(repr(exc))
+        finally:
+            connection.close()
+
+    def test_parallel_score_updates_do_not_lose_points(self):
+        barrier = threading.Barrier(self.WORKERS)
+        errors = []
+        threads = [
+            threading.Thread(target=self._finish_match, args=(match_id, barrier, errors))
+            for match_id in self.match_ids
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        hub = TeamSeasonParticipation.objects.get(team=self.hub, league=self.league)
+        self.assertEqual(hub.points, 3 * self.WORKERS)
+        self.assertEqual(hub.wins, self.WORKERS)
+        self.assertEqual(hub.goals_scored, 2 * self.WORKERS)
+        self.assertEqual(hub.goals_conceded, self.WORKERS)
+        self.assertEqual(hub.matches_played, self.WORKERS)
+
+        # The incremental table agrees with a full rebuild
+        before = list(TeamSeasonParticipation.objects.filter(league=self.league).values_list('team_id', 'points', 'goals_scored'))
+        update_league_table(self.league)
+        after = list(TeamSeasonParticipation.objects.filter(league=self.league).values_list('team_id', 'points', 'goals_scored'))
+        self.assertEqual(sorted(before), sorted(after))
+
+
+class MatchResultSignalQueryTests(TestCase):
+    """The result signals diff against the load-time snapshot instead of re-reading the match."""
+
+    def setUp(self):
+        self.league = League.objects.create(year=2025, session='S', is_active=True)
+        self.home = Team.objects.create(name="Snapshot Home")
+        self.away = Team.objects.create(name="Snapshot Away")
+        TeamSeasonParticipation.objects.create(team=self.home, league=self.league)
+        TeamSeasonParticipation.objects.create(team=self.away, league=self.league)
+        match = Match.objects.create(
+            season=self.league, home_team=self.home, away_team=self.away,
+            home_score=1, away_score=0, date=timezone.now(), status=MatchStatus.FINISHED,
+        )
+        self.match = Match.objects.get(pk=match.pk)
+
+    def test_score_edit_nets_revert_and_apply_into_one_update(self):
+        self.match.home_score = 3
+        # match update plus one conditional table update
+        with self.assertNumQueries(2):
+            self.match.save()
+
+        home = TeamSeasonParticipation.objects.get(team=self.home, league=self.league)
+        self.assertEqual((home.points, home.goals_scored, home.matches_played), (3, 3, 1))
+
+    def test_save_without_result_change_skips_table_update(self):
+        self.match.match_day = 5
+        with self.assertNumQueries(1):
+            self.match.save()
+
+    def test_delete_reverts_last_saved_result(self):
+        # Unsaved edits must not leak into the revert
+        self.match.home_score = 7
+        self.match.delete()
+        home = TeamSeasonParticipation.objects.get(team=self.home, league=self.league)
+        self.assertEqual((home.points, home.goals_scored, home.matches_played), (0, 0, 0))
+
+
+class MatchChangeTrackingTests(TestCase):
+    """Match exposes previous()/has_changed() from its load-time snapshot."""
+
+    def setUp(self):
+        self.league = League.objects.create(year=2025, session='S', is_active=True)
+        self.home = Team.objects.create(name="Tracking Home")
+        self.away = Team.objects.create(name="Tracking Away")
+        TeamSeasonParticipation.objects.create(team=self.home, league=self.league)
+        TeamSeasonParticipation.objects.create(team=self.away, league=self.league)
+        self.match = Match.objects.create(
+            season=self.league, home_team=self.home, away_team=self.away,
+            date=timezone.now() + timedelta(days=1), status=MatchStatus.SCHEDULED,
+        )
+        self.admin = User.objects.create_superuser(email='tracker@test.com', password='password', username='tracker')
+
+    def _match_selects(self, queries):
+        return [q['sql'] for q in queries if q['sql'].startswith('SELECT') and 'FROM "league_match"' in q['sql']]
+
+    def test_previous_and_has_changed_use_the_snapshot(self):
+        match = Match.objects.get(pk=self.match.pk)
+        with self.assertNumQueries(0):
+            match.status = MatchStatus.LIVE
+            self.assertTrue(match.has_changed('status'))
+            self.assertFalse(match.has_changed('home_score'))
+            self.assertEqual(match.previous('status'), MatchStatus.SCHEDULED)
+            self.assertEqual(match.previous('home_team'), self.home.pk)
+
+        match.save()
+        self.assertFalse(match.has_changed('status'))
+        self.assertEqual(match.previous('status'), MatchStatus.LIVE)
+
+    def test_save_with_update_fields_only_refreshes_those_fields(self):
+        match = Match.objects.get(pk=self.match.pk)
+        match.home_score = 2
+        match.away_score = 1
+        match.save(update_fields=['home_score'])
+
+        self.assertFalse(match.has_changed('home_score'))
+        # Not written, so still a change against the stored row
+        self.assertTrue(match.has_changed('away_score'))
+        self.assertEqual(match.previous('away_score'), 0)
+
+    def test_unsaved_match_has_no_previous_values(self):
+        match = Match(season=self.league, home_team=self.home, away_team=self.away, date=timezone.now())
+        with self.assertNumQueries(0):
+            self.assertIsNone(match.previous('status'))
+            self.assertTrue(match.has_changed('status'))
+
+    def test_bulk_status_updates_issue_no_selects(self):
+        for _ in range(4):
+            Match.objects.create(season=self.league, home_team=self.home, away_team=self.away, date=timezone.now())
+        matches = list(Match.objects.all())
+
+        # One UPDATE per match; LIVE does not touch the table
+        with self.assertNumQueries(len(matches)):
+            for match in matches:
+                match.status = MatchStatus.LIVE
+                match.save()
+        self.assertTrue(all(match.actual_kickoff_time for match in matches))
+
+    def test_admin_change_view_reads_match_once(self):
+        self.client.force_login(self.admin)
+        url = reverse('admin:league_match_change', args=[self.match.pk])
+        data = {
+            'season': self.league.pk,
+            'match_day': 1,
+            'date_0': self.match.date.strftime('%Y-%m-%d'),
+            'date_1': self.match.date.strftime('%H:%M:%S'),
+            'status': MatchStatus.FINISHED,
+            'home_team': self.home.pk,
+            'away_team': self.away.pk,
+            'home_score': 2,
+            'away_score': 0,
+            'events-TOTAL_FORMS': 0, 'events-INITIAL_FORMS': 0,
+            'events-MIN_NUM_FORMS': 0, 'events-MAX_NUM_FORMS': 1000,
+            'lineups-TOTAL_FORMS': 0, 'lineups-INITIAL_FORMS': 0,
+            'lineups-MIN_NUM_FORMS': 0, 'lineups-MAX_NUM_FORMS': 1000,
+        }
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(url, data)
+        self.assertEqual(response.status_code, 302)
+
+        # get_object only; the duplicate check and the save no longer re-read the row
+        selects = self._match_selects(ctx.captured_queries)
+        self.assertEqual(len([sql for sql in selects if 'LIMIT 21' in sql]), 1)
+        self.assertEqual(TeamSeasonParticipation.objects.get(team=self.home, league=self.league).points, 3)
+
+    def test_match_form_view_save_query_count(self):
+        self.client.force_login(self.admin)
+        url = reverse('edit_match', args=[self.match.pk])
+        data = {
+            'season': self.league.pk,
+            'match_day': 1,
+            'home_team': self.home.pk,
+            'away_team': self.away.pk,
+            'home_score': 1,
+            'away_score': 1,
+            'date': self.match.date.strftime('%Y-%m-%dT%H:%M'),
+            'status': MatchStatus.LIVE,
+        }
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(url, data)
+        self.assertEqual(response.status_code, 302)
+
+        selects = self._match_selects(ctx.captured_queries)
+        self.assertEqual(len([sql for sql in selects if 'LIMIT 21' in sql]), 1)
+        # session, user, match, form field lookups and validation, duplicate checks, match update
+        self.assertEqual(len(ctx.captured_queries), 14)
+
+
+class PlayerSeasonTotalsBatchTests(TestCase):
+    """PlayerStats writes are collected per transaction and recomputed in one batch on commit."""
+
+    def setUp(self):
+        self.league = League.objects.create(year=2025, session='S', is_active=True)
+        self.home = Team.objects.create(name="Keepers FC")
+        self.away = Team.objects.create(name="Scorers FC")
+        self.home_players = [
+            Player.objects.create(first_name="Home", last_name=str(i), position="DF") for i in range(5)
+        ]
+        self.away_player = Player.objects.create(first_name="Away", last_name="Striker", position="FW")
+        for player in self.home_players:
+            PlayerSeasonParticipation.objects.create(player=player, team=self.home, league=self.league)
+        PlayerSeasonParticipation.objects.create(player=self.away_player, team=self.away, league=self.league)
+
+        self.match = Match.objects.create(
+            season=self.league, home_team=self.home, away_team=self.away,
+            home_score=2, away_score=0, date=timezone.now(), status=MatchStatus.FINISHED
+        )
+
+    def _psp(self, player):
+        return PlayerSeasonParticipation.objects.get(player=player, league=self.league)
+
+    def test_formset_sized_batch_is_one_recompute(self):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            for player in self.home_players:
+                PlayerStats.objects.create(match=self.match, player=player, goals=1)
+
+        # All saves share a single deferred flush
+        self.assertEqual(len(callbacks), 1)
+        # Appearance rebuild: match, old rows, lineups, stats, participation teams, insert;
+        # totals: participations, stats aggregate, appearance aggregate, bulk_update
+        with self.assertNumQueries(10):
+            callbacks[0]()
+
+        for player in self.home_players:
+            psp = self._psp(player)
+            self.assertEqual((psp.goals, psp.matches_played, psp.clean_sheets), (1, 1, 1))
+
+    def test_rolled_back_writes_are_not_flushed(self):
+        try:
+            with transaction.atomic():
+                PlayerStats.objects.create(match=self.match, player=self.away_player, goals=3)
+                raise RuntimeError
+        except RuntimeError:
+            pass
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            PlayerStats.objects.create(match=self.match, player=self.home_players[0], goals=1)
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(self._psp(self.away_player).goals, 0)
+        self.assertEqual(self._psp(self.home_players[0]).goals, 1)
+
+    def test_result_change_updates_appearances_and_clean_sheets(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            PlayerStats.objects.create(match=self.match, player=self.home_players[0], assists=1)
+            PlayerStats.objects.create(match=self.match, player=self.away_player, goals=2)
+        self.assertEqual(self._psp(self.home_players[0]).clean_sheets, 1)
+        self.assertEqual(self._psp(self.away_player).clean_sheets, 0)
+
+        self.match.away_score = 1
+        with self.captureOnCommitCallbacks(execute=True):
+            self.match.save()
+        self.assertEqual(self._psp(self.home_players[0]).clean_sheets, 0)
+
+        self.match.status = MatchStatus.CANCELLED
+        with self.captureOnCommitCallbacks(execute=True):
+            self.match.save()
+        self.assertEqual(self._psp(self.home_players[0]).matches_played, 0)
+
+    def test_totals_follow_the_team_played_for(self):
+        mover = self.home_players[0]
+        PlayerSeasonParticipation.objects.filter(player=mover).update(is_active=False)
+        PlayerSeasonParticipation.objects.create(player=mover, team=self.away, league=self.league)
+        other = Team.objects.create(name="Third FC")
+        later = Match.objects.create(
+            season=self.league, home_team=self.away, away_team=other,
+            home_score=1, away_score=1, date=timezone.now(), status=MatchStatus.FINISHED
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            for match, team, goals in ((self.match, self.home, 1), (later, self.away, 2)):
+                lineup = Lineup.objects.create(match=match, team=team)
+                LineupPlayer.objects.create(lineup=lineup, player=mover, is_starter=True)
+                PlayerStats.objects.create(match=match, player=mover, goals=goals)
+
+        totals = {
+            psp.team_id: (psp.goals, psp.matches_played, psp.clean_sheets)
+            for psp in PlayerSeasonParticipation.objects.filter(player=mover, league=self.league)
+        }
+        self.assertEqual(totals, {self.home.id: (1, 1, 1), self.away.id: (2, 1, 0)})
+
+    def test_stats_without_an_active_participation_are_counted(self):
+        benched = self.home_players[0]
+        PlayerSeasonParticipation.objects.filter(player=benched).update(is_active=False)
+        unregistered = Player.objects.create(first_name="Guest", last_name="Player", position="MF")
+
+        with self.assertLogs('league.services', level='WARNING') as logs:
+            with self.captureOnCommitCallbacks(execute=True):
+                PlayerStats.objects.create(match=self.match, player=benched, goals=1)
+                PlayerStats.objects.create(match=self.match, player=unregistered, goals=1)
+
+        psp = self._psp(benched)
+        self.assertEqual((psp.goals, psp.matches_played), (1, 1))
+        self.assertEqual(PlayerAppearance.objects.get(player=benched).team_id, self.home.id)
+        self.assertIsNone(PlayerAppearance.objects.get(player=unregistered).team_id)
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn(f'Player {unregistered.id} has stats for match {self.match.id}', logs.output[0])
+
+    def test_match_delete_clears_totals(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            PlayerStats.objects.create(match=self.match, player=self.away_player, goals=2, yellow_cards=1)
+        self.assertEqual(self._psp(self.away_player).goals, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.match.delete()
+        psp = self._psp(self.away_player)
+        self.assertEqual((psp.goals, psp.yellow_cards, psp.matches_played), (0, 0, 0))
+
+
+class PlayerAppearanceTests(TestCase):
+    """PlayerAppearance is rebuilt from lineups, PlayerStats and match results when the transaction commits."""
+
+    def setUp(self):
+        self.league = League.objects.create(year=2025, session='S', is_active=True)
+        self.home = Team.objects.create(name="Wall FC")
+        self.away = Team.objects.create(name="Leaky FC")
+        self.keeper = Player.objects.create(first_name="Safe", last_name="Hands", position="GK")
+        self.sub = Player.objects.create(first_name="Bench", last_name="Warmer", position="DF")
+        self.striker = Player.objects.create(first_name="Away", last_name="Nine", position="FW")
+        PlayerSeasonParticipation.objects.create(player=self.keeper, team=self.home, league=self.league)
+        PlayerSeasonParticipation.objects.create(player=self.sub, team=self.home, league=self.league)
+        PlayerSeasonParticipation.objects.create(player=self.striker, team=self.away, league=self.league)
+
+        self.match = Match.objects.create(
+            season=self.league, home_team=self.home, away_team=self.away,
+            home_score=1, away_score=0, date=timezone.now(), status=MatchStatus.FINISHED
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lineup = Lineup.objects.create(match=self.match, team=self.home)
+            LineupPlayer.objects.create(lineup=self.lineup, player=self.keeper, is_starter=True)
+            LineupPlayer.objects.create(lineup=self.lineup, player=self.sub, is_starter=False)
+            PlayerStats.objects.create(match=self.match, player=self.striker, yellow_cards=1)
+
+    def _psp(self, player):
+        return PlayerSeasonParticipation.objects.get(player=player, league=self.league)
+
+    def test_lineups_and_stats_are_materialized(self):
+        rows = {
+            a.player_id: (a.team_id, a.is_starter, a.played, a.conceded, a.clean_sheet)
+            for a in PlayerAppearance.objects.filter(match=self.match)
+        }
+        self.assertEqual(rows, {
+            self.keeper.id: (self.home.id, True, True, 0, True),
+            self.sub.id: (self.home.id, False, False, 0, False),
+            self.striker.id: (self.away.id, False, True, 1, False),
+        })
+        psp = self._psp(self.keeper)
+        self.assertEqual((psp.matches_played, psp.clean_sheets), (1, 1))
+
+    def test_unused_substitute_only_counts_once_brought_on(self):
+        psp = self._psp(self.sub)
+        self.assertEqual((psp.matches_played, psp.clean_sheets), (0, 0))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            event = MatchEvent.objects.create(match=self.match, player=self.sub, event_type='SUBSTITUTION', minute=70)
+        psp = self._psp(self.sub)
+        self.assertEqual((psp.matches_played, psp.clean_sheets), (1, 1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            event.delete()
+        self.assertEqual(self._psp(self.sub).matches_played, 0)
+
+    def test_empty_stats_row_of_unused_substitute_is_not_played(self):
+        admin = get_user_model().objects.create_user(
+            username='statsadmin', email='statsadmin@example.com', password='x', role='admin', is_staff=True
+        )
+        self.client.force_login(admin)
+        # Opening the stats page creates an empty PlayerStats row for every lineup player
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.get(reverse('edit_player_stats', args=[self.match.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(PlayerStats.objects.filter(match=self.match, player=self.sub).exists())
+
+        appearance = PlayerAppearance.objects.get(match=self.match, player=self.sub)
+        self.assertEqual((appearance.played, appearance.clean_sheet), (False, False))
+        psp = self._psp(self.sub)
+        self.assertEqual((psp.matches_played, psp.clean_sheets), (0, 0))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            PlayerStats.objects.filter(match=self.match, player=self.sub).update(assists=1)
+            PlayerStats.objects.get(match=self.match, player=self.sub).save()
+        psp = self._psp(self.sub)
+        self.assertEqual((psp.matches_played, psp.clean_sheets, psp.assists), (1, 1, 1))
+
+    def test_bulk_lineup_save_and_removal(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lineup.lineupplayer_set.all().delete()
+            LineupPlayer.objects.bulk_create([LineupPlayer(lineup=self.lineup, player=self.sub, is_starter=True)])
+            self.lineup.save()
+
+        self.assertFalse(PlayerAppearance.objects.filter(player=self.keeper).exists())
+        self.assertTrue(PlayerAppearance.objects.get(player=self.sub).is_starter)
+        self.assertEqual(self._psp(self.keeper).matches_played, 0)
+
+    def test_result_change_updates_conceded(self):
+        self.match.away_score = 2
+        with self.captureOnCommitCallbacks(execute=True):
+            self.match.save()
+
+        keeper = PlayerAppearance.objects.get(player=self.keeper)
+        self.assertEqual((keeper.conceded, keeper.clean_sheet), (2, False))
+        self.assertEqual(self._psp(self.keeper).clean_sheets, 0)
+
+
+class StandingsCacheTests(TestCase):
+    """Standings are served from the cache until a FINISHED result bumps the league's table version."""
+
+    def setUp(self):
+        cache.clear()
+        self.league = League.objects.create(year=2025, session='S', is_active=True)
+        self.home = Team.objects.create(name="Cached Home")
+        self.away = Team.objects.create(name="Cached Away")
+        TeamSeasonParticipation.objects.create(team=self.home, league=self.league)
+        TeamSeasonParticipation.objects.create(team=self.away, league=self.league)
+        self.match = Match.objects.create(
+            season=self.league, home_team=self.home, away_team=self.away, date=timezone.now()
+        )
+
+    def test_repeat_reads_are_cache_hits(self):
+        get_league_standings(self.league)
+        with self.assertNumQueries(0):
+            standings = get_league_standings(self.league)
+        self.assertEqual(len(standings), 2)
+        self.assertEqual(standings_cache_stats(), {'hits': 1, 'misses': 1})
+
+    def test_finished_match_invalidates_standings(self):
+        get_league_standings(self.league)
+        version = get_table_version(self.league.id)
+
+        self.match.home_score, self.match.away_score = 0, 2
+        self.match.status = MatchStatus.FINISHED
+        with self.captureOnCommitCallbacks(execute=True):
+            self.match.save()
+
+        self.assertGreater(get_table_version(self.league.id), version)
+        standings = get_league_standings(self.league)
+        self.assertEqual([row['team'] for row in standings], [self.away, self.home])
+        self.assertEqual([row['position'] for row in standings], [1, 2])
+
+    def test_non_result_change_keeps_version(self):
+        version = get_table_version(self.league.id)
+        self.match.match_day = 3
+        with self.captureOnCommitCallbacks(execute=True):
+            self.match.save()
+        self.assertEqual(get_table_version(self.league.id), version)
+
+    def test_table_view_serves_cached_fragment(self):
+        url = reverse('league_table', args=[self.league.id])
+        self.client.get(url)
+        # Stale rows in the database are not shown until the version changes
+        TeamSeasonParticipation.objects.filter(team=self.home).update(points=99)
+        self.assertNotContains(self.client.get(url), '>99<')
+
+    def test_warming_a_process_local_cache_warns(self):
+        err = StringIO()
+        call_command('warm_league_standings', stdout=StringIO(), stderr=err)
+        self.assertIn('local to this process', err.getvalue())
+
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': tempfile.mkdtemp()}}
+        with override_settings(CACHES=shared):
+            err = StringIO()
+            call_command('warm_league_standings', stdout=StringIO(), stderr=err)
+            cache.clear()
+        self.assertEqual(err.getvalue(), '')
+
+
+
+class NextMatchResolverTests(TestCase):
+    def setUp(self):
+        self.league = League.objects.create(year=2025, session='S', is_active=True)
+        self.other_league = League.objects.create(year=2024, session='F', is_active=False)
+        self.a, self.b, self.c, self.d, self.idle = (Team.objects.create(name=name) for name in 'ABCDE')
+        now = timezone.now()
+
+        def fixture(home, away, days, league=None, status=MatchStatus.SCHEDULED):
+            return Match.objects.create(
+                season=league or self.league, home_team=home, away_team=away,
+                date=now + timedelta(days=days), status=status,
+            )
+
+        self.ab = fixture(self.a, self.b, 2)
+        self.ca = fixture(self.c, self.a, 3)
+        self.bd = fixture(self.b, self.d, 4)
+        fixture(self.d, self.c, 5)
+        # Earlier, but finished or in another league
+        fixture(self.c, self.d, 1, status=MatchStatus.FINISHED)
+        fixture(self.d, self.a, 1, league=self.other_league)
+
+    def test_resolves_every_team_in_one_query(self):
+        teams = [self.a, self.b, self.c, self.d, self.idle]
+        with self.assertNumQueries(1):
+            next_matches = get_next_matches([team.id for team in teams], league=self.league)
+            opponents = {team_id: (match.home_team.name, match.away_team.name) for team_id, match in next_matches.items()}
+
+        self.assertEqual(next_matches, {self.a.id: self.ab, self.b.id: self.ab, self.c.id: self.ca, self.d.id: self.bd})
+        self.assertEqual(opponents[self.c.id], ('C', 'A'))
+
+    def test_a_teams_next_match_does_not_depend_on_the_other_teams_asked_for(self):
+        self.assertEqual(get_next_matches([self.d.id], league=self.league), {self.d.id: self.bd})
+        self.assertEqual(get_next_matches([self.d.id])[self.d.id].season, self.other_league)
+        self.assertEqual(get_next_matches([self.c.id, self.d.id], league=self.league)[self.d.id], self.bd)
+
+    def test_no_teams_runs_no_query(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(get_next_matches([]), {})
+
+
+class MatchCounterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.league = League.objects.create(year=2025, session='S', is_active=True)
+        self.a, self.b, self.c = (Team.objects.create(name=name) for name in 'ABC')
+        now = timezone.now()
+        self.ab = Match.objects.create(season=self.league, home_team=self.a, away_team=self.b, date=now, status=MatchStatus.FINISHED)
+        self.bc = Match.objects.create(season=self.league, home_team=self.b, away_team=self.c, date=now, status=MatchStatus.SCHEDULED)
+        self.ca = Match.objects.create(season=self.league, home_team=self.c, away_team=self.a, date=now, status=MatchStatus.SCHEDULED)
+
+    def counts(self, team=None):
+        counts = get_match_counts(self.league.id, team.id if team else None)
+        return counts[MatchStatus.FINISHED], counts[MatchStatus.LIVE], counts[MatchStatus.SCHEDULED], counts['total']
+
+    def test_counters_are_built_once_then_read_from_cache(self):
+        self.assertEqual(self.counts(), (1, 0, 2, 3))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.counts(self.a), (1, 0, 1, 2))
+            self.assertEqual(self.counts(self.c), (0, 0, 2, 2))
+
+    def test_status_changes_move_counters_without_recounting(self):
+        self.counts()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.bc.status = MatchStatus.LIVE
+            self.bc.save()
+            Match.objects.create(
+                season=self.league, home_team=self.a, away_team=self.c, date=timezone.now(), status=MatchStatus.SCHEDULED
+            )
+        with self.assertNumQueries(0):
+            self.assertEqual(self.counts(), (1, 1, 2, 4))
+            self.assertEqual(self.counts(self.b), (1, 1, 0, 2))
+            self.assertEqual(self.counts(self.a), (1, 0, 2, 3))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ab.delete()
+        self.assertEqual(self.counts(), (0, 1, 2, 3))
+        self.assertEqual(self.counts(self.a), (0, 0, 2, 2))
+
+    def counter_key(self, team, status):
+        generation = cache.get(f'match_counts:{self.league.id}:generation')
+        return f'match_counts:{self.league.id}:{generation}:{team.id if team else "all"}:{status}'
+
+    def test_an_evicted_counter_is_recounted_instead_of_read_as_zero(self):
+        self.counts()
+        cache.delete(self.counter_key(self.a, MatchStatus.FINISHED))
+        self.assertEqual(self.counts(self.a), (1, 0, 1, 2))
+
+        # A delta for a missing counter drops the generation instead of starting the count from the delta
+        cache.delete(self.counter_key(None, MatchStatus.LIVE))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.bc.status = MatchStatus.LIVE
+            self.bc.save()
+        self.assertIsNone(cache.get(f'match_counts:{self.league.id}:generation'))
+        self.assertEqual(self.counts(), (1, 1, 1, 3))
+
+    def test_rebuild_command_recovers_from_drift(self):
+        self.counts()
+        # Bypasses the signals, as bulk updates do
+        Match.objects.filter(pk=self.ca.pk).update(status=MatchStatus.FINISHED)
+        self.assertEqual(self.counts(), (1, 0, 2, 3))
+
+        err = StringIO()
+        call_command('rebuild_match_counts', league_ids=[self.league.id], stdout=StringIO(), stderr=err)
+        self.assertEqual(self.counts(), (2, 0, 1, 3))
+        # Tests run on the local memory cache, which other processes cannot see
+        self.assertIn('local to this process', err.getvalue())
+        self.assertEqual(self.counts(self.a), (2, 0, 0, 2))
+
+
+class MatchListViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.league = League.objects.create(year=2025, session='S', is_active=True)
+        self.a, self.b = Team.objects.create(name='Alpha'), Team.objects.create(name='Bravo')
+        now = timezone.now().replace(microsecond=0)
+
+        def fixtures(count, status, days):
+            # Pairs of matches share a kickoff, so pages must break ties on id
+            return Match.objects.bulk_create(
+                Match(season=self.league, home_team=self.a, away_team=self.b, status=status,
+                      date=now + timedelta(days=days * (i // 2 + 1)))
+                for i in range(count)
+            )
+
+        fixtures(25, MatchStatus.FINISHED, -1)
+        fixtures(12, MatchStatus.SCHEDULED, 1)
+        fixtures(2, MatchStatus.LIVE, 0)
+        self.url = reverse('match_list')
+
+    def follow_pages(self, context_name):
+        seen, url = [], self.url
+        while url:
+            page = self.client.get(url).context[context_name]
+            seen.extend(page)
+            url = self.url + page.next_url if page.has_next else None
+        return seen
+
+    def test_pages_walk_each_status_once_in_order(self):
+        finished = self.follow_pages('finished_matches')
+        self.assertEqual(
+            [m.id for m in finished],
+            list(Match.objects.filter(status=MatchStatus.FINISHED).order_by('-date', '-id').values_list('id', flat=True)),
+        )
+        upcoming = self.follow_pages('upcoming_matches')
+        self.assertEqual(
+            [m.id for m in upcoming],
+            list(Match.objects.filter(status=MatchStatus.SCHEDULED).order_by('date', 'id').values_list('id', flat=True)),
+        )
+
+    def test_counts_come_from_one_aggregate(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.context['match_stats'], {
+            'total_scheduled': 12, 'total_live': 2, 'total_finished': 25, 'total_matches': 39,
+        })
+        self.assertEqual(len(response.context['finished_matches']), 10)
+        self.assertContains(response, 'finished_cursor=')
+
+    def test_deep_pages_cost_the_same_queries_as_the_first(self):
+        self.client.get(self.url)  # warm the filter option caches
+        with CaptureQueriesContext(connection) as first:
+            self.client.get(self.url)
+        page = self.client.get(self.url).context['finished_matches']
+        page = self.client.get(self.url + page.next_url).context['finished_matches']
+        with CaptureQueriesContext(connection) as deep:
+            self.client.get(self.url + page.next_url)
+        self.assertEqual(len(deep), len(first))
+        self.assertFalse(any('OFFSET' in query['sql'] for query in deep.captured_queries))
+
+    def test_malformed_cursor_shows_the_first_page(self):
+        first = self.client.get(self.url).context['finished_matches']
+        page = self.client.get(self.url, {'finished_cursor': 'nope'}).context['finished_matches']
+        self.assertEqual(list(page), list(first))
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.alpha = Team.objects.create(name='Alpha FC')
+        self.alphaville = Team.objects.create(name='Real Alphaville')
+        self.bravo = Team.objects.create(name='Bravo')
+        self.smith, self.walker, self.johnson = Player.objects.bulk_create([
+            Player(first_name='John', last_name='Smith', position='FW'),
+            Player(first_name='Johnny', last_name='Walker', position='MF'),
+            Player(first_name='Anna', last_name='Johnson', position='GK'),
+        ])
+
+    def test_matches_substrings_case_and_whitespace_insensitively(self):
+        self.assertEqual(search_teams('ALPHA'), [self.alpha, self.alphaville])
+        self.assertEqual(search_teams('  alpha   fc '), [self.alpha])
+        self.assertEqual(set(search_players('john')), {self.smith, self.walker, self.johnson})
+        self.assertEqual(search_players('john smith'), [self.smith])
+        self.assertEqual(search_players(''), [])
+
+    def test_position_and_limit(self):
+        self.assertEqual(search_players('john', position='GK'), [self.johnson])
+        self.assertEqual(len(search_players('john', limit=2)), 2)
+
+    def test_short_terms_rank_prefix_matches_first(self):
+        self.assertEqual(search_players('jo')[:2], [self.smith, self.walker])
+        self.assertEqual(search_players('jo')[2], self.johnson)
+
+    def test_index_follows_updates_and_deletes(self):
+        Player.objects.filter(pk=self.walker.pk).update(first_name='Mike')
+        self.smith.delete()
+        self.assertEqual(search_players('john'), [self.johnson])
+        self.assertEqual(search_players('mike walker'), [self.walker])
+
+    def test_only_a_missing_index_is_repaired_after_migrate(self):
+        self.assertEqual(install_search_index(only_missing=True), [])
+
+        # What a migration that rebuilds the player table leaves behind
+        with connection.cursor() as cursor:
+            cursor.execute("DROP TRIGGER league_player_search_ai")
+        Player.objects.create(first_name='Late', last_name='Signing', position='DF')
+        self.assertEqual(search_players('signing'), [])
+
+        out = StringIO()
+        call_command('rebuild_search_index', missing=True, stdout=out)
+        self.assertIn('Rebuilt 1 search indexes', out.getvalue())
+        self.assertEqual([p.last_name for p in search_players('signing')], ['Signing'])
+
+    def test_query_syntax_is_matched_literally(self):
+        self.assertEqual(search_players('john OR anna'), [])
+        self.assertEqual(search_players('"john'), [])
+
+    def test_match_list_filters_by_team_search(self):
+        league = League.objects.create(year=2025, session='S', is_active=True)
+        home = Match.objects.create(season=league, home_team=self.alpha, away_team=self.bravo, date=timezone.now())
+        away = Match.objects.create(season=league, home_team=self.bravo, away_team=self.alphaville, date=timezone.now())
+        Match.objects.create(season=league, home_team=self.bravo, away_team=self.bravo, date=timezone.now())
+
+        page = self.client.get(reverse('match_list'), {'team_search': 'alpha'}).context['upcoming_matches']
+        self.assertEqual(set(page), {home, away})
+
+        # The search runs inside the match queries, not as a query of its own
+        with CaptureQueriesContext(connection) as plain:
+            self.client.get(reverse('match_list'))
+        with CaptureQueriesContext(connection) as searched:
+            self.client.get(reverse('match_list'), {'team_search': 'alpha'})
+        self.assertEqual(len(searched), len(plain))
+
+    def test_admin_changelist_searches_the_index(self):
+        admin = User.objects.create_superuser(username='admin', email='admin@example.com', password='pass')
+        self.client.force_login(admin)
+        response = self.client.get(reverse('admin:league_player_changelist'), {'q': 'johnson'})
+        self.assertEqual(list(response.context['cl'].result_list), [self.johnson])
+
+        league = League.objects.create(year=2025, session='S', is_active=True)
+        match = Match.objects.create(season=league, home_team=self.bravo, away_team=self.alphaville, date=timezone.now())
+        Match.objects.create(season=league, home_team=self.bravo, away_team=self.bravo, date=timezone.now())
+        response = self.client.get(reverse('admin:league_match_changelist'), {'q': 'alphaville'})
+        self.assertEqual(list(response.context['cl'].result_list), [match])
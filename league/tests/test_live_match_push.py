@@ -0,0 +1,203 @@
+import asyncio
+from datetime import timedelta
+
+import json
+
+from asgiref.sync import async_to_sync, sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import path
+from django.utils import timezone
+from io import StringIO
+
+from league.consumers import MatchConsumer
+from league.live import (
+    match_group_name, pause_match_clock, push_match_update, read_match_clock, resume_match_clock, start_match_phase, tick_live_clocks,
+)
+from league.models import League, Match, MatchEvent, MatchPhase, MatchStatus, Player, Team
+
+IN_MEMORY_LAYER = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYER)
+class LiveMatchPushTests(TestCase):
+    def setUp(self):
+        self.league = League.objects.create(year=2023, session='F', is_active=True)
+        self.home_team = Team.objects.create(name="Home Team")
+        self.away_team = Team.objects.create(name="Away Team")
+        self.player = Player.objects.create(first_name="Live", last_name="Scorer")
+        self.match = Match.objects.create(
+            season=self.league,
+            home_team=self.home_team,
+            away_team=self.away_team,
+            date=timezone.now() - timedelta(minutes=20),
+            status=MatchStatus.SCHEDULED,
+        )
+        self.match.status = MatchStatus.LIVE
+        self.match.actual_kickoff_time = self.match.date
+        self.match.save()
+
+    def score_home_goal(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.match.home_score += 1
+            self.match.save()
+
+    def test_score_change_reaches_1000_subscribers(self):
+        layer = get_channel_layer()
+        group = match_group_name(self.match.pk)
+
+        async def subscribe():
+            channels = [await layer.new_channel() for _ in range(1000)]
+            await asyncio.gather(*(layer.group_add(group, channel) for channel in channels))
+            return channels
+
+        async def receive_all(channels):
+            return await asyncio.gather(*(layer.receive(channel) for channel in channels))
+
+        channels = async_to_sync(subscribe)()
+        self.score_home_goal()
+        messages = async_to_sync(receive_all)(channels)
+
+        self.assertEqual(len(messages), 1000)
+        for message in messages:
+            self.assertEqual(message['type'], 'match.update')
+            self.assertEqual(message['data']['type'], 'score')
+            self.assertEqual(message['data']['home_score'], 1)
+            self.assertEqual(message['data']['status'], MatchStatus.LIVE)
+
+    def test_nothing_is_pushed_before_commit_or_for_unrelated_saves(self):
+        layer = get_channel_layer()
+        channel = async_to_sync(layer.new_channel)()
+        async_to_sync(layer.group_add)(match_group_name(self.match.pk), channel)
+
+        def pushes(callbacks):
+            return [callback for callback in callbacks if getattr(callback, 'func', None) is push_match_update]
+
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            self.match.home_score = 1
+            self.match.save()
+        self.assertEqual(len(pushes(callbacks)), 1)
+
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            self.match.save()
+        self.assertEqual(pushes(callbacks), [])
+
+    def test_websocket_spectator_receives_score_event_and_minute(self):
+        application = URLRouter([path("ws/matches/<int:match_id>/", MatchConsumer.as_asgi())])
+
+        def record_goal():
+            with self.captureOnCommitCallbacks(execute=True):
+                MatchEvent.objects.create(
+                    match=self.match, player=self.player, event_type="GOAL", minute=20, commentary="Top corner"
+                )
+
+        async def watch():
+            # Raw ASGI messages; channels.testing needs daphne, which is not a dependency
+            communicator = ApplicationCommunicator(application, {
+                'type': 'websocket',
+                'path': f"/ws/matches/{self.match.pk}/",
+                'headers': [],
+                'query_string': b'',
+                'subprotocols': [],
+            })
+            await communicator.send_input({'type': 'websocket.connect'})
+            self.assertEqual((await communicator.receive_output())['type'], 'websocket.accept')
+
+            async def receive_json():
+                return json.loads((await communicator.receive_output())['text'])
+
+            await sync_to_async(self.score_home_goal)()
+            score = await receive_json()
+
+            await sync_to_async(record_goal)()
+            event = await receive_json()
+
+            await sync_to_async(call_command)('broadcast_live_minutes', stdout=StringIO(), stderr=StringIO())
+            minute = await receive_json()
+
+            await communicator.send_input({'type': 'websocket.disconnect', 'code': 1000})
+            await communicator.wait()
+            return score, event, minute
+
+        score, event, minute = async_to_sync(watch)()
+
+        self.assertEqual((score['type'], score['home_score'], score['away_score']), ('score', 1, 0))
+        self.assertEqual(event['type'], 'event')
+        self.assertEqual(event['event_type'], 'GOAL')
+        self.assertEqual(event['player'], 'Live Scorer')
+        self.assertEqual(event['commentary'], 'Top corner')
+        self.assertEqual(minute, {
+            'type': 'minute', 'status': MatchStatus.LIVE, 'phase': MatchPhase.FIRST_HALF, 'minute': "20'", 'paused': False,
+        })
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYER)
+class LiveClockTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.kickoff = timezone.now() - timedelta(minutes=30)
+        self.match = Match.objects.create(
+            season=League.objects.create(year=2023, session='F', is_active=True),
+            home_team=Team.objects.create(name="Home Team"),
+            away_team=Team.objects.create(name="Away Team"),
+            date=self.kickoff,
+        )
+
+    def reading_at(self, minutes):
+        return read_match_clock(self.match, now=self.kickoff + timedelta(minutes=minutes))
+
+    def test_phases_stoppage_and_pauses(self):
+        start_match_phase(self.match, MatchPhase.FIRST_HALF, now=self.kickoff)
+        self.assertEqual(self.match.status, MatchStatus.LIVE)
+        self.assertEqual(self.reading_at(20).display, "20'")
+        self.assertEqual(self.reading_at(47).display, "45 + 2'")
+
+        start_match_phase(self.match, MatchPhase.HALF_TIME, now=self.kickoff + timedelta(minutes=48))
+        self.assertEqual(self.reading_at(60).display, "HT")
+
+        start_match_phase(self.match, MatchPhase.SECOND_HALF, now=self.kickoff + timedelta(minutes=63))
+        self.assertEqual(self.reading_at(73).display, "55'")
+
+        # Stoppage in play: the clock holds until it is resumed
+        pause_match_clock(self.match, now=self.kickoff + timedelta(minutes=73))
+        paused = self.reading_at(80)
+        self.assertEqual((paused.display, paused.paused), ("55'", True))
+        resume_match_clock(self.match, now=self.kickoff + timedelta(minutes=80))
+        self.assertEqual(self.reading_at(85).display, "60'")
+        self.assertEqual(self.reading_at(118).display, "90 + 3'")
+
+        start_match_phase(self.match, MatchPhase.FULL_TIME, now=self.kickoff + timedelta(minutes=120))
+        self.assertEqual(self.reading_at(125).display, "FT")
+
+    def test_renders_read_the_shared_tick_reading(self):
+        start_match_phase(self.match, MatchPhase.FIRST_HALF, now=self.kickoff)
+
+        readings = tick_live_clocks(now=self.kickoff + timedelta(minutes=10))
+        self.assertEqual(readings[self.match.pk].display, "10'")
+
+        match = Match.objects.get(pk=self.match.pk)
+        with self.assertNumQueries(0):
+            # Served from the last tick rather than recomputed against the current time
+            self.assertEqual(match.get_display_minute, "10'")
+            self.assertEqual(match.get_current_minute(), 10)
+
+        # A phase change moves the clock to a new reading without waiting for the next tick
+        start_match_phase(match, MatchPhase.HALF_TIME)
+        self.assertEqual(Match.objects.get(pk=self.match.pk).get_display_minute, "HT")
+
+    def test_ticker_warns_without_a_shared_cache(self):
+        err = StringIO()
+        call_command('broadcast_live_minutes', stdout=StringIO(), stderr=err)
+        self.assertIn('local to this process', err.getvalue())
+
+    def test_matches_without_clock_fall_back_to_kickoff_time(self):
+        self.match.status = MatchStatus.LIVE
+        self.match.actual_kickoff_time = self.kickoff
+        self.match.save()
+        self.assertEqual(self.match.clock_phase, '')
+        self.assertEqual(self.match.get_display_minute, "30'")
+        self.assertEqual(self.match.get_current_minute(), 30)
@@ -0,0 +1,95 @@
+"""
+Benchmarks of the match list: seed a season of N matches and check that one
+page of each response mode stays within a query and time budget, whatever N is.
+"""
+import time
+from datetime import timedelta
+
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from league.models import League, Match, MatchStatus, Team
+
+SEASON_SIZES = [100, 2000]
+TEAMS = 20
+# One query per status tab and one for the counts; the filter options of the full page are cached
+MAX_QUERIES = {'html': 4, 'partial': 4, 'json': 4}
+MAX_SECONDS = 1.0
+STATUSES = [MatchStatus.FINISHED, MatchStatus.FINISHED, MatchStatus.SCHEDULED, MatchStatus.SCHEDULED, MatchStatus.LIVE]
+
+
+def seed_season(size):
+    league = League.objects.create(year=2025, session='S', is_active=True)
+    teams = Team.objects.bulk_create(Team(name=f'Team {i}') for i in range(TEAMS))
+    start = timezone.now() - timedelta(hours=size // 2)
+    Match.objects.bulk_create(
+        Match(
+            season=league,
+            home_team=teams[i % TEAMS],
+            away_team=teams[(i + 1) % TEAMS],
+            date=start + timedelta(hours=i),
+            match_day=i // (TEAMS // 2) + 1,
+            status=STATUSES[i % len(STATUSES)],
+        )
+        for i in range(size)
+    )
+    return league
+
+
+def get(client, mode, **params):
+    headers = {'HX-Request': 'true'} if mode == 'partial' else {}
+    if mode == 'json':
+        params['format'] = 'json'
+    return client.get(reverse('match_list'), params, headers=headers)
+
+
+@pytest.fixture
+def season(request, db):
+    cache.clear()
+    return seed_season(request.param)
+
+
+@pytest.mark.parametrize('season', SEASON_SIZES, indirect=True)
+@pytest.mark.parametrize('mode', ['html', 'partial', 'json'])
+def test_one_page_stays_within_budget(client, season, mode):
+    get(client, mode)  # warm the cached filter options and templates
+
+    with CaptureQueriesContext(connection) as queries:
+        start = time.perf_counter()
+        response = get(client, mode)
+        elapsed = time.perf_counter() - start
+
+    assert response.status_code == 200
+    assert len(queries) <= MAX_QUERIES[mode], [query['sql'] for query in queries.captured_queries]
+    assert elapsed < MAX_SECONDS, f'{mode} took {elapsed:.3f}s for {season.match_set.count()} matches'
+
+
+@pytest.mark.parametrize('season', SEASON_SIZES[-1:], indirect=True)
+def test_json_pages_through_a_tab(client, season):
+    data = get(client, 'json').json()
+    assert data['total_count'] == SEASON_SIZES[-1]
+
+    seen, cursor = [], None
+    while True:
+        page = get(client, 'json', **({'finished_cursor': cursor} if cursor else {})).json()['finished_matches']
+        seen.extend(match['id'] for match in page['results'])
+        cursor = page['next_cursor']
+        if not cursor:
+            break
+    assert len(seen) == len(set(seen)) == data['finished_count']
+    assert seen == list(
+        Match.objects.filter(status=MatchStatus.FINISHED).order_by('-date', '-id').values_list('id', flat=True)
+    )
+
+
+@pytest.mark.parametrize('season', SEASON_SIZES[:1], indirect=True)
+def test_partial_renders_only_the_tabs(client, season):
+    html = get(client, 'partial').content.decode()
+    assert 'id="match-list-tabs"' in html
+    assert '<form' not in html
+
+    assert 'html' not in get(client, 'json').json()
@@ -1,19 +1,39 @@
 # league/utils.py
-from django.db import models
-from .models import TeamSeasonParticipation
+import time
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Dict, List, Optional, Tuple
 
-from django.db.models import F
-from .models import TeamSeasonParticipation
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.db.models import Count, F
 
-def get_league_standings(league):
+from .models import League, Match, MatchStatus, PlayerSeasonParticipation, PlayerStats, TeamSeasonParticipation
+
+# Versioned keys never go stale, the timeout only bounds how long old versions linger
+STANDINGS_CACHE_TIMEOUT = 60 * 60 * 24
+STANDINGS_HITS_KEY = 'league_standings:hits'
+STANDINGS_MISSES_KEY = 'league_standings:misses'
+LATEST_LEAGUE_KEY = 'latest_league'
+NEWEST_LEAGUE_KEY = 'newest_league'
+SNAPSHOT_LIMIT = 5
+
+
+def compute_league_standings(league):
     """
     Generate league standings for a given league, sorted by points, goal difference, and goals scored.
     Returns a list of dictionaries with team data and calculated fields.
     """
-    teams = TeamSeasonParticipation.objects.filter(league=league).select_related('team')
-    standings = []
-    for position, team in enumerate(teams, start=1):
-        standings.append({
+    teams = (
+        TeamSeasonParticipation.objects.filter(league=league)
+        .select_related('team')
+        .annotate(gd=F('goals_scored') - F('goals_conceded'))
+        .order_by('-points', '-gd', '-goals_scored')
+    )
+    return [
+        {
             'position': position,
             'team': team.team,
             'matches_played': team.matches_played,
@@ -24,9 +44,289 @@ def get_league_standings(league):
             'goals_conceded': team.goals_conceded,
             'goal_difference': team.goal_difference,  # Use property directly
             'points': team.points,
-        })
-    return sorted(
-        standings,
-        key=lambda x: (x['points'], x['goal_difference'], x['goals_scored']),
-        reverse=True
-    )
\ No newline at end of file
+        }
+        for position, team in enumerate(teams, start=1)
+    ]
+
+
+def cache_is_shared():
+    """
+    False when the cache lives in this process only (local memory or dummy), e.g. without
+    REDIS_URL. Versions bumped or entries warmed by a management command are then not seen
+    by the web processes.
+    """
+    return not isinstance(caches[DEFAULT_CACHE_ALIAS], (LocMemCache, DummyCache))
+
+
+def _table_version_key(league_id):
+    return f'league_table_version:{league_id}'
+
+
+def _snapshot_version_key(league_id):
+    return f'league_snapshot_version:{league_id}'
+
+
+def _get_version(key):
+    # Starts from a timestamp, so a version that was evicted from the cache
+    # comes back higher than any version it had before
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key, 0)
+    return version
+
+
+def _bump_version(key):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        return _get_version(key)
+
+
+def get_table_version(league_id):
+    """Current table version of a league."""
+    return _get_version(_table_version_key(league_id))
+
+
+def bump_table_version(league_id):
+    """Move a league to a new table version so its cached standings are no longer read."""
+    return _bump_version(_table_version_key(league_id))
+
+
+def bump_table_versions_on_commit(league_ids):
+    """Bump each league's table version once the current transaction has committed."""
+    for league_id in set(league_ids):
+        transaction.on_commit(partial(bump_table_version, league_id))
+
+
+def _count(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 1, None)
+
+
+def get_league_standings(league):
+    """Standings for a league, served from the cache until its table version changes."""
+    key = f'league_standings:{league.id}:{get_table_version(league.id)}'
+    standings = cache.get(key)
+    if standings is not None:
+        _count(STANDINGS_HITS_KEY)
+        return standings
+
+    _count(STANDINGS_MISSES_KEY)
+    standings = compute_league_standings(league)
+    cache.set(key, standings, STANDINGS_CACHE_TIMEOUT)
+    return standings
+
+
+def standings_cache_stats():
+    """Hit and miss counters of the standings cache."""
+    counts = cache.get_many([STANDINGS_HITS_KEY, STANDINGS_MISSES_KEY])
+    return {
+        'hits': counts.get(STANDINGS_HITS_KEY, 0),
+        'misses': counts.get(STANDINGS_MISSES_KEY, 0),
+    }
+
+
+# --- League snapshot ---
+
+@dataclass
+class LeagueSnapshot:
+    """League-wide dashboard data, shared by every user and rebuilt only after the league's data changed."""
+    league_id: int
+    standings_top: List[dict] = field(default_factory=list)
+    top_scorers: List[PlayerSeasonParticipation] = field(default_factory=list)
+    top_assists: List[PlayerSeasonParticipation] = field(default_factory=list)
+    top_clean_sheets: List[PlayerSeasonParticipation] = field(default_factory=list)
+    upcoming_matches: List[Match] = field(default_factory=list)
+    recent_results: List[Match] = field(default_factory=list)
+    live_match: Optional[Match] = None
+    live_match_events: List[PlayerStats] = field(default_factory=list)
+
+    @property
+    def top_team(self):
+        return self.standings_top[0] if self.standings_top else None
+
+    @property
+    def top_goal_scorer(self):
+        return self.top_scorers[0] if self.top_scorers else None
+
+    @property
+    def top_assist_provider(self):
+        return self.top_assists[0] if self.top_assists else None
+
+    @property
+    def top_clean_sheet(self):
+        return self.top_clean_sheets[0] if self.top_clean_sheets else None
+
+
+def get_snapshot_version(league_id):
+    """Current snapshot version of a league."""
+    return _get_version(_snapshot_version_key(league_id))
+
+
+def bump_snapshot_version(league_id):
+    """Move a league to a new snapshot version so its cached snapshot is rebuilt on next read."""
+    return _bump_version(_snapshot_version_key(league_id))
+
+
+def bump_snapshot_versions_on_commit(league_ids):
+    """Bump each league's snapshot version once the current transaction has committed."""
+    for league_id in set(league_ids):
+        transaction.on_commit(partial(bump_snapshot_version, league_id))
+
+
+def build_league_snapshot(league, limit=SNAPSHOT_LIMIT):
+    """Query the leaders, fixtures and live match of a league."""
+    participations = PlayerSeasonParticipation.objects.filter(league=league).select_related('player', 'team')
+    matches = Match.objects.filter(season=league).select_related('home_team', 'away_team')
+
+    live_match = matches.filter(status=MatchStatus.LIVE).order_by('-date').first()
+    return LeagueSnapshot(
+        league_id=league.id,
+        standings_top=get_league_standings(league)[:limit],
+        top_scorers=list(participations.order_by('-goals', '-assists')[:limit]),
+        top_assists=list(participations.order_by('-assists', '-goals')[:limit]),
+        top_clean_sheets=list(participations.filter(player__position='GK').order_by('-clean_sheets')[:limit]),
+        upcoming_matches=list(matches.filter(status=MatchStatus.SCHEDULED).order_by('date')[:limit]),
+        recent_results=list(matches.filter(status=MatchStatus.FINISHED).order_by('-date')[:limit]),
+        live_match=live_match,
+        live_match_events=list(live_match.get_match_events()) if live_match else [],
+    )
+
+
+def get_league_snapshot(league):
+    """
+    Snapshot of a league, served from the cache until its snapshot or table version changes.
+    Both versions are part of the key, so standings updates also rebuild the snapshot.
+    """
+    key = f'league_snapshot:{league.id}:{get_snapshot_version(league.id)}:{get_table_version(league.id)}'
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = build_league_snapshot(league)
+        cache.set(key, snapshot, STANDINGS_CACHE_TIMEOUT)
+    return snapshot
+
+
+def get_latest_league():
+    """Return the latest active league, or fallback to the most recently created league."""
+    league = cache.get(LATEST_LEAGUE_KEY)
+    if league is None:
+        league = League.objects.order_by('-is_active', '-created_at').first()
+        if league is not None:
+            cache.set(LATEST_LEAGUE_KEY, league, STANDINGS_CACHE_TIMEOUT)
+    return league
+
+
+def get_newest_league():
+    """Return the most recently created league, whether or not it is active."""
+    league = cache.get(NEWEST_LEAGUE_KEY)
+    if league is None:
+        league = League.objects.order_by('-created_at').first()
+        if league is not None:
+            cache.set(NEWEST_LEAGUE_KEY, league, STANDINGS_CACHE_TIMEOUT)
+    return league
+
+
+def clear_latest_league():
+    """Forget the cached latest and newest leagues, e.g. after a league was created or (de)activated."""
+    cache.delete_many([LATEST_LEAGUE_KEY, NEWEST_LEAGUE_KEY])
+
+
+# --- Match counters ---
+# Number of matches per status for a league and for each team in it, kept in the cache.
+# Match signals apply +1/-1 deltas after commit; a league whose counters are not all in the
+# cache (never built, expired or partly evicted) is recounted from the database on first read.
+# Each recount starts a new generation, so counters left over from an older one are never read;
+# they expire with MATCH_COUNTS_TIMEOUT.
+MATCH_COUNTS_TIMEOUT = 60 * 60 * 24
+
+
+def _match_counts_generation_key(league_id):
+    return f'match_counts:{league_id}:generation'
+
+
+def _match_count_key(league_id, generation, team_id, status):
+    return f'match_counts:{league_id}:{generation}:{team_id or "all"}:{status}'
+
+
+def rebuild_match_counts(league_id):
+    """
+    Recount a league's matches per status, for the league and for each of its teams.
+    Every status gets a counter, zeros included, so a missing key always means a cache miss.
+    """
+    generation = time.time_ns()
+    team_ids = set(TeamSeasonParticipation.objects.filter(league_id=league_id).values_list('team_id', flat=True))
+    rows = {}
+    for side in ('home_team_id', 'away_team_id'):
+        for row in Match.objects.filter(season_id=league_id).values(side, 'status').annotate(n=Count('id')).order_by():
+            team_ids.add(row[side])
+            rows[(row[side], row['status'])] = rows.get((row[side], row['status']), 0) + row['n']
+            if side == 'home_team_id':
+                # Every match has exactly one home team, so these rows also make up the league totals
+                rows[(None, row['status'])] = rows.get((None, row['status']), 0) + row['n']
+
+    counts = {
+        _match_count_key(league_id, generation, team_id, status): rows.get((team_id, status), 0)
+        for team_id in {None} | team_ids
+        for status in MatchStatus.values
+    }
+    cache.set_many(counts, MATCH_COUNTS_TIMEOUT)
+    cache.set(_match_counts_generation_key(league_id), generation, MATCH_COUNTS_TIMEOUT)
+    return generation, counts
+
+
+def get_match_counts(league_id, team_id=None):
+    """
+    Matches per status (plus 'total') for a league, or for one team in it.
+    Reads a handful of cache keys; the database is only counted when any of them is missing.
+    """
+    generation = cache.get(_match_counts_generation_key(league_id))
+    cached = {}
+    if generation is not None:
+        keys = [_match_count_key(league_id, generation, team_id, status) for status in MatchStatus.values]
+        cached = cache.get_many(keys)
+        if len(cached) < len(keys):
+            generation = None
+    if generation is None:
+        generation, cached = rebuild_match_counts(league_id)
+
+    counts = {
+        status: cached.get(_match_count_key(league_id, generation, team_id, status), 0)
+        for status in MatchStatus.values
+    }
+    counts['total'] = sum(counts.values())
+    return counts
+
+
+def match_count_deltas(state, multiplier):
+    """Counter deltas of one match state ({'season_id', 'home_team_id', 'away_team_id', 'status'})."""
+    return {
+        (state['season_id'], team_id, state['status']): multiplier
+        for team_id in (None, state['home_team_id'], state['away_team_id'])
+    }
+
+
+def apply_match_count_deltas(deltas: Dict[Tuple[int, Optional[int], str], int]):
+    """Add deltas to the counters of leagues that are cached; the others are counted on first read."""
+    generations = cache.get_many({_match_counts_generation_key(league_id) for league_id, _, _ in deltas})
+    for (league_id, team_id, status), delta in deltas.items():
+        generation = generations.get(_match_counts_generation_key(league_id))
+        if not delta or generation is None:
+            continue
+        try:
+            value = cache.incr(_match_count_key(league_id, generation, team_id, status), delta)
+        except ValueError:
+            value = None
+        if value is None or value < 0:
+            # The counter is missing (a new team, or evicted) or drifted below zero; recount on next read
+            cache.delete(_match_counts_generation_key(league_id))
+            generations[_match_counts_generation_key(league_id)] = None
+
+
+def apply_match_count_deltas_on_commit(deltas):
+    """Apply counter deltas once the current transaction has committed."""
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if deltas:
+        transaction.on_commit(partial(apply_match_count_deltas, deltas))
@@ -17,8 +17,12 @@ from django.db.models import Sum, Q, F, Prefetch, Count, Subquery, OuterRef
 
 from .models import League, Lineup, Team, Match, Player, PlayerSeasonParticipation, PlayerStats, MatchStatus,     TeamSeasonParticipation, CoachSeasonParticipation, LineupPlayer, TeamOfTheWeek
 from .forms import LineupPlayerForm, MatchForm, PlayerStatsForm, PlayerStatsFormSet, LineupFormSet, MatchEventForm, ValidatingLineupFormSet
-from .utils import get_league_standings
-from .services import update_league_table
+from .lineups import save_lineup
+from .search import search_filter
+from .utils import get_league_standings, get_table_version, STANDINGS_CACHE_TIMEOUT
+from .services import (
+    MATCH_PAGE_SIZE, count_matches_by_status, get_match_page, get_team_season_summary, update_league_table,
+)
 from users.services.fan_dashboard import build_live_section
 
 from django.shortcuts import get_object_or_404, redirect, render
@@ -56,7 +60,7 @@ def home(request):
 
         upcoming_matches = Match.objects.filter(season=active_league, status=MatchStatus.SCHEDULED).select_related('home_team', 'away_team').order_by('-date')[:5]
         
-        league_table = TeamSeasonParticipation.objects.filter(league=active_league)[:3]
+        league_table = get_league_standings(active_league)[:3]
         
         live_section_data = build_live_section(active_league)
         live_match = live_section_data.get('live_match')
@@ -97,6 +101,8 @@ def league_table_view(request, league_id):
     rendered = render_to_string('league_table.html', {
         'league': league,
         'standings': standings,
+        'table_version': get_table_version(league.id),
+        'standings_cache_timeout': STANDINGS_CACHE_TIMEOUT,
     }, request=request)
     return HttpResponse(rendered)
 
@@ -160,200 +166,45 @@ def team(request, team_id):
     active_league = League.objects.filter(is_active=True).first()
     current_players = team.get_current_players(active_league)
     matches = team.all_matches().filter(season=active_league).select_related('home_team', 'away_team')
-    team_season_participation = TeamSeasonParticipation.objects.filter(team=team, league=active_league).first()
+    team_summary = get_team_season_summary(team, active_league)
 
     rendered = render_to_string('team_details.html', {
         'team': team,
         'current_players': current_players,
         'matches': matches,
         'active_league': active_league,
-        'team_season_participation': team_season_participation,
+        'team_summary': team_summary,
     }, request=request)
 
     return HttpResponse(rendered)
 
 # Match List View 
 class MatchListView(ListView):
-    model = Match
-    template_name = 'match_list.html'
-    paginate_by = 10
-    context_object_name = 'matches'
-
-    def get_queryset(self):
-        """Build the base queryset with optimizations"""
-        queryset = Match.objects.select_related(
-            'season', 'home_team', 'away_team'
-        ).prefetch_related(
-            Prefetch(
-                'home_team__teamseasonparticipation_set',
-                queryset=TeamSeasonParticipation.objects.select_related('league'),
-                to_attr='current_season_participation'
-            ),
-            Prefetch(
-                'away_team__teamseasonparticipation_set',
-                queryset=TeamSeasonParticipation.objects.select_related('league'),
-                to_attr='current_season_participation'
-            ),
-            'playerstats_set__player'
-        )
-        queryset = queryset.filter(season__is_active=True)
-        return queryset
-
-    def get_filtered_queryset(self):
-        """Apply filters based on request parameters"""
-        queryset = self.get_queryset()
-        team_search = self.request.GET.get('team_search', '').strip()
-        if team_search:
-            queryset = queryset.filter(
-                Q(home_team__name__icontains=team_search) |
-                Q(away_team__name__icontains=team_search)
-            )
-        match_day = self.request.GET.get('match_day')
-        if match_day:
-            try:
-                match_day = int(match_day)
-                queryset = queryset.filter(match_day=match_day)
-            except (ValueError, TypeError):
-                pass
-        league_id = self.request.GET.get('league')
-        if league_id:
-            try:
-                league_id = int(league_id)
-                queryset = queryset.filter(season_id=league_id)
-            except (ValueError, TypeError):
-                pass
-        return queryset
-
-    def get_matches_by_status(self, queryset):
-        """Split matches by status"""
-        matches_data = {
-            'scheduled': [],
-            'live': [],
-            'finished': []
-        }
-        for match in queryset:
-            if match.status == MatchStatus.SCHEDULED:
-                matches_data['scheduled'].append(match)
-            elif match.status == MatchStatus.LIVE:
-                matches_data['live'].append(match)
-            elif match.status == MatchStatus.FINISHED:
-                matches_data['finished'].append(match)
-        matches_data['scheduled'].sort(key=lambda x: x.date)
-        matches_data['live'].sort(key=lambda x: x.date, reverse=True)
-        matches_data['finished'].sort(key=lambda x: x.date, reverse=True)
-        return matches_data
-
-    def paginate_matches(self, matches_list, page_param):
-        """Paginate a list of matches"""
-        page = self.request.GET.get(page_param, 1)
-        paginator = Paginator(matches_list, self.paginate_by)
-        try:
-            paginated_matches = paginator.page(page)
-        except PageNotAnInteger:
-            paginated_matches = paginator.page(1)
-        except EmptyPage:
-            paginated_matches = paginator.page(paginator.num_pages)
-        return paginated_matches
-
-    def get_match_days(self):
-        """Get available match days for the filter dropdown"""
-        cache_key = 'available_match_days'
-        match_days = cache.get(cache_key)
-        if not match_days:
-            match_days = Match.objects.filter(
-                season__is_active=True
-            ).values_list('match_day', flat=True).distinct().order_by('match_day')
-            match_days = [day for day in match_days if day is not None]
-            cache.set(cache_key, match_days, 300)
-        return match_days
-
-    def get_active_teams(self):
-        """Get teams that are active in the current season"""
-        cache_key = 'active_teams_current_season'
-        teams = cache.get(cache_key)
-        if not teams:
-            teams = Team.objects.filter(
-                teamseasonparticipation_set__is_active=True,
-                teamseasonparticipation_set__league__is_active=True
-            ).distinct().order_by('name')
-            cache.set(cache_key, teams, 300)
-        return teams
-
-    def get_active_leagues(self):
-        """Get active leagues for filtering"""
-        cache_key = 'active_leagues'
-        leagues = cache.get(cache_key)
-        if not leagues:
-            leagues = League.objects.filter(is_active=True).order_by('-year', 'session')
-            cache.set(cache_key, leagues, 600)
-        return leagues
-
-    def get_context_data(self, **kwargs):
-        context = {}
-        filtered_queryset = self.get_filtered_queryset()
-        matches_by_status = self.get_matches_by_status(filtered_queryset)
-        context['upcoming_matches'] = self.paginate_matches(
-            matches_by_status['scheduled'], 'scheduled_page'
-        )
-        context['finished_matches'] = self.paginate_matches(
-            matches_by_status['finished'], 'finished_page'
-        )
-        context['teams'] = self.get_active_teams()
-        context['leagues'] = self.get_active_leagues()
-        context['status_choices'] = MatchStatus.choices
-        context['current_team_search'] = self.request.GET.get('team_search', '')
-        context['current_match_day'] = self.request.GET.get('match_day', '')
-        context['current_league'] = self.request.GET.get('league', '')
-        context['match_days'] = self.get_match_days()
-        context['match_stats'] = {
-            'total_scheduled': len(matches_by_status['scheduled']),
-            'total_live': len(matches_by_status['live']),
-            'total_finished': len(matches_by_status['finished']),
-            'total_matches': len(filtered_queryset),
-        }
-        return context
-
-    def get_template_names(self):
-        if self.request.headers.get('HX-Request'):
-            return ['league/match_list_partial.html']
-        return ['league/match_list.html']
+    """
+    Live, upcoming and finished matches of the active seasons, one keyset page per tab.
 
-    def render_to_response(self, context, **response_kwargs):
-        if self.request.headers.get('HX-Request') and self.request.GET.get('format') == 'json':
-            return JsonResponse({
-                'scheduled_count': context['match_stats']['total_scheduled'],
-                'live_count': context['match_stats']['total_live'],
-                'finished_count': context['match_stats']['total_finished'],
-                'html': render_to_string('match_list_partial.html', context, request=self.request)
-            })
-        return super().render_to_response(context, **response_kwargs)
+    Renders the full page, only the tabs for HTMX requests (HX-Request header), or
+    JSON with ?format=json.
+    """
     model = Match
     template_name = 'match_list.html'
-    paginate_by = 10
+    partial_template_name = 'partials/match_list_tabs.html'
+    paginate_by = MATCH_PAGE_SIZE
     context_object_name = 'matches'
+    # Status tabs: (context name, match status, cursor parameter)
+    status_tabs = (
+        ('upcoming_matches', MatchStatus.SCHEDULED, 'scheduled_cursor'),
+        ('live_matches', MatchStatus.LIVE, 'live_cursor'),
+        ('finished_matches', MatchStatus.FINISHED, 'finished_cursor'),
+    )
+    # Relations loaded for the matches on the visible pages only
+    page_prefetches = ()
 
     def get_queryset(self):
-        """Build the base queryset with optimizations"""
-        queryset = Match.objects.select_related(
+        """Matches of the active seasons, with the relations every row shows"""
+        return Match.objects.select_related(
             'season', 'home_team', 'away_team'
-        ).prefetch_related(
-            Prefetch(
-                'home_team__teamseasonparticipation_set',
-                queryset=TeamSeasonParticipation.objects.select_related('league'),
-                to_attr='current_season_participation'
-            ),
-            Prefetch(
-                'away_team__teamseasonparticipation_set',
-                queryset=TeamSeasonParticipation.objects.select_related('league'),
-                to_attr='current_season_participation'
-            ),
-            'playerstats_set__player'  # For match statistics
-        )
-        
-        # Filter by active season only
-        queryset = queryset.filter(season__is_active=True)
-        
-        return queryset
+        ).filter(season__is_active=True)
 
     def get_filtered_queryset(self):
         """Apply filters based on request parameters"""
@@ -362,9 +213,10 @@ class MatchListView(ListView):
         # Team search filter (matches your template's team_search field)
         team_search = self.request.GET.get('team_search', '').strip()
         if team_search:
+            team_ids = Team.objects.filter(search_filter(Team, team_search)).values('id')
             queryset = queryset.filter(
-                Q(home_team__name__icontains=team_search) |
-                Q(away_team__name__icontains=team_search)
+                Q(home_team_id__in=team_ids) |
+                Q(away_team_id__in=team_ids)
             )
 
         # Match day filter
@@ -387,47 +239,19 @@ class MatchListView(ListView):
 
         return queryset
 
-    def get_matches_by_status(self, queryset):
-        """Split matches by status and add statistics"""
-        matches_data = {
-            'scheduled': [],
-            'live': [],
-            'finished': []
-        }
-        
-        for match in queryset:
-            # Add match statistics
-            match.total_goals = match.home_score + match.away_score
-            match.goal_difference = abs(match.home_score - match.away_score)
-            
-            # Categorize by status
-            if match.status == MatchStatus.SCHEDULED:
-                matches_data['scheduled'].append(match)
-            elif match.status == MatchStatus.LIVE:
-                matches_data['live'].append(match)
-            elif match.status == MatchStatus.FINISHED:
-                matches_data['finished'].append(match)
-        
-        # Sort each category
-        matches_data['scheduled'].sort(key=lambda x: x.date)  # Upcoming first
-        matches_data['live'].sort(key=lambda x: x.date, reverse=True)  # Most recent first
-        matches_data['finished'].sort(key=lambda x: x.date, reverse=True)  # Most recent first
-        
-        return matches_data
-
-    def paginate_matches(self, matches_list, page_param):
-        """Paginate a list of matches"""
-        page = self.request.GET.get(page_param, 1)
-        paginator = Paginator(matches_list, self.paginate_by)
-        
-        try:
-            paginated_matches = paginator.page(page)
-        except PageNotAnInteger:
-            paginated_matches = paginator.page(1)
-        except EmptyPage:
-            paginated_matches = paginator.page(paginator.num_pages)
-        
-        return paginated_matches
+    def get_match_page(self, queryset, status, cursor_param):
+        """One keyset page of a status tab, with a link to the page after it"""
+        page = get_match_page(
+            queryset, status,
+            cursor=self.request.GET.get(cursor_param),
+            limit=self.paginate_by,
+            prefetch=self.page_prefetches,
+        )
+        if page.has_next:
+            params = self.request.GET.copy()
+            params[cursor_param] = page.next_cursor
+            page.next_url = f'?{params.urlencode()}'
+        return page
 
     def get_match_days(self):
         """Get available match days for the filter dropdown"""
@@ -449,9 +273,9 @@ class MatchListView(ListView):
         teams = cache.get(cache_key)
         
         if not teams:
-            teams = Team.objects.filter(
+            teams = list(Team.objects.filter(
                is_active=True,
-            ).distinct().order_by('name')
+            ).distinct().order_by('name'))
             cache.set(cache_key, teams, 300)  # Cache for 5 minutes
         
         return teams
@@ -462,71 +286,84 @@ class MatchListView(ListView):
         leagues = cache.get(cache_key)
         
         if not leagues:
-            leagues = League.objects.filter(is_active=True).order_by('-year', 'session')
+            leagues = list(League.objects.filter(is_active=True).order_by('-year', 'session'))
             cache.set(cache_key, leagues, 600)  # Cache for 10 minutes
         
         return leagues
 
+    def is_json(self):
+        return self.request.GET.get('format') == 'json'
+
+    def is_partial(self):
+        return bool(self.request.headers.get('HX-Request'))
+
     def get_context_data(self, **kwargs):
-        # Don't call super() as we're handling pagination differently
+        # Don't call super() as every status tab is paginated on its own
         context = {}
         
         # Get filtered matches
         filtered_queryset = self.get_filtered_queryset()
         
-        # Split matches by status
-        matches_by_status = self.get_matches_by_status(filtered_queryset)
-        
-        # For template compatibility, use upcoming_matches and finished_matches
-        context['upcoming_matches'] = self.paginate_matches(
-            matches_by_status['scheduled'], 'scheduled_page'
-        )
-        context['finished_matches'] = self.paginate_matches(
-            matches_by_status['finished'], 'finished_page'
-        )
-        context['live_matches'] = self.paginate_matches(
-            matches_by_status['live'], 'live_page'
-        )
-        # Add filter options
-        context['teams'] = self.get_active_teams()
-        context['leagues'] = self.get_active_leagues()
-        context['status_choices'] = MatchStatus.choices
-        
-        # Template expects these filter values
-        context['current_team_search'] = self.request.GET.get('team_search', '')
-        context['current_match_day'] = self.request.GET.get('match_day', '')
-        context['current_league'] = self.request.GET.get('league', '')
-        
-        # Add match days for filter dropdown
-        context['match_days'] = self.get_match_days()
-        
-        # Add match statistics
-        context['match_stats'] = {
-            'total_scheduled': len(matches_by_status['scheduled']),
-            'total_live': len(matches_by_status['live']),
-            'total_finished': len(matches_by_status['finished']),
-            'total_matches': len(filtered_queryset),
-        }
+        # One ordered, limited query per status tab
+        for name, status, cursor_param in self.status_tabs:
+            context[name] = self.get_match_page(filtered_queryset, status, cursor_param)
+
+        # Add match statistics, counted in one aggregate
+        context['match_stats'] = count_matches_by_status(filtered_queryset)
+
+        # The filter form is only part of the full page
+        if not (self.is_json() or self.is_partial()):
+            context['teams'] = self.get_active_teams()
+            context['leagues'] = self.get_active_leagues()
+            context['status_choices'] = MatchStatus.choices
+            context['current_team_search'] = self.request.GET.get('team_search', '')
+            context['current_match_day'] = self.request.GET.get('match_day', '')
+            context['current_league'] = self.request.GET.get('league', '')
+            context['match_days'] = self.get_match_days()
         
         return context
 
     def get_template_names(self):
-        """Return different templates for HTMX requests"""
-        if self.request.headers.get('HX-Request'):
-            # Return partial template for HTMX updates
-            return ['matches/match_list_partial.html']
+        """Return only the status tabs for HTMX requests"""
+        if self.is_partial():
+            return [self.partial_template_name]
         return [self.template_name]
 
+    def match_to_dict(self, match):
+        """JSON representation of a match in the list"""
+        return {
+            'id': match.id,
+            'date': match.date.isoformat(),
+            'match_day': match.match_day,
+            'status': match.status,
+            'minute': match.get_display_minute if match.status == MatchStatus.LIVE else None,
+            'home_team': {'id': match.home_team_id, 'name': match.home_team.name},
+            'away_team': {'id': match.away_team_id, 'name': match.away_team.name},
+            'home_score': match.home_score,
+            'away_score': match.away_score,
+            'url': reverse('match_details', args=[match.id]),
+        }
+
     def render_to_response(self, context, **response_kwargs):
-        """Handle HTMX requests with JSON response if needed"""
-        if self.request.headers.get('HX-Request') and self.request.GET.get('format') == 'json':
-            # Return JSON response for HTMX with specific data
-            return JsonResponse({
-                'scheduled_count': context['match_stats']['total_scheduled'],
-                'live_count': context['match_stats']['total_live'],
-                'finished_count': context['match_stats']['total_finished'],
-                'html': render_to_string('matches/match_list_partial.html', context, request=self.request)
-            })
+        """Serialize the tabs for ?format=json"""
+        if self.is_json():
+            stats = context['match_stats']
+            data = {
+                'scheduled_count': stats['total_scheduled'],
+                'live_count': stats['total_live'],
+                'finished_count': stats['total_finished'],
+                'total_count': stats['total_matches'],
+            }
+            for name, status, cursor_param in self.status_tabs:
+                page = context[name]
+                data[name] = {
+                    'results': [self.match_to_dict(match) for match in page],
+                    'next_cursor': page.next_cursor,
+                    'next_url': page.next_url or None,
+                }
+            if self.is_partial():
+                data['html'] = render_to_string(self.partial_template_name, context, request=self.request)
+            return JsonResponse(data)
         
         return super().render_to_response(context, **response_kwargs)
 
@@ -539,9 +376,12 @@ class MatchFormView(UserPassesTestMixin, CreateView, ):
     success_url = reverse_lazy('match_list')
 
     def get_object(self, queryset=None):
-        if 'match_id' in self.kwargs:
-            return get_object_or_404(Match, id=self.kwargs['match_id'])
-        return None
+        if 'match_id' not in self.kwargs:
+            return None
+        # Cached: the form kwargs, form_valid and template lookup all ask for it
+        if not hasattr(self, '_match'):
+            self._match = get_object_or_404(Match, id=self.kwargs['match_id'])
+        return self._match
 
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
@@ -553,13 +393,12 @@ class MatchFormView(UserPassesTestMixin, CreateView, ):
         """
         Override the handle status change and redirect to player stats editing
         """
-        #Get the match instance before saving to check its old status
-        old_instance = self.get_object()
-        old_status = old_instance.status if old_instance else None
-
         #if it is a new_match
         new_match = form.save(commit=False)
 
+        #The match tracks its loaded values, so the old status needs no extra query
+        old_status = new_match.previous('status')
+
         #Check if the status is transitioning to Finished
         if new_match.status == MatchStatus.FINISHED and old_status != MatchStatus.FINISHED:
 
@@ -892,23 +731,17 @@ def handle_lineup_save(request, match, permissions):
 
         # Save the lineup within a transaction
         with transaction.atomic():
-            lineup, _ = Lineup.objects.get_or_create(team=team, match=match)
-            lineup.lineupplayer_set.all().delete()
-
-            lineup_players = []
-            for i, player_id in enumerate(starter_ids):
-                lineup_players.append(LineupPlayer(lineup=lineup, player_id=player_id, is_starter=True, position=i))
-            for i, player_id in enumerate(substitute_ids):
-                lineup_players.append(LineupPlayer(lineup=lineup, player_id=player_id, is_starter=False, position=i))
-            
-            LineupPlayer.objects.bulk_create(lineup_players)
+            lineup, created = Lineup.objects.get_or_create(team=team, match=match, defaults={'formation': formation})
+            # Only the players that were added, removed or moved are written
+            save_lineup(lineup, starter_ids, substitute_ids)
 
-            lineup.formation = formation
-            lineup.save()
+            if not created and lineup.formation != formation:
+                lineup.formation = formation
+                lineup.save(update_fields=['formation'])
 
         # Return success response with the saved data
-        saved_starters = LineupPlayer.objects.filter(lineup=lineup, is_starter=True).select_related('player').order_by('id')
-        saved_subs = LineupPlayer.objects.filter(lineup=lineup, is_starter=False).select_related('player').order_by('id')
+        saved_starters = LineupPlayer.objects.filter(lineup=lineup, is_starter=True).select_related('player').order_by('position', 'id')
+        saved_subs = LineupPlayer.objects.filter(lineup=lineup, is_starter=False).select_related('player').order_by('position', 'id')
 
         starters_serialized = [serialize_player(lp.player) for lp in saved_starters]
         substitutes_serialized = [serialize_player(lp.player) for lp in saved_subs]
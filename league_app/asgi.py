@@ -10,20 +10,24 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 import os
 
 from django.core.asgi import get_asgi_application
-from channels.routing import ProtocolTypeRouter, URLRouter
-from channels.auth import AuthMiddlewareStack
-from django.urls import path
-from users.consumers import NotificationsConsumer
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'league_app.settings')
 
+# Sets Django up, so it has to come before the imports that load models
 django_asgi_app = get_asgi_application()
 
+from channels.routing import ProtocolTypeRouter, URLRouter
+from channels.auth import AuthMiddlewareStack
+from django.urls import path
+from users.consumers import NotificationsConsumer
+from league.consumers import MatchConsumer
+
 application = ProtocolTypeRouter({
     "http": django_asgi_app,
     "websocket": AuthMiddlewareStack(
         URLRouter([
             path("ws/notifications/", NotificationsConsumer.as_asgi()),
+            path("ws/matches/<int:match_id>/", MatchConsumer.as_asgi()),
         ])
     ),
 })
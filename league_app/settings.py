@@ -113,6 +113,48 @@ DATABASES = {
 }
 
 
+# ==============================================================================
+# CHANNELS
+# ==============================================================================
+
+# Live match and notification pushes fan out through Redis when it is configured,
+# otherwise through an in-process layer that only reaches sockets of this worker
+REDIS_URL = os.environ.get("REDIS_URL")
+
+if REDIS_URL:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels_redis.core.RedisChannelLayer",
+            "CONFIG": {"hosts": [REDIS_URL]},
+        }
+    }
+else:
+    CHANNEL_LAYERS = {
+        "default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}
+    }
+
+
+# ==============================================================================
+# CACHE
+# ==============================================================================
+
+# Standings and snapshot versions, match counters, live clocks and unread counters
+# are read by every web, ASGI and worker process, so they need a cache all of them
+# share. Without Redis each process has its own local memory cache, which is only
+# fit for development and tests.
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    }
+
+
 # ==============================================================================
 # STATIC & MEDIA (PRODUCTION READY)
 # ==============================================================================
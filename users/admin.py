@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import User, UserProfile, Notification
+from django.utils import timezone
+from .models import User, UserProfile, Notification, OutboundEmail
 
 class UserProfileInline(admin.StackedInline):
     model = UserProfile
@@ -33,6 +34,21 @@ class NotificationAdmin(admin.ModelAdmin):
     search_fields = ('user__email', 'title')
     raw_id_fields = ('user',)
 
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at')
+    list_filter = ('status',)
+    search_fields = ('subject',)
+    readonly_fields = ('created_at', 'sent_at', 'last_error')
+    actions = ['retry_now']
+
+    def retry_now(self, request, queryset):
+        updated = queryset.exclude(status=OutboundEmail.Status.SENT).update(
+            status=OutboundEmail.Status.PENDING, attempts=0, next_attempt_at=timezone.now()
+        )
+        self.message_user(request, f"{updated} emails queued for the next worker run.")
+    retry_now.short_description = "Retry now"
+
 @admin.register(UserProfile)
 class UserProfileAdmin(admin.ModelAdmin):
     list_display = ("user", "favorite_teams_count", "created_at", "updated_at")
@@ -1,13 +1,18 @@
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
 from asgiref.sync import sync_to_async
 
+from users.services.notifications import get_unread_count, unread_payload, user_group_name
+
 
 class NotificationsConsumer(AsyncJsonWebsocketConsumer):
     async def connect(self):
         if self.scope.get('user') and self.scope['user'].is_authenticated:
-            self.user_group = f"user_{self.scope['user'].id}"
+            self.user_group = user_group_name(self.scope['user'].id)
             await self.channel_layer.group_add(self.user_group, self.channel_name)
             await self.accept()
+            # Start the badge from the current count, deltas follow as they happen
+            unread = await sync_to_async(get_unread_count)(self.scope['user'].id)
+            await self.send_json(unread_payload(0, unread))
         else:
             await self.close()
 
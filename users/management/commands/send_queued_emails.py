@@ -0,0 +1,40 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+
+from users.services.email_outbox import BATCH_SIZE, MAX_ATTEMPTS, send_queued_emails
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Deliver the queued outbound emails, once or as a worker polling every --interval seconds"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0, help='Seconds to wait when the outbox is empty; drains it once when 0')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Emails sent over one connection')
+        parser.add_argument('--max-attempts', type=int, default=MAX_ATTEMPTS, help='Attempts before an email is marked failed')
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        while True:
+            try:
+                result = send_queued_emails(options['batch_size'], max_attempts=options['max_attempts'])
+            except Exception as e:
+                # The backend could not be reached, the claimed emails are picked up again later
+                logger.error(f"Sending queued emails failed: {e}", exc_info=True)
+                if interval <= 0:
+                    raise
+                time.sleep(interval)
+                continue
+
+            if result.sent or result.retried or result.failed:
+                self.stdout.write(self.style.SUCCESS(
+                    f'Sent {result.sent} emails, {result.retried} to retry, {result.failed} failed'
+                ))
+            if result.sent + result.retried + result.failed < options['batch_size']:
+                # Outbox drained (until retries are due)
+                if interval <= 0:
+                    return
+                time.sleep(interval)
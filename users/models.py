@@ -6,6 +6,7 @@ from league.models import Player, Coach
 from datetime import date
 from dateutil.relativedelta import relativedelta
 from django.core.exceptions import ValidationError
+from django.utils import timezone
 import time
 import os
 
@@ -135,6 +136,61 @@ class Notification(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Unread counts and the unread inbox
+            models.Index(fields=['user', 'is_read', 'created_at'], name='notification_unread_idx'),
+            # The inbox, paged newest first on (created_at, id)
+            models.Index(fields=['user', 'created_at', 'id'], name='notification_inbox_idx'),
+        ]
 
     def __str__(self):
-        return f"Notification to {self.user.email}: {self.title}"
\ No newline at end of file
+        return f"Notification to {self.user.email}: {self.title}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Capture the loaded column values, so the unread counter can follow edits (e.g. in the admin)."""
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def previous_unread(self):
+        """(user_id, is_read) as loaded or last saved, None when not known (built in memory or deferred)."""
+        loaded = getattr(self, '_loaded_values', None) or {}
+        if 'user_id' not in loaded or 'is_read' not in loaded:
+            return None
+        return loaded['user_id'], loaded['is_read']
+
+    def save(self, *args, **kwargs):
+        # The snapshot is reset after post_save receivers have compared it with the saved values
+        super().save(*args, **kwargs)
+        self._loaded_values = {'user_id': self.user_id, 'is_read': self.is_read}
+
+class OutboundEmail(models.Model):
+    """An email waiting in the outbox; request handlers enqueue, the send_queued_emails worker delivers."""
+
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'Pending'
+        SENT = 'sent', 'Sent'
+        FAILED = 'failed', 'Failed'
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(blank=True)
+    from_email = models.CharField(max_length=254, blank=True)
+    to = models.JSONField(default=list)
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # Pending emails are sent once this has passed; also pushed forward while a worker holds the email
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['next_attempt_at', 'id']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} to {', '.join(self.to)} ({self.status})"
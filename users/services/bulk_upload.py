@@ -2,15 +2,19 @@ from __future__ import annotations
 
 import csv
 import io
-import secrets
-import string
+from collections import Counter
 from dataclasses import dataclass
-from typing import List, Dict, Tuple
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Sequence
 
 from django.contrib.auth import get_user_model
-from django.core.mail import send_mail
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.tokens import default_token_generator
 from django.db import transaction
+from django.db.models import Q
+from django.template.loader import get_template
 from django.urls import reverse
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
 from django.conf import settings
 import logging
 
@@ -23,16 +27,22 @@ from league.models import (
     PlayerSeasonParticipation,
     TeamSeasonParticipation,
 )
-
-ALPHABET = string.ascii_letters + string.digits
-
-
-def _gen_password(length: int = 14) -> str:
-    return "".join(secrets.choice(ALPHABET) for _ in range(length))
-
+from users.models import UserProfile
+from users.services.email_outbox import enqueue_emails
 
 REQUIRED_HEADERS = ["first_name", "last_name", "email", "position"]
 VALID_POSITIONS = {c for c, _ in Player.POSITION_CHOICES}
+# Rows per INSERT/UPDATE statement, and values per IN (...) lookup
+WRITE_BATCH_SIZE = 500
+LOOKUP_BATCH_SIZE = 2000
+
+
+class PlayerRow(NamedTuple):
+    line: int
+    email: str
+    first_name: str
+    last_name: str
+    position: str
 
 
 @dataclass
@@ -44,46 +54,16 @@ class BulkImportResult:
 
 
 def _normalize_row(row: Dict[str, str]) -> Dict[str, str]:
-    return {k: (v or "").strip() for k, v in row.items()}
+    return {k: (v or "").strip() for k, v in row.items() if k is not None}
 
 
-from django.contrib.auth.tokens import default_token_generator
-from django.utils.http import urlsafe_base64_encode
-from django.utils.encoding import force_bytes
-from django.template.loader import render_to_string
-from django.core.mail import EmailMultiAlternatives
-
-def import_players_csv_for_team(team: Team, league: League, uploaded_file) -> BulkImportResult:
-    """Validate then atomically import players for a team from CSV.
+def _open_csv(uploaded_file) -> csv.DictReader:
+    """Read the upload as CSV, decoding it as it is read instead of all at once."""
+    return csv.DictReader(io.TextIOWrapper(uploaded_file, encoding="utf-8-sig", errors="replace", newline=""))
 
-    Behavior:
-    - Create or update User (role=player); set password and email only for newly created users.
-    - Ensure Player exists via signals; set Player.position from CSV.
-    - Ensure PlayerSeasonParticipation(team, league) exists/active.
-    - Send welcome emails with credentials for newly created users after commit.
-    - All-or-nothing: if any error, no DB writes and no emails.
-    """
-    errors: List[str] = []
 
-    # Ensure team is active in league
-    if not TeamSeasonParticipation.objects.filter(team=team, league=league).exists():
-        return BulkImportResult(0, 0, 0, [f"{team.name} is not active in {league}."])
-
-    # Read CSV
-    try:
-        data = uploaded_file.read().decode("utf-8-sig", errors="replace")
-    except Exception:
-        return BulkImportResult(0, 0, 0, ["Unable to read uploaded file. Ensure it's a CSV encoded in UTF-8."])
-
-    reader = csv.DictReader(io.StringIO(data))
-    fieldnames = reader.fieldnames or []
-
-    # Header validation
-    missing = [h for h in REQUIRED_HEADERS if h not in fieldnames]
-    if missing:
-        return BulkImportResult(0, 0, 0, [f"Missing columns: {', '.join(missing)}"])
-
-    cleaned_rows: List[Tuple[int, Dict[str, str]]] = []  # (row_num, row)
+def iter_player_rows(reader: Iterable[Dict[str, str]], errors: List[str]) -> Iterator[PlayerRow]:
+    """Validate the CSV rows one at a time, appending problems to `errors` and yielding every row."""
     seen_emails: set[str] = set()
 
     for i, raw in enumerate(reader, start=2):  # start=2 because row 1 is headers
@@ -107,123 +87,225 @@ def import_players_csv_for_team(team: Team, league: League, uploaded_file) -> Bu
                 f"Row {i}: invalid position '{pos}'. Use one of: {', '.join(sorted(VALID_POSITIONS))}."
             )
 
-        cleaned_rows.append((i, row))
+        yield PlayerRow(i, email, row.get("first_name", ""), row.get("last_name", ""), pos or "")
 
-    if errors:
-        return BulkImportResult(0, 0, 0, errors)
 
+def _batches(values: Sequence, size: int) -> Iterator[Sequence]:
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _existing_users(emails: Sequence[str]) -> Dict[str, object]:
+    """Users already registered with one of `emails`, with their profile and player, by email."""
     User = get_user_model()
+    users = {}
+    for batch in _batches(emails, LOOKUP_BATCH_SIZE):
+        for user in User.objects.filter(email__in=batch).select_related("userprofile__player"):
+            users[user.email] = user
+    return users
 
-    created_users = 0
-    existing_attached = 0
-    notifications: List[Tuple[str, str, str]] = []  # (email, username, plain_password)
 
-    with transaction.atomic():
-        for i, row in cleaned_rows:
-            email = row["email"].lower()
-            first_name = row["first_name"]
-            last_name = row["last_name"]
-            position = row["position"]
-
-            user = User.objects.filter(email=email).first()
-            new_user = False
-            plain_pw = None
-
-            if user is None:
-                # Create new player user
-                plain_pw = _gen_password()
-                user = User.objects.create_user(
-                    email=email,
-                    password=plain_pw,
-                    role="player",
-                    first_name=first_name,
-                    last_name=last_name,
-                )
-                new_user = True
-                created_users += 1
-            else:
-                # Ensure role is player; save to trigger signal if role changed
-                updated = False
-                if user.role != "player":
-                    user.role = "player"
-                    updated = True
-                # Keep names up to date if provided
-                if first_name and user.first_name != first_name:
-                    user.first_name = first_name
-                    updated = True
-                if last_name and user.last_name != last_name:
-                    user.last_name = last_name
-                    updated = True
-                if updated:
-                    user.save()
-                existing_attached += 1
-
-            # Ensure Player exists via signal and set position
-            # userprofile always exists due to signal
-            profile = getattr(user, "userprofile", None)
+def _new_usernames(emails: Sequence[str]) -> List[str]:
+    """Usernames for new users: the email's local part, as create_user picks it, numbered where it is taken."""
+    User = get_user_model()
+    bases = [email.split("@")[0] for email in emails]
+    taken: set[str] = set()
+    for batch in _batches(sorted(set(bases)), LOOKUP_BATCH_SIZE):
+        taken.update(User.objects.filter(username__in=batch).values_list("username", flat=True))
+
+    # Numbered variants are only looked up for the names that clash
+    counts = Counter(bases)
+    clashing = sorted(base for base in counts if counts[base] > 1 or base in taken)
+    for batch in _batches(clashing, 100):
+        query = Q()
+        for base in batch:
+            query |= Q(username__startswith=base)
+        taken.update(User.objects.filter(query).values_list("username", flat=True))
+
+    usernames = []
+    for base in bases:
+        username, n = base, 1
+        while username in taken:
+            n += 1
+            username = f"{base}{n}"
+        taken.add(username)
+        usernames.append(username)
+    return usernames
+
+
+def _welcome_emails(users) -> Iterator[dict]:
+    template = get_template('emails/welcome_email.html')
+    for user in users:
+        username = user.username or user.email
+        token = default_token_generator.make_token(user)
+        uid = urlsafe_base64_encode(force_bytes(user.pk))
+        password_set_url = settings.BASE_URL + reverse('password_reset_confirm', kwargs={'uidb64': uid, 'token': token})
+
+        context = {
+            'username': username,
+            'password_set_url': password_set_url,
+        }
+        text_content = f"Hi {username},\n\nYour account has been created. Please set your password by visiting the following link:\n{password_set_url}\n\nThanks,\nThe AUNLeague Team"
+
+        yield {
+            'subject': "Welcome to AUNLeague!",
+            'body': text_content,
+            'html_body': template.render(context),
+            'to': [user.email],
+        }
+
+
+def _attach_existing_users(rows: Sequence[PlayerRow], users: Dict[str, object]) -> None:
+    """Make existing users players, with their names updated from the file, in one bulk update."""
+    changed = []
+    for row in rows:
+        user = users[row.email]
+        before = (user.role, user.first_name, user.last_name)
+        user.role = "player"
+        user.first_name = row.first_name or user.first_name
+        user.last_name = row.last_name or user.last_name
+        if (user.role, user.first_name, user.last_name) != before:
+            # What User.save would set, bulk_update does not call it
+            user.is_staff = user.is_superuser
+            changed.append(user)
+    get_user_model().objects.bulk_update(
+        changed, ["role", "first_name", "last_name", "is_staff"], batch_size=WRITE_BATCH_SIZE
+    )
+
+
+def _create_users(rows: Sequence[PlayerRow]) -> List:
+    """Create the new player users with one insert per batch; they have no usable password until they set one through the welcome link."""
+    User = get_user_model()
+    usernames = _new_usernames([row.email for row in rows])
+    return User.objects.bulk_create(
+        [
+            User(
+                email=row.email,
+                username=username,
+                password=make_password(None),
+                role="player",
+                first_name=row.first_name,
+                last_name=row.last_name,
+            )
+            for row, username in zip(rows, usernames)
+        ],
+        batch_size=WRITE_BATCH_SIZE,
+    )
+
+
+def _ensure_players(rows: Sequence[PlayerRow], users: Dict[str, object], new_users: Sequence) -> List[Player]:
+    """
+    Give every user a profile and a player with the file's position, as the user post_save
+    signal does for users saved one at a time. Returns the players in row order.
+    """
+    players: Dict[str, Player] = {}
+    moved: List[Player] = []
+    linked: List[UserProfile] = []
+    created: List[Player] = []
+    new_profiles: List[UserProfile] = []
+
+    new_emails = {user.email for user in new_users}
+    for row in rows:
+        user = users[row.email]
+        # New users have no profile yet; don't let the reverse accessor query for each one
+        profile = None if row.email in new_emails else getattr(user, "userprofile", None)
+        player = profile.player if profile is not None else None
+        if player is not None:
+            if row.position and player.position != row.position:
+                player.position = row.position
+                moved.append(player)
+        else:
+            player = Player(
+                first_name=row.first_name or user.username or "",
+                last_name=row.last_name or "",
+                position=row.position or "MF",
+            )
+            created.append(player)
             if profile is None:
-                # Safety net: create profile if somehow missing
-                # (Normally created by signal on user save)
-                from users.models import UserProfile  # local import to avoid cycle
-                profile = UserProfile.objects.create(user=user)
-
-            player = profile.player
-            if player is None:
-                # Safety net: create player if somehow missing
-                player = Player.objects.create(
-                    first_name=first_name or (user.username or ""),
-                    last_name=last_name or "",
-                    position=position or "MF",
-                )
-                profile.player = player
-                profile.save(update_fields=["player"])
+                new_profiles.append(UserProfile(user=user, player=player))
             else:
-                # Update position from CSV
-                if position and player.position != position:
-                    player.position = position
-                    player.save(update_fields=["position"])
-
-            # Ensure PSP exists/active
-            PlayerSeasonParticipation.objects.update_or_create(
-                player=player,
-                team=team,
-                league=league,
-                defaults={"is_active": True},
-            )
+                profile.player = player
+                linked.append(profile)
+        players[row.email] = player
+
+    Player.objects.bulk_update(moved, ["position"], batch_size=WRITE_BATCH_SIZE)
+    Player.objects.bulk_create(created, batch_size=WRITE_BATCH_SIZE)
+    # Profiles are saved after their players, so the player ids are set
+    for profile in new_profiles + linked:
+        profile.player_id = profile.player.id
+    UserProfile.objects.bulk_create(new_profiles, batch_size=WRITE_BATCH_SIZE)
+    UserProfile.objects.bulk_update(linked, ["player"], batch_size=WRITE_BATCH_SIZE)
+    return [players[row.email] for row in rows]
+
+
+def _ensure_participations(team: Team, league: League, players: Sequence[Player]) -> None:
+    """Activate the players' existing participations in (team, league) and create the missing ones."""
+    player_ids = [player.id for player in players]
+    participations = PlayerSeasonParticipation.objects.filter(team=team, league=league)
+    existing: set[int] = set()
+    for batch in _batches(player_ids, LOOKUP_BATCH_SIZE):
+        existing.update(participations.filter(player_id__in=batch).values_list("player_id", flat=True))
+        participations.filter(player_id__in=batch, is_active=False).update(is_active=True)
+    PlayerSeasonParticipation.objects.bulk_create(
+        [
+            PlayerSeasonParticipation(player_id=player_id, team=team, league=league, is_active=True)
+            for player_id in player_ids if player_id not in existing
+        ],
+        batch_size=WRITE_BATCH_SIZE,
+    )
+
+
+def import_players_csv_for_team(team: Team, league: League, uploaded_file) -> BulkImportResult:
+    """Validate then atomically import players for a team from CSV.
+
+    Behavior:
+    - Create or update User (role=player); set email and an unusable password only for newly created users.
+    - Ensure each user has a profile and a Player; set Player.position from CSV.
+    - Ensure PlayerSeasonParticipation(team, league) exists/active.
+    - Queue welcome emails for newly created users, sent by the outbox worker after commit.
+    - All-or-nothing: if any error, no DB writes and no emails.
+
+    The file is decoded and validated as it streams. Existing users are looked up
+    with IN queries, and everything is written with bulk inserts and updates, so
+    the number of queries depends on the batch sizes and not on the row count.
+    """
+    # Ensure team is active in league
+    if not TeamSeasonParticipation.objects.filter(team=team, league=league).exists():
+        return BulkImportResult(0, 0, 0, [f"{team.name} is not active in {league}."])
+
+    # Read CSV
+    try:
+        reader = _open_csv(uploaded_file)
+        fieldnames = reader.fieldnames or []
+    except Exception:
+        return BulkImportResult(0, 0, 0, ["Unable to read uploaded file. Ensure it's a CSV encoded in UTF-8."])
+
+    # Header validation
+    missing = [h for h in REQUIRED_HEADERS if h not in fieldnames]
+    if missing:
+        return BulkImportResult(0, 0, 0, [f"Missing columns: {', '.join(missing)}"])
+
+    errors: List[str] = []
+    try:
+        rows = list(iter_player_rows(reader, errors))
+    except csv.Error as e:
+        return BulkImportResult(0, 0, 0, [f"Unable to parse the CSV file: {e}"])
+    if errors:
+        return BulkImportResult(0, 0, 0, errors)
+
+    with transaction.atomic():
+        users = _existing_users([row.email for row in rows])
+        existing_rows = [row for row in rows if row.email in users]
+        new_rows = [row for row in rows if row.email not in users]
+
+        _attach_existing_users(existing_rows, users)
+        new_users = _create_users(new_rows)
+        users.update((user.email, user) for user in new_users)
+
+        players = _ensure_players(rows, users, new_users)
+        _ensure_participations(team, league, players)
+
+        # Queue emails in the import transaction, the outbox worker sends them once it commits
+        enqueue_emails(_welcome_emails(new_users))
 
-            # Queue welcome email only for new users
-            if new_user and plain_pw:
-                username = user.username or user.email
-                notifications.append((user, username, plain_pw))
-
-        # Send emails after commit
-        def _send_all():
-            for user, username, pwd in notifications:
-                token = default_token_generator.make_token(user)
-                uid = urlsafe_base64_encode(force_bytes(user.pk))
-                password_set_url = settings.BASE_URL + reverse('password_reset_confirm', kwargs={'uidb64': uid, 'token': token})
-
-                context = {
-                    'username': username,
-                    'password_set_url': password_set_url,
-                }
-
-                html_content = render_to_string('emails/welcome_email.html', context)
-                text_content = f"Hi {username},\n\nYour account has been created. Please set your password by visiting the following link:\n{password_set_url}\n\nThanks,\nThe AUNLeague Team"
-
-                msg = EmailMultiAlternatives(
-                    subject="Welcome to AUNLeague!",
-                    body=text_content,
-                    from_email=settings.DEFAULT_FROM_EMAIL,
-                    to=[user.email]
-                )
-                msg.attach_alternative(html_content, "text/html")
-                try:
-                    msg.send()
-                except Exception as e:
-                    logger.error(f"Failed to send welcome email to {user.email}: {e}")
-
-        if notifications:
-            transaction.on_commit(_send_all)
-
-    return BulkImportResult(created_users, existing_attached, len(notifications), [])
+    return BulkImportResult(len(new_users), len(existing_rows), len(new_users), [])
@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Iterable, List, Optional, Sequence
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from users.models import OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 50
+MAX_ATTEMPTS = 5
+RETRY_BASE_DELAY = timedelta(minutes=1)
+RETRY_MAX_DELAY = timedelta(hours=1)
+# How long a worker holds the emails it claimed; a worker that dies mid-batch releases them after this
+CLAIM_TIMEOUT = timedelta(minutes=5)
+
+
+@dataclass
+class OutboxRunResult:
+    sent: int = 0
+    retried: int = 0
+    failed: int = 0
+
+
+def _outbound(subject, body, to, html_body="", from_email=None) -> OutboundEmail:
+    return OutboundEmail(
+        subject=subject,
+        body=body,
+        html_body=html_body or "",
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        to=list(to),
+    )
+
+
+def enqueue_email(subject: str, body: str, to: Sequence[str], html_body: str = "", from_email: Optional[str] = None) -> OutboundEmail:
+    """Queue an email for the worker; saved in the caller's transaction, so it is only sent if that commits."""
+    email = _outbound(subject, body, to, html_body, from_email)
+    email.save()
+    return email
+
+
+def enqueue_emails(emails: Iterable[dict]) -> List[OutboundEmail]:
+    """Queue many emails (enqueue_email keyword arguments) with one insert."""
+    return OutboundEmail.objects.bulk_create(_outbound(**email) for email in emails)
+
+
+def retry_delay(attempts: int) -> timedelta:
+    """Exponential backoff after a failed attempt: 1, 2, 4, ... minutes, capped at RETRY_MAX_DELAY."""
+    return min(RETRY_BASE_DELAY * 2 ** max(attempts - 1, 0), RETRY_MAX_DELAY)
+
+
+def claim_batch(batch_size: int = BATCH_SIZE, now=None) -> List[OutboundEmail]:
+    """
+    Take up to `batch_size` due emails for this worker.
+
+    The rows are locked while their next attempt is pushed CLAIM_TIMEOUT ahead, so
+    concurrent workers skip them (SKIP LOCKED where the database supports it).
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        emails = list(
+            OutboundEmail.objects.select_for_update(skip_locked=True)
+            .filter(status=OutboundEmail.Status.PENDING, next_attempt_at__lte=now)
+            .order_by("next_attempt_at", "id")[:batch_size]
+        )
+        if emails:
+            OutboundEmail.objects.filter(id__in=[email.id for email in emails]).update(next_attempt_at=now + CLAIM_TIMEOUT)
+    return emails
+
+
+def _message(email: OutboundEmail, connection) -> EmailMultiAlternatives:
+    message = EmailMultiAlternatives(
+        subject=email.subject,
+        body=email.body,
+        from_email=email.from_email or settings.DEFAULT_FROM_EMAIL,
+        to=email.to,
+        connection=connection,
+    )
+    if email.html_body:
+        message.attach_alternative(email.html_body, "text/html")
+    return message
+
+
+def send_queued_emails(batch_size: int = BATCH_SIZE, now=None, max_attempts: int = MAX_ATTEMPTS) -> OutboxRunResult:
+    """Send one batch of due emails over a single backend connection, scheduling retries for failures."""
+    now = now or timezone.now()
+    result = OutboxRunResult()
+    emails = claim_batch(batch_size, now)
+    if not emails:
+        return result
+
+    sent_ids = []
+    connection = get_connection()
+    try:
+        connection.open()
+        for email in emails:
+            try:
+                _message(email, connection).send()
+            except Exception as e:
+                email.attempts += 1
+                email.last_error = f"{type(e).__name__}: {e}"
+                if email.attempts >= max_attempts:
+                    email.status = OutboundEmail.Status.FAILED
+                    result.failed += 1
+                    logger.error(f"Giving up on email {email.id} to {email.to} after {email.attempts} attempts: {e}")
+                else:
+                    email.next_attempt_at = now + retry_delay(email.attempts)
+                    result.retried += 1
+                    logger.warning(f"Email {email.id} to {email.to} failed, retrying at {email.next_attempt_at}: {e}")
+                email.save(update_fields=["attempts", "last_error", "status", "next_attempt_at"])
+            else:
+                sent_ids.append(email.id)
+    finally:
+        connection.close()
+
+    if sent_ids:
+        OutboundEmail.objects.filter(id__in=sent_ids).update(
+            status=OutboundEmail.Status.SENT, sent_at=timezone.now(), last_error=""
+        )
+    result.sent = len(sent_ids)
+    return result
@@ -1,25 +1,12 @@
-from django.db.models import Q
-from django.utils import timezone
-
 from league.models import (
-    League,
     Match,
-    MatchStatus,
     TeamSeasonParticipation,
-    PlayerSeasonParticipation,
 )
+from league.services import get_next_matches
+from league.utils import get_latest_league, get_league_snapshot
 from users.models import UserProfile
 
 
-def get_latest_league():
-    """Return the latest active league, or fallback to the most recently created league."""
-    latest = (
-        League.objects.filter(is_active=True).order_by('-created_at').first()
-        or League.objects.order_by('-created_at').first()
-    )
-    return latest
-
-
 def build_live_section(latest_league):
     if not latest_league:
         return {
@@ -27,21 +14,14 @@ def build_live_section(latest_league):
             'live_match_events': [],
         }
 
-    live_match = (
-        Match.objects.filter(season=latest_league, status=MatchStatus.LIVE)
-        .select_related('home_team', 'away_team')
-        .order_by('-date')
-        .first()
-    )
-    events = live_match.get_match_events() if live_match else []
-
+    snapshot = get_league_snapshot(latest_league)
     return {
-        'live_match': live_match,
-        'live_match_events': events,
+        'live_match': snapshot.live_match,
+        'live_match_events': snapshot.live_match_events,
     }
 
 
-def build_matches_section(latest_league, upcoming_limit=5, recent_limit=5):
+def build_matches_section(latest_league):
     if not latest_league:
         return {
             'matches': [],
@@ -49,24 +29,22 @@ def build_matches_section(latest_league, upcoming_limit=5, recent_limit=5):
             'recent_results': [],
         }
 
-    base_qs = (
+    snapshot = get_league_snapshot(latest_league)
+    # Full fixture list stays lazy, it is only queried by pages that iterate it
+    matches = (
         Match.objects.filter(season=latest_league)
         .select_related('home_team', 'away_team')
+        .order_by('-date')
     )
 
-    matches = base_qs.order_by('-date')
-
-    upcoming = base_qs.filter(status=MatchStatus.SCHEDULED).order_by('date')[:upcoming_limit]
-    recent = base_qs.filter(status=MatchStatus.FINISHED).order_by('-date')[:recent_limit]
-
     return {
         'matches': matches,
-        'upcoming_matches': upcoming,
-        'recent_results': recent,
+        'upcoming_matches': snapshot.upcoming_matches,
+        'recent_results': snapshot.recent_results,
     }
 
 
-def build_leaders_section(latest_league, leaders_limit=5):
+def build_leaders_section(latest_league):
     if not latest_league:
         return {
             'standings_top': [],
@@ -80,33 +58,18 @@ def build_leaders_section(latest_league, leaders_limit=5):
             'top_player': None,
         }
 
-    standings = (
-        TeamSeasonParticipation.objects.filter(league=latest_league)
-        .select_related('team')
-        .order_by('-points', '-goals_scored', 'goals_conceded')[:leaders_limit]
-    )
-
-    psp_base = (
-        PlayerSeasonParticipation.objects.filter(league=latest_league)
-        .select_related('player', 'team')
-    )
-
-    top_scorers = psp_base.order_by('-goals', '-assists')[:leaders_limit]
-    top_assists = psp_base.order_by('-assists', '-goals')[:leaders_limit]
-    top_clean_sheets = psp_base.filter(player__position='GK').order_by('-clean_sheets')[:leaders_limit]
-
-    context = {
-        'standings_top': standings,
-        'top_team': standings[0] if standings else None,
-        'top_scorers': top_scorers,
-        'top_assists': top_assists,
-        'top_clean_sheets': top_clean_sheets,
-        'top_goal_scorer': psp_base.order_by('-goals', '-assists').first(),
-        'top_assist_provider': psp_base.order_by('-assists', '-goals').first(),
-        'top_clean_sheet': top_clean_sheets[0] if top_clean_sheets else None,
-        'top_player': psp_base.order_by('-goals', '-assists').first(),
+    snapshot = get_league_snapshot(latest_league)
+    return {
+        'standings_top': snapshot.standings_top,
+        'top_team': snapshot.top_team,
+        'top_scorers': snapshot.top_scorers,
+        'top_assists': snapshot.top_assists,
+        'top_clean_sheets': snapshot.top_clean_sheets,
+        'top_goal_scorer': snapshot.top_goal_scorer,
+        'top_assist_provider': snapshot.top_assist_provider,
+        'top_clean_sheet': snapshot.top_clean_sheet,
+        'top_player': snapshot.top_goal_scorer,
     }
-    return context
 
 
 def build_personal_section(user, latest_league, favorite_limit=None):
@@ -122,25 +85,17 @@ def build_personal_section(user, latest_league, favorite_limit=None):
     if favorite_limit:
         fav_qs = fav_qs[:favorite_limit]
 
-    # For each favorite team, compute their next scheduled match in the latest league
+    # For each favorite team, find their next scheduled match in the latest league
     cards = []
+    favorite_teams = fav_qs
     if latest_league:
-        for team in fav_qs:
-            next_match = (
-                Match.objects.filter(
-                    Q(home_team=team) | Q(away_team=team),
-                    season=latest_league,
-                    status=MatchStatus.SCHEDULED,
-                )
-                .select_related('home_team', 'away_team')
-                .order_by('date')
-                .first()
-            )
-            cards.append({'team': team, 'next_match': next_match})
+        favorite_teams = list(fav_qs)
+        next_matches = get_next_matches([team.id for team in favorite_teams], league=latest_league)
+        cards = [{'team': team, 'next_match': next_matches.get(team.id)} for team in favorite_teams]
 
     return {
         'fan_profile': profile,
-        'favorite_teams': fav_qs,
+        'favorite_teams': favorite_teams,
         'favorite_team_cards': cards,
     }
 
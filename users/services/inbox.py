@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Iterable, List, Optional
+
+from django.db.models import Q
+
+from league.services import decode_datetime_cursor, encode_datetime_cursor
+from users.models import Notification
+from users.services.notifications import get_unread_count, publish_unread_deltas_on_commit
+
+INBOX_PAGE_SIZE = 20
+INBOX_MAX_PAGE_SIZE = 100
+
+
+@dataclass
+class InboxPage:
+    """One keyset page of a user's notifications, newest first."""
+    notifications: List[Notification] = field(default_factory=list)
+    next_cursor: Optional[str] = None
+    unread: int = 0
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def get_inbox_page(user, cursor: Optional[str] = None, limit: int = INBOX_PAGE_SIZE, unread_only: bool = False) -> InboxPage:
+    """
+    Load one page of a user's notifications seeking past the cursor's (created_at, id),
+    so every page is one indexed range read however deep it is.
+    """
+    notifications = Notification.objects.filter(user=user)
+    if unread_only:
+        notifications = notifications.filter(is_read=False)
+    position = decode_datetime_cursor(cursor)
+    if position is not None:
+        created_at, notification_id = position
+        notifications = notifications.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=notification_id)
+        )
+    rows = list(notifications.order_by('-created_at', '-id')[:limit + 1])
+
+    page = InboxPage(notifications=rows[:limit], unread=get_unread_count(user.id))
+    if len(rows) > limit:
+        last = page.notifications[-1]
+        page.next_cursor = encode_datetime_cursor(last.created_at, last.id)
+    return page
+
+
+def mark_read(user, notification_ids: Iterable[int]) -> int:
+    """Mark some of a user's notifications read with one UPDATE; returns how many were unread."""
+    updated = Notification.objects.filter(user=user, id__in=list(notification_ids), is_read=False).update(is_read=True)
+    publish_unread_deltas_on_commit({user.id: -updated})
+    return updated
+
+
+def mark_all_read(user) -> int:
+    """Mark every unread notification of a user read with one UPDATE; returns how many there were."""
+    updated = Notification.objects.filter(user=user, is_read=False).update(is_read=True)
+    publish_unread_deltas_on_commit({user.id: -updated})
+    return updated
@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import asyncio
+from collections import Counter
+from functools import partial
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.core.cache import cache
+from django.db import transaction
+
+from users.models import Notification, User
+
+# Group sends awaited at once; bounds the open sends on the channel layer
+PUSH_BATCH_SIZE = 500
+# Counters are adjusted in place; the timeout bounds how long a drifted counter survives
+UNREAD_COUNT_TIMEOUT = 60 * 60 * 24
+
+NotificationItem = Tuple[Union[User, int], dict]
+
+
+def user_group_name(user_id: int) -> str:
+    return f"user_{user_id}"
+
+
+def notification_payload(notification: Notification) -> dict:
+    """A stored Notification as pushed to its user."""
+    return {
+        "type": "notification",
+        "id": notification.pk,
+        "title": notification.title,
+        "message": notification.message,
+        "match_id": notification.match_id,
+        "created_at": notification.created_at.isoformat() if notification.created_at else None,
+    }
+
+
+# --- Unread counters ---
+
+def _unread_count_key(user_id: int) -> str:
+    return f"notifications_unread:{user_id}"
+
+
+def get_unread_count(user_id: int) -> int:
+    """Unread notifications of a user, counted from the database only when the counter is not cached."""
+    key = _unread_count_key(user_id)
+    count = cache.get(key)
+    if count is None:
+        count = Notification.objects.filter(user_id=user_id, is_read=False).count()
+        cache.add(key, count, UNREAD_COUNT_TIMEOUT)
+    return count
+
+
+def apply_unread_deltas(deltas: Dict[int, int]) -> Dict[int, Optional[int]]:
+    """
+    Adjust the cached counters; returns each user's new count, None where it is not
+    cached (counted on read). A counter that drops below zero has drifted, e.g. a
+    delta applied after a recount, so it is dropped and recounted too.
+    """
+    counts = {}
+    for user_id, delta in deltas.items():
+        key = _unread_count_key(user_id)
+        try:
+            count = cache.incr(key, delta)
+        except ValueError:
+            # Not cached, the next read counts it
+            count = None
+        if count is not None and count < 0:
+            cache.delete(key)
+            count = None
+        counts[user_id] = count
+    return counts
+
+
+def unread_payload(delta: int, unread: Optional[int]) -> dict:
+    """Counter change pushed to a user; `unread` is None when the server has no count at hand."""
+    return {"type": "unread", "delta": delta, "unread": unread}
+
+
+def publish_unread_deltas(deltas: Dict[int, int], messages: Sequence[Tuple[int, dict]] = ()) -> None:
+    """Adjust the counters, then push the deltas (and any other `messages`) in one pass."""
+    deltas = {user_id: delta for user_id, delta in deltas.items() if delta}
+    counts = apply_unread_deltas(deltas)
+    push_user_notifications(
+        list(messages) + [(user_id, unread_payload(delta, counts[user_id])) for user_id, delta in deltas.items()]
+    )
+
+
+def forget_unread_count(user_id: int) -> None:
+    """Drop a counter that can no longer be adjusted, the next read counts it from the database."""
+    cache.delete(_unread_count_key(user_id))
+
+
+def publish_unread_deltas_on_commit(deltas: Dict[int, int]) -> None:
+    """Adjust and push unread counters once the current transaction has committed."""
+    if any(deltas.values()):
+        transaction.on_commit(partial(publish_unread_deltas, dict(deltas)))
+
+
+# --- Push ---
+
+async def _group_send_all(channel_layer, messages: Sequence[Tuple[int, dict]]) -> None:
+    for start in range(0, len(messages), PUSH_BATCH_SIZE):
+        await asyncio.gather(*(
+            channel_layer.group_send(user_group_name(user_id), {"type": "notify", "data": payload})
+            for user_id, payload in messages[start:start + PUSH_BATCH_SIZE]
+        ))
+
+
+def push_user_notifications(messages: Iterable[Tuple[int, dict]]) -> None:
+    """Push realtime payloads to many users' groups in one event loop pass."""
+    messages = list(messages)
+    channel_layer = get_channel_layer()
+    if not messages or not channel_layer:
+        return
+    async_to_sync(_group_send_all)(channel_layer, messages)
+
+
+def dispatch_notifications(items: Iterable[NotificationItem]) -> List[Notification]:
+    """
+    Store in-app notifications for many users with one insert; once the transaction commits,
+    their unread counters are adjusted and notifications and counters pushed together.
+
+    `items` are (user or user id, payload) pairs; a payload has `title` and `message`
+    and optionally `match` or `match_id`.
+    """
+    notifications = [
+        Notification(
+            user_id=getattr(user, "pk", user),
+            title=payload["title"],
+            message=payload["message"],
+            match_id=payload.get("match_id", getattr(payload.get("match"), "pk", None)),
+        )
+        for user, payload in items
+    ]
+    if not notifications:
+        return notifications
+    Notification.objects.bulk_create(notifications)
+    messages = [(notification.user_id, notification_payload(notification)) for notification in notifications]
+    deltas = Counter(notification.user_id for notification in notifications)
+    transaction.on_commit(partial(publish_unread_deltas, deltas, messages))
+    return notifications
@@ -1,11 +1,14 @@
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
-from .models import UserProfile, Notification
-from league.models import Coach, CoachRoles, Player, LineupPlayer
+from .models import Notification, UserProfile
+from league.lineups import ADDED, REMOVED, ROLE_CHANGED, lineup_changed
+from league.models import Coach, CoachRoles, Match, MatchStatus, Player
 from django.db import transaction
+from django.db.models import Q
 import logging
-from django.core.mail import send_mail
+from collections import Counter
+from functools import partial
 from django.conf import settings
 
 
@@ -126,93 +129,169 @@ def delete_user_profile_on_player_delete(sender, instance, **kwargs):
             raise
 
 from django.template.loader import render_to_string
-from django.core.mail import EmailMultiAlternatives
+from django.urls import reverse
+from users.services.email_outbox import enqueue_emails
+from users.services.notifications import dispatch_notifications, forget_unread_count, publish_unread_deltas_on_commit
+
+def _lineup_change_notification(change, user, match, match_info, match_url):
+    """Return (notification payload, email kwargs or None) for one player's lineup change; None for moves within a role."""
+    player_name = user.first_name or user.username
+    if change.kind == ADDED:
+        notification = {
+            'title': "You've been selected for a match lineup!",
+            'message': f"You have been selected for the match: {match_info}. Check the lineup for details.",
+            'match': match,
+        }
+        text_content = f"Hi {player_name},\n\nYou have been selected for the match: {match_info}. Please log in to view the full lineup.\n\nView the lineup: {match_url}"
+        subject = "You've Been Selected for a Match Lineup!"
+    elif change.kind == REMOVED:
+        notification = {
+            'title': "You've been removed from a match lineup",
+            'message': f"You have been removed from the lineup for the match: {match_info}.",
+        }
+        text_content = f"Hi {player_name},\n\nYou have been removed from the lineup for the match: {match_info}.\n\nSee the updated lineup: {match_url}"
+        subject = "Lineup Update for Your Upcoming Match"
+    elif change.kind == ROLE_CHANGED:
+        role = "the starting lineup" if change.is_starter else "the bench"
+        return {
+            'title': "Your lineup role has changed",
+            'message': f"You have been moved to {role} for the match: {match_info}.",
+            'match': match,
+        }, None
+    else:
+        return None, None
+
+    context = {
+        'player_name': player_name,
+        'match': match,
+        'added': change.kind == ADDED,
+        'match_url': match_url,
+    }
+    email = {
+        'subject': subject,
+        'body': text_content,
+        'html_body': render_to_string('emails/lineup_notification.html', context),
+        'to': [user.email],
+    }
+    return notification, email
+
+
+@receiver(lineup_changed)
+def send_lineup_change_notifications(sender, lineup, changes, **kwargs):
+    """Notify the players of a lineup change, one notification (and email, when added or removed) per player."""
+    try:
+        # A savepoint, so a failure here leaves the lineup save's transaction usable
+        with transaction.atomic():
+            _send_lineup_change_notifications(lineup, changes)
+    except Exception as e:
+        logger.error(f"Error queueing lineup notifications for lineup {lineup.id}: {e}", exc_info=True)
+
+
+def _send_lineup_change_notifications(lineup, changes):
+    profiles = {
+        profile.player_id: profile.user
+        for profile in UserProfile.objects.filter(
+            player_id__in=[change.player_id for change in changes]
+        ).select_related('user')
+    }
+    if not profiles:
+        return
+    match = Match.objects.select_related('home_team', 'away_team').get(pk=lineup.match_id)
+    match_info = f"{match.home_team} vs {match.away_team} on {match.date.strftime('%Y-%m-%d')}"
+    match_url = settings.BASE_URL + reverse('match_details', args=[match.id])
+
+    notifications, emails = [], []
+    for change in changes:
+        user = profiles.get(change.player_id)
+        if user is None:
+            logger.debug(f"No user profile found for player {change.player_id}. Skipping notification.")
+            continue
+        notification, email = _lineup_change_notification(change, user, match, match_info, match_url)
+        if notification is not None:
+            notifications.append((user, notification))
+        if email is not None:
+            emails.append(email)
+
+    dispatch_notifications(notifications)
+    # Queued, the outbox worker sends them
+    enqueue_emails(emails)
+
+
+def match_audience(match):
+    """Ids of the users following either team of a match or named in one of its lineups."""
+    return set(
+        User.objects.filter(
+            Q(userprofile__favorite_teams__in=[match.home_team_id, match.away_team_id])
+            | Q(userprofile__player__lineupplayer__lineup__match=match)
+        ).values_list('id', flat=True).distinct()
+    )
+
+
+def send_match_status_notifications(match_id, status):
+    """Notify a match's audience that it kicked off (LIVE) or that its result is in (FINISHED)."""
+    match = Match.objects.select_related('home_team', 'away_team').get(pk=match_id)
+    if status == MatchStatus.LIVE:
+        payload = {
+            'title': "Kick-off!",
+            'message': f"{match.home_team} vs {match.away_team} has started.",
+            'match_id': match.pk,
+        }
+    else:
+        payload = {
+            'title': "Full time",
+            'message': f"{match.home_team} {match.home_score} - {match.away_score} {match.away_team}",
+            'match_id': match.pk,
+        }
+    dispatch_notifications((user_id, payload) for user_id in match_audience(match))
 
-@receiver(post_save, sender=LineupPlayer)
-def send_lineup_add_notification(sender, instance, created, **kwargs):
-    """Send notification to player when added to a lineup."""
-    if created:
-        logger.debug(f"send_lineup_add_notification triggered for player {instance.player.id}")
-        try:
-            user = instance.player.userprofile.user
-            logger.debug(f"User found for notification: {user.username}")
-            match_info = f"{instance.lineup.match.home_team} vs {instance.lineup.match.away_team} on {instance.lineup.match.date.strftime('%Y-%m-%d')}"
-            
-            # Create in-app notification
-            Notification.objects.create(
-                user=user,
-                title="You've been selected for a match lineup!",
-                message=f"You have been selected for the match: {match_info}. Check the lineup for details.",
-                match=instance.lineup.match
-            )
 
-            # Prepare email context
-            context = {
-                'player_name': user.first_name or user.username,
-                'match': instance.lineup.match,
-                'added': True,
-                'match_url': settings.BASE_URL + reverse('match_details', args=[instance.lineup.match.id]),
-            }
-            
-            # Render HTML and text versions
-            html_content = render_to_string('emails/lineup_notification.html', context)
-            text_content = f"Hi {context['player_name']},\n\nYou have been selected for the match: {match_info}. Please log in to view the full lineup.\n\nView the lineup: {context['match_url']}"
-
-            # Send email
-            msg = EmailMultiAlternatives(
-                subject="You've Been Selected for a Match Lineup!",
-                body=text_content,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                to=[user.email]
-            )
-            msg.attach_alternative(html_content, "text/html")
-            msg.send()
+def _send_match_status_notifications_safely(match_id, status):
+    try:
+        send_match_status_notifications(match_id, status)
+    except Exception as e:
+        logger.error(f"Error sending status notifications for match {match_id}: {e}", exc_info=True)
 
-        except UserProfile.DoesNotExist:
-            logger.debug(f"No user profile found for player {instance.player.id}. Skipping notification.")
-        except Exception as e:
-            logger.error(f"Error sending lineup add notification for player {instance.player.id}: {e}", exc_info=True)
 
+@receiver(post_save, sender=Match)
+def notify_match_status_change(sender, instance, created, **kwargs):
+    """Queues kick-off and result notifications; they are sent once the status change has committed."""
+    if kwargs.get('raw', False) or created or not instance.has_changed('status'):
+        return
 
-@receiver(post_delete, sender=LineupPlayer)
-def send_lineup_remove_notification(sender, instance, **kwargs):
-    """Send notification to player when removed from a lineup."""
-    logger.debug(f"send_lineup_remove_notification triggered for player {instance.player.id}")
-    try:
-        user = instance.player.userprofile.user
-        logger.debug(f"User found for notification: {user.username}")
-        match_info = f"{instance.lineup.match.home_team} vs {instance.lineup.match.away_team} on {instance.lineup.match.date.strftime('%Y-%m-%d')}"
-
-        # Create in-app notification
-        Notification.objects.create(
-            user=user,
-            title="You've been removed from a match lineup",
-            message=f"You have been removed from the lineup for the match: {match_info}."
-        )
-
-        # Prepare email context
-        context = {
-            'player_name': user.first_name or user.username,
-            'match': instance.lineup.match,
-            'added': False,
-            'match_url': settings.BASE_URL + reverse('match_details', args=[instance.lineup.match.id]),
-        }
+    kicked_off = instance.status == MatchStatus.LIVE and instance.previous('status') == MatchStatus.SCHEDULED
+    if kicked_off or instance.status == MatchStatus.FINISHED:
+        transaction.on_commit(partial(_send_match_status_notifications_safely, instance.pk, instance.status))
 
-        # Render HTML and text versions
-        html_content = render_to_string('emails/lineup_notification.html', context)
-        text_content = f"Hi {context['player_name']},\n\nYou have been removed from the lineup for the match: {match_info}.\n\nSee the updated lineup: {context['match_url']}"
-
-        # Send email
-        msg = EmailMultiAlternatives(
-            subject="Lineup Update for Your Upcoming Match",
-            body=text_content,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            to=[user.email]
-        )
-        msg.attach_alternative(html_content, "text/html")
-        msg.send()
-
-    except UserProfile.DoesNotExist:
-        logger.debug(f"No user profile found for player {instance.player.id}. Skipping notification.")
-    except Exception as e:
-        logger.error(f"Error sending lineup remove notification for player {instance.player.id}: {e}", exc_info=True)
\ No newline at end of file
+
+@receiver(post_save, sender=Notification)
+def count_saved_notification(sender, instance, created, **kwargs):
+    """
+    Counts notifications created one at a time (dispatch_notifications counts its own bulk inserts)
+    and follows edits of is_read or the recipient, e.g. in the admin.
+    """
+    if kwargs.get('raw', False):
+        return
+    if created:
+        if not instance.is_read:
+            publish_unread_deltas_on_commit({instance.user_id: 1})
+        return
+
+    previous = instance.previous_unread()
+    if previous is None:
+        # Nothing to compare with, so the counter is recounted on its next read
+        transaction.on_commit(partial(forget_unread_count, instance.user_id))
+        return
+    previous_user_id, was_read = previous
+    deltas = Counter()
+    if not was_read:
+        deltas[previous_user_id] -= 1
+    if not instance.is_read:
+        deltas[instance.user_id] += 1
+    publish_unread_deltas_on_commit(deltas)
+
+
+@receiver(post_delete, sender=Notification)
+def uncount_deleted_notification(sender, instance, **kwargs):
+    """Takes deleted unread notifications off their user's counter."""
+    if not instance.is_read:
+        publish_unread_deltas_on_commit({instance.user_id: -1})
@@ -0,0 +1,79 @@
+"""
+Benchmarks of the CSV player importer: import a file of N players into a team
+and check that the import stays within a query and time budget, whatever N is.
+"""
+import time
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from league.models import League, Player, PlayerSeasonParticipation, Team, TeamSeasonParticipation
+from users.models import OutboundEmail, UserProfile
+from users.services.bulk_upload import import_players_csv_for_team
+
+FILE_SIZES = [100, 10_000]
+POSITIONS = ['GK', 'DF', 'MF', 'FW']
+# Lookups and writes are batched, so statements only grow with N / batch size. The bound
+# is per row because the backend may cap a batch below WRITE_BATCH_SIZE (SQLite allows
+# 999 parameters per statement, about 60 user rows); row by row it was ~10 queries a row.
+MIN_ROWS_PER_QUERY = 10
+MAX_QUERIES_OVERHEAD = 20
+MAX_SECONDS = 20.0
+
+
+def players_csv(size):
+    lines = ['first_name,last_name,email,position']
+    lines += [f'First{i},Last{i},player{i}@example.com,{POSITIONS[i % len(POSITIONS)]}' for i in range(size)]
+    return SimpleUploadedFile('players.csv', '\n'.join(lines).encode('utf-8'), content_type='text/csv')
+
+
+@pytest.fixture
+def team_league(db):
+    team = Team.objects.create(name='Import FC')
+    league = League.objects.create(year=2025, session='S', is_active=True)
+    TeamSeasonParticipation.objects.create(team=team, league=league)
+    return team, league
+
+
+@pytest.mark.parametrize('size', FILE_SIZES)
+def test_import_stays_within_budget(team_league, size):
+    team, league = team_league
+
+    with CaptureQueriesContext(connection) as queries:
+        start = time.perf_counter()
+        result = import_players_csv_for_team(team, league, players_csv(size))
+        elapsed = time.perf_counter() - start
+
+    assert result.errors == []
+    assert result.created_users == result.emails_sent == size
+    assert len(queries) <= MAX_QUERIES_OVERHEAD + size // MIN_ROWS_PER_QUERY, f'{len(queries)} queries for {size} rows'
+    assert elapsed < MAX_SECONDS, f'import took {elapsed:.3f}s for {size} rows'
+
+    users = get_user_model().objects.filter(role='player')
+    assert users.count() == size
+    assert not users.first().has_usable_password()
+    assert Player.objects.count() == UserProfile.objects.filter(player__isnull=False).count() == size
+    assert PlayerSeasonParticipation.objects.filter(team=team, league=league, is_active=True).count() == size
+    assert OutboundEmail.objects.count() == size
+
+
+def test_reimport_attaches_existing_users(team_league):
+    team, league = team_league
+    User = get_user_model()
+    User.objects.create_user(email='player0@example.com', password='x', role='fan')
+    User.objects.create_user(email='player1@somewhere.org', username='player1', password='x', role='fan')
+    import_players_csv_for_team(team, league, players_csv(3))
+    PlayerSeasonParticipation.objects.filter(player__last_name='Last2').update(is_active=False)
+
+    result = import_players_csv_for_team(team, league, players_csv(5))
+
+    assert (result.created_users, result.existing_attached) == (2, 3)
+    assert User.objects.get(email='player0@example.com').role == 'player'
+    # The second player1 gets a numbered username, as the first one already has it
+    assert User.objects.get(email='player1@example.com').username == 'player12'
+    assert Player.objects.get(last_name='Last3').position == POSITIONS[3]
+    assert PlayerSeasonParticipation.objects.filter(team=team, league=league, is_active=True).count() == 5
+    assert PlayerSeasonParticipation.objects.count() == 5
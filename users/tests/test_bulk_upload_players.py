@@ -6,6 +6,7 @@ from django.core import mail
 from django.contrib.auth import get_user_model
 
 from league.models import Team, League, TeamSeasonParticipation, Player, PlayerSeasonParticipation
+from users.services.email_outbox import send_queued_emails
 
 
 @override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
@@ -52,7 +53,8 @@ class BulkUploadPlayersTests(TestCase):
         self.assertEqual(Player.objects.count(), 2)
         # PSPs created
         self.assertEqual(PlayerSeasonParticipation.objects.filter(team=self.team, league=self.league).count(), 2)
-        # emails sent to both
+        # emails queued for both, delivered by the outbox worker
+        send_queued_emails()
         self.assertEqual(len(mail.outbox), 2)
         self.assertIn('Password:', mail.outbox[0].body)
 
@@ -74,6 +76,7 @@ class BulkUploadPlayersTests(TestCase):
         # PSPs for both
         self.assertEqual(PlayerSeasonParticipation.objects.filter(team=self.team, league=self.league).count(), 2)
         # emails sent only for new user
+        send_queued_emails()
         self.assertEqual(len(mail.outbox), 1)
         self.assertIn('new@example.com', mail.outbox[0].to)
 
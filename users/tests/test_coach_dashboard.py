@@ -0,0 +1,80 @@
+from datetime import date, timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from league.models import (
+    Coach, CoachSeasonParticipation, League, Match, MatchStatus, Player, PlayerSeasonParticipation, Team,
+)
+
+
+User = get_user_model()
+
+# Session, user, profile, coach team, coached teams, summary (3) and players;
+# the latest league and season progress come from the cache once warm
+COACH_DASHBOARD_MAX_QUERIES = 9
+
+
+class CoachDashboardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username="coach", email="coach@example.com", password="pass123", role="coach",
+            birth=date(1985, 5, 10), gender="F",
+        )
+        self.league = League.objects.create(year=2025, session="S", is_active=True)
+        self.team = Team.objects.create(name="Dragons")
+        CoachSeasonParticipation.objects.create(
+            coach=Coach.objects.get(userprofile__user=self.user), team=self.team, league=self.league
+        )
+        now = timezone.now()
+        self.opponents = [Team.objects.create(name=f"Opponent {i}") for i in range(6)]
+        # Oldest first: W, L, D, W (away), W, L (away)
+        scores = [(2, 0), (0, 1), (1, 1), (0, 3), (4, 2), (2, 1)]
+        for i, (opponent, (home, away)) in enumerate(zip(self.opponents, scores)):
+            at_home = i not in (3, 5)
+            Match.objects.create(
+                season=self.league,
+                home_team=self.team if at_home else opponent,
+                away_team=opponent if at_home else self.team,
+                home_score=home, away_score=away,
+                date=now - timedelta(days=10 - i), status=MatchStatus.FINISHED,
+            )
+        self.next_match = Match.objects.create(
+            season=self.league, home_team=self.opponents[0], away_team=self.team,
+            date=now + timedelta(days=2), status=MatchStatus.SCHEDULED,
+        )
+        Match.objects.create(
+            season=self.league, home_team=self.team, away_team=self.opponents[1],
+            date=now + timedelta(days=9), status=MatchStatus.SCHEDULED,
+        )
+        self.client.force_login(self.user)
+
+    def test_dashboard_summary(self):
+        response = self.client.get(reverse('coach_dashboard'))
+        self.assertEqual(response.status_code, 200)
+
+        summary = response.context['team_stats']
+        self.assertEqual((summary.wins, summary.draws, summary.losses), (3, 1, 2))
+        self.assertEqual((summary.goals_scored, summary.goals_conceded), (11, 6))
+        self.assertEqual(summary.form, 'LWWDL')
+        self.assertEqual(response.context['team_progress'], 75)
+        self.assertEqual(response.context['win_ratio'], 50)
+        self.assertEqual(response.context['latest_match'], self.next_match)
+        self.assertEqual(len(response.context['wins']), 2)
+
+    def test_dashboard_query_count_is_capped(self):
+        for i in range(10):
+            player = Player.objects.create(first_name="Squad", last_name=f"Player {i}")
+            PlayerSeasonParticipation.objects.create(player=player, team=self.team, league=self.league)
+
+        self.client.get(reverse('coach_dashboard'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('coach_dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(len(queries), COACH_DASHBOARD_MAX_QUERIES, [q['sql'] for q in queries])
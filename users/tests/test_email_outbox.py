@@ -0,0 +1,101 @@
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.core import mail
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from users.models import OutboundEmail
+from users.services.email_outbox import (
+    CLAIM_TIMEOUT,
+    RETRY_MAX_DELAY,
+    claim_batch,
+    enqueue_email,
+    enqueue_emails,
+    retry_delay,
+    send_queued_emails,
+)
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class EmailOutboxTests(TestCase):
+    def test_enqueue_does_not_send(self):
+        email = enqueue_email('Hello', 'Plain body', ['a@example.com'], html_body='<p>Hello</p>')
+
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(email.status, OutboundEmail.Status.PENDING)
+        self.assertEqual(email.to, ['a@example.com'])
+
+    def test_send_queued_emails_delivers_batch(self):
+        enqueue_email('Hello', 'Plain body', ['a@example.com'], html_body='<p>Hello</p>')
+        enqueue_emails([
+            {'subject': 'Welcome', 'body': 'Hi b', 'to': ['b@example.com']},
+            {'subject': 'Welcome', 'body': 'Hi c', 'to': ['c@example.com']},
+        ])
+
+        with self.assertNumQueries(5):
+            # Claim (savepoint, select, lease update, release) and one update for the sent emails
+            result = send_queued_emails()
+
+        self.assertEqual(result.sent, 3)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(mail.outbox[0].alternatives[0][0], '<p>Hello</p>')
+        self.assertFalse(OutboundEmail.objects.exclude(status=OutboundEmail.Status.SENT).exists())
+        self.assertFalse(OutboundEmail.objects.filter(sent_at__isnull=True).exists())
+        # Nothing left to send
+        self.assertEqual(send_queued_emails().sent, 0)
+
+    def test_batch_size_limits_one_run(self):
+        enqueue_emails({'subject': 'S', 'body': 'B', 'to': [f'u{i}@example.com']} for i in range(5))
+
+        self.assertEqual(send_queued_emails(batch_size=2).sent, 2)
+        self.assertEqual(OutboundEmail.objects.filter(status=OutboundEmail.Status.PENDING).count(), 3)
+
+    def test_claimed_emails_are_leased(self):
+        enqueue_email('Hello', 'Body', ['a@example.com'])
+        now = timezone.now()
+
+        self.assertEqual(len(claim_batch(now=now)), 1)
+        # Another worker finds nothing until the lease expires
+        self.assertEqual(claim_batch(now=now), [])
+        self.assertEqual(len(claim_batch(now=now + CLAIM_TIMEOUT)), 1)
+
+    def test_retry_delay_backs_off(self):
+        self.assertEqual(retry_delay(1), timedelta(minutes=1))
+        self.assertEqual(retry_delay(3), timedelta(minutes=4))
+        self.assertEqual(retry_delay(20), RETRY_MAX_DELAY)
+
+    def test_failed_send_is_retried_then_given_up(self):
+        email = enqueue_email('Hello', 'Body', ['a@example.com'])
+        now = timezone.now()
+
+        with patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=OSError('SMTP down')):
+            result = send_queued_emails(now=now, max_attempts=2)
+            self.assertEqual(result.retried, 1)
+            email.refresh_from_db()
+            self.assertEqual(email.status, OutboundEmail.Status.PENDING)
+            self.assertEqual(email.attempts, 1)
+            self.assertEqual(email.next_attempt_at, now + retry_delay(1))
+            self.assertIn('SMTP down', email.last_error)
+
+            # Not due yet
+            self.assertEqual(send_queued_emails(now=now).retried, 0)
+            result = send_queued_emails(now=email.next_attempt_at, max_attempts=2)
+
+        self.assertEqual(result.failed, 1)
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutboundEmail.Status.FAILED)
+        self.assertEqual(email.attempts, 2)
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_command_drains_outbox(self):
+        enqueue_emails({'subject': 'S', 'body': 'B', 'to': [f'u{i}@example.com']} for i in range(3))
+        out = StringIO()
+
+        call_command('send_queued_emails', '--batch-size', '2', stdout=out)
+
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertIn('Sent 2 emails', out.getvalue())
+        self.assertIn('Sent 1 emails', out.getvalue())
@@ -1,9 +1,10 @@
 from django.test import TestCase
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.utils import timezone
 from datetime import timedelta
 
-from league.models import League, Team, Match, MatchStatus
+from league.models import League, Team, Match, MatchStatus, TeamSeasonParticipation
 from users.models import UserProfile
 from users.services.fan_dashboard import build_fan_dashboard_context
 
@@ -16,6 +17,8 @@ class FavoritesAndDashboardTests(TestCase):
         self.user = User.objects.create_user(email="fan@example.com", password="pass123", username="fan", role="fan")
         # Ensure a profile exists
         self.profile, _ = UserProfile.objects.get_or_create(user=self.user)
+        # Snapshots and the latest league live in the cache, which is not rolled back between tests
+        cache.clear()
 
     def test_userprofile_can_follow_multiple_teams(self):
         t1 = Team.objects.create(name="Team One")
@@ -74,3 +77,46 @@ class FavoritesAndDashboardTests(TestCase):
         self.assertIsNone(ctx.get('latest_league'))
         self.assertEqual(list(ctx.get('upcoming_matches', [])), [])
         self.assertEqual(list(ctx.get('recent_results', [])), [])
+
+    def test_dashboard_query_count_does_not_grow_with_favorites(self):
+        league = League.objects.create(year=2025, session="S", is_active=True)
+        teams = [Team.objects.create(name=f"Team {i}") for i in range(8)]
+        for team in teams:
+            TeamSeasonParticipation.objects.create(team=team, league=league)
+        now = timezone.now()
+        for i, (home, away) in enumerate(zip(teams[::2], teams[1::2])):
+            Match.objects.create(season=league, home_team=home, away_team=away, date=now + timedelta(days=i + 1), status=MatchStatus.SCHEDULED)
+        Match.objects.create(season=league, home_team=teams[0], away_team=teams[1], date=now - timedelta(days=1), status=MatchStatus.FINISHED, home_score=1)
+
+        self.profile.favorite_teams.add(teams[0])
+        build_fan_dashboard_context(self.user)  # builds the league snapshot
+        with self.assertNumQueries(3):
+            ctx = build_fan_dashboard_context(self.user)
+        self.assertEqual(len(ctx['favorite_team_cards']), 1)
+
+        self.profile.favorite_teams.add(*teams)
+        with self.assertNumQueries(3):
+            ctx = build_fan_dashboard_context(self.user)
+        cards = {card['team']: card['next_match'] for card in ctx['favorite_team_cards']}
+        self.assertEqual(len(cards), 8)
+        self.assertEqual(cards[teams[7]].away_team, teams[7])
+        self.assertEqual(ctx['recent_results'][0].home_score, 1)
+        self.assertEqual(ctx['top_team']['team'], teams[0])
+
+    def test_snapshot_is_rebuilt_after_a_match_changes(self):
+        league = League.objects.create(year=2025, session="S", is_active=True)
+        a = Team.objects.create(name="A")
+        b = Team.objects.create(name="B")
+        match = Match.objects.create(season=league, home_team=a, away_team=b, date=timezone.now(), status=MatchStatus.SCHEDULED)
+
+        ctx = build_fan_dashboard_context(self.user)
+        self.assertEqual(ctx['upcoming_matches'], [match])
+        self.assertEqual(ctx['recent_results'], [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            match.status = MatchStatus.FINISHED
+            match.save()
+
+        ctx = build_fan_dashboard_context(self.user)
+        self.assertEqual(ctx['upcoming_matches'], [])
+        self.assertEqual(ctx['recent_results'], [match])
@@ -0,0 +1,159 @@
+import json
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from users.models import Notification
+from users.services.inbox import get_inbox_page, mark_all_read, mark_read
+from users.services.notifications import (
+    apply_unread_deltas, dispatch_notifications, get_unread_count, user_group_name,
+)
+
+IN_MEMORY_LAYER = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYER)
+class InboxTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            username='reader', email='reader@example.com', password='x', role='fan'
+        )
+
+    def notify(self, n):
+        with self.captureOnCommitCallbacks(execute=True):
+            return dispatch_notifications(
+                (self.user, {'title': f'Note {i}', 'message': 'Body'}) for i in range(n)
+            )
+
+    def test_counter_is_cached_and_adjusted(self):
+        self.assertEqual(get_unread_count(self.user.id), 0)
+        notifications = self.notify(3)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(get_unread_count(self.user.id), 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(mark_read(self.user, [notifications[0].id, notifications[0].id]), 1)
+        self.assertEqual(get_unread_count(self.user.id), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertNumQueries(1):
+                self.assertEqual(mark_all_read(self.user), 2)
+        self.assertEqual(get_unread_count(self.user.id), 0)
+        self.assertFalse(Notification.objects.filter(is_read=False).exists())
+
+    def test_single_creates_and_deletes_are_counted(self):
+        get_unread_count(self.user.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            notification = Notification.objects.create(user=self.user, title='One', message='Off')
+        self.assertEqual(get_unread_count(self.user.id), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            notification.delete()
+        self.assertEqual(get_unread_count(self.user.id), 0)
+
+    def test_edits_of_is_read_and_recipient_are_counted(self):
+        other = get_user_model().objects.create_user(
+            username='other', email='other@example.com', password='x', role='fan'
+        )
+        notification = self.notify(2)[0]
+        get_unread_count(other.id)
+
+        # As the admin change form saves it
+        edited = Notification.objects.get(pk=notification.pk)
+        edited.is_read = True
+        with self.captureOnCommitCallbacks(execute=True):
+            edited.save()
+        self.assertEqual(get_unread_count(self.user.id), 1)
+
+        edited.is_read = False
+        edited.user = other
+        with self.captureOnCommitCallbacks(execute=True):
+            edited.save()
+        self.assertEqual((get_unread_count(self.user.id), get_unread_count(other.id)), (1, 1))
+
+        # Built in memory there is nothing to compare with, so the counter is recounted
+        stale = Notification(
+            pk=notification.pk, user=other, title='T', message='M', is_read=True, created_at=notification.created_at
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            stale.save()
+        self.assertEqual(get_unread_count(other.id), 0)
+
+    def test_counter_below_zero_is_recounted(self):
+        self.notify(1)
+        self.assertEqual(get_unread_count(self.user.id), 1)
+
+        # A mark-read delta that lands after the counter was already recounted without the notification
+        self.assertEqual(apply_unread_deltas({self.user.id: -2}), {self.user.id: None})
+        self.assertIsNone(cache.get(f'notifications_unread:{self.user.id}'))
+        self.assertEqual(get_unread_count(self.user.id), 1)
+
+    def test_counter_deltas_are_pushed(self):
+        layer = get_channel_layer()
+        channel = async_to_sync(layer.new_channel)()
+        async_to_sync(layer.group_add)(user_group_name(self.user.id), channel)
+        get_unread_count(self.user.id)
+
+        self.notify(2)
+        messages = [async_to_sync(layer.receive)(channel)['data'] for _ in range(3)]
+        self.assertEqual([message['type'] for message in messages], ['notification', 'notification', 'unread'])
+        self.assertEqual(messages[-1], {'type': 'unread', 'delta': 2, 'unread': 2})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            mark_all_read(self.user)
+        self.assertEqual(async_to_sync(layer.receive)(channel)['data'], {'type': 'unread', 'delta': -2, 'unread': 0})
+
+    def test_inbox_pages_newest_first_without_overlap(self):
+        notifications = self.notify(25)
+        expected = sorted(notifications, key=lambda n: (n.created_at, n.id), reverse=True)
+
+        seen, cursor = [], None
+        while True:
+            page = get_inbox_page(self.user, cursor=cursor, limit=10)
+            seen.extend(page.notifications)
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+
+        self.assertEqual([n.id for n in seen], [n.id for n in expected])
+        self.assertEqual(page.unread, 25)
+
+    def test_inbox_page_query_count(self):
+        self.notify(5)
+        get_unread_count(self.user.id)
+
+        with self.assertNumQueries(1):
+            get_inbox_page(self.user, limit=2, unread_only=True)
+
+    def test_inbox_and_mark_read_views(self):
+        notifications = self.notify(3)
+        self.client.force_login(self.user)
+
+        response = self.client.get(reverse('notification_inbox'), {'limit': 2})
+        data = response.json()
+        self.assertEqual(data['unread'], 3)
+        self.assertEqual(len(data['results']), 2)
+        self.assertIsNotNone(data['next_cursor'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse('mark_notifications_read'),
+                data=json.dumps({'ids': [notifications[0].id]}),
+                content_type='application/json',
+            )
+        self.assertEqual(response.json(), {'updated': 1})
+        self.assertEqual(get_unread_count(self.user.id), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse('mark_notifications_read'), data=json.dumps({'all': True}), content_type='application/json'
+            )
+        self.assertEqual(response.json(), {'updated': 2})
+        self.assertEqual(get_unread_count(self.user.id), 0)
+        self.assertEqual(self.client.get(reverse('mark_notifications_read')).status_code, 405)
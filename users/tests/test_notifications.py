@@ -0,0 +1,103 @@
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from league.lineups import save_lineup
+from league.models import League, Lineup, Match, MatchStatus, PlayerSeasonParticipation, Team
+from users.models import Notification, UserProfile
+from users.services.notifications import dispatch_notifications, user_group_name
+
+IN_MEMORY_LAYER = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYER)
+class NotificationDispatchTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.users = [
+            User.objects.create_user(username=f'fan{i}', email=f'fan{i}@example.com', password='x', role='fan')
+            for i in range(3)
+        ]
+        self.layer = get_channel_layer()
+
+    def subscribe(self, user):
+        channel = async_to_sync(self.layer.new_channel)()
+        async_to_sync(self.layer.group_add)(user_group_name(user.id), channel)
+        return channel
+
+    def test_dispatch_inserts_once_and_pushes_after_commit(self):
+        channels = [self.subscribe(user) for user in self.users]
+        items = [(user, {'title': 'Hello', 'message': f'Hi {user.username}'}) for user in self.users]
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertNumQueries(1):
+                notifications = dispatch_notifications(items)
+            self.assertEqual(len(callbacks), 0)
+
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(Notification.objects.count(), 3)
+        for user, channel, notification in zip(self.users, channels, notifications):
+            message = async_to_sync(self.layer.receive)(channel)
+            self.assertEqual(message['type'], 'notify')
+            self.assertEqual(message['data']['id'], notification.id)
+            self.assertEqual(message['data']['message'], f'Hi {user.username}')
+
+    def test_dispatch_accepts_user_ids(self):
+        dispatch_notifications([(self.users[0].id, {'title': 'T', 'message': 'M'})])
+        self.assertEqual(self.users[0].notifications.get().title, 'T')
+
+    def test_lineup_notifications_are_constant_in_players(self):
+        league = League.objects.create(year=2025, session='S', is_active=True)
+        home, away = Team.objects.create(name='Fanout Home'), Team.objects.create(name='Fanout Away')
+        match = Match.objects.create(
+            season=league, home_team=home, away_team=away,
+            date=timezone.now() + timedelta(days=1), status=MatchStatus.SCHEDULED,
+        )
+        player_ids = []
+        for i in range(12):
+            user = get_user_model().objects.create_user(
+                username=f'fanout{i}', email=f'fanout{i}@example.com', password='x', role='player'
+            )
+            player = UserProfile.objects.get(user=user).player
+            PlayerSeasonParticipation.objects.create(player=player, team=home, league=league)
+            player_ids.append(player.id)
+        lineup = Lineup.objects.create(match=match, team=home)
+
+        with CaptureQueriesContext(connection) as ctx:
+            save_lineup(lineup, player_ids[:11], player_ids[11:])
+
+        inserts = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('INSERT INTO "users_notification"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(Notification.objects.filter(match=match).count(), 12)
+
+    def test_kick_off_and_result_notify_followers(self):
+        league = League.objects.create(year=2025, session='S', is_active=True)
+        home, away = Team.objects.create(name='Status Home'), Team.objects.create(name='Status Away')
+        for user in self.users[:2]:
+            user.userprofile.favorite_teams.add(home if user == self.users[0] else away)
+        match = Match.objects.create(
+            season=league, home_team=home, away_team=away,
+            date=timezone.now(), status=MatchStatus.SCHEDULED,
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            match.status = MatchStatus.LIVE
+            match.save()
+        self.assertEqual(
+            set(Notification.objects.filter(title='Kick-off!').values_list('user_id', flat=True)),
+            {self.users[0].id, self.users[1].id},
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            match.home_score = 2
+            match.status = MatchStatus.FINISHED
+            match.save()
+        result = Notification.objects.filter(title='Full time', user=self.users[0]).get()
+        self.assertEqual(result.message, 'Status Home 2 - 0 Status Away')
+        self.assertFalse(self.users[2].notifications.exists())
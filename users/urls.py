@@ -15,6 +15,8 @@ urlpatterns = [
     path('profile/edit/', views.profile_edit_view, name='profile_edit'),
     path('add_player/', views.add_player_view, name='add_player'),
     path('coming-soon/', views.coming_soon, name='coming_soon'),
+    path('notifications/', views.notification_inbox_view, name='notification_inbox'),
+    path('notifications/read/', views.mark_notifications_read_view, name='mark_notifications_read'),
     path('password_change/', views.CustomPasswordChangeView.as_view(), name='password_change'),
     path('password_change/done/', auth_views.PasswordChangeDoneView.as_view(), name='password_change_done'),
 
@@ -1,22 +1,17 @@
-from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
 from django.db.models import Q
-from league.models import Match, League
+from league.models import Match, MatchStatus
+from league.services import get_team_season_summary
+from league.utils import get_match_counts, get_newest_league
+from users.services.notifications import push_user_notifications
 
 
 def push_user_notification(user_id: int, payload: dict) -> None:
     """Push a realtime notification to a specific user group."""
-    channel_layer = get_channel_layer()
-    if not channel_layer:
-        return
-    async_to_sync(channel_layer.group_send)(
-        f"user_{user_id}",
-        {"type": "notify", "data": payload},
-    )
+    push_user_notifications([(user_id, payload)])
 
 def get_latest_league():
     """Return the most recently created league."""
-    return League.objects.order_by('-created_at').first()
+    return get_newest_league()
 
 
 def get_team_matches(team=None, season=None):
@@ -32,36 +27,31 @@ def get_team_matches(team=None, season=None):
     return matches
 
 
-#Helper function to calculate season progress
-def get_season_progress():
-    matches = get_team_matches()
-    total = matches.count()
-    finished = matches.filter(status="FIN").count()
-    return (round(finished / total,2)) * 100 if total else 0
+def get_progress_counts(team=None, season=None):
+    """Total/finished/live/scheduled match counts of a season (or of one team in it), read from the cached counters."""
+    if not season:
+        season = get_latest_league()
+    if not season:
+        return {'total': 0, MatchStatus.FINISHED: 0, MatchStatus.LIVE: 0, MatchStatus.SCHEDULED: 0}
+    return get_match_counts(season.id, team.id if team else None)
 
-def get_team_season_progress(team):
-    """Calculate a team's current season progress as a percentage."""
-    matches = get_team_matches(team)
-    total = matches.count()
-    finished = matches.filter(status="FIN").count()
-    
-    return (round(finished / total,2)) * 100 if total else 0
 
-def get_matches_completed():
-    matches = get_team_matches()
-    total = matches.count()
-    finished = matches.filter(status="FIN").count()
+def _progress(counts):
+    return round(100 * counts[MatchStatus.FINISHED] / counts['total']) if counts['total'] else 0
 
-    return f'{finished} / {total}'
 
-def get_win_ratio(team):
-    """Calculate a team's win ratio as a percentage."""
-    matches = get_team_matches(team)
-    total = matches.count()
-    if total == 0:
-        return 0
+#Helper function to calculate season progress
+def get_season_progress(season=None):
+    return _progress(get_progress_counts(season=season))
 
-    finished_matches = matches.filter(status="FIN")
-    won_matches = sum(1 for match in finished_matches if match.get_winner() == team)
+def get_team_season_progress(team, season=None):
+    """Calculate a team's current season progress as a percentage."""
+    return _progress(get_progress_counts(team, season))
 
-    return (round(won_matches / total,2)) * 100
\ No newline at end of file
+def get_matches_completed(season=None):
+    counts = get_progress_counts(season=season)
+    return f'{counts[MatchStatus.FINISHED]} / {counts["total"]}'
+
+def get_win_ratio(team):
+    """Calculate a team's win ratio as a percentage of its played matches."""
+    return get_team_season_summary(team, get_latest_league()).win_ratio
@@ -17,9 +17,11 @@ from league.models import (
     PlayerStats,
     Lineup,
 )
+from league.services import get_next_matches, get_team_season_summary
+from league.utils import get_league_standings
 from django.utils import timezone
 
-from .utils import get_season_progress, get_team_season_progress, get_win_ratio, get_matches_completed
+from .utils import get_latest_league, get_season_progress, get_matches_completed
 from .forms import UserRegistrationForm, EmailAuthenticationForm, InvitationRegistrationForm, CustomUserCreationForm, UserAccountForm, UserProfileForm, PlayerCreationForm, PlayerBulkUploadForm
 from django.contrib.auth.forms import PasswordChangeForm
 from content.models import Invitation
@@ -30,7 +32,12 @@ import string
 
 from django.contrib.auth.views import PasswordChangeView, PasswordResetConfirmView
 from django.urls import reverse_lazy, reverse
-from django.core.mail import send_mail
+from users.services.email_outbox import enqueue_email
+from users.services.inbox import INBOX_MAX_PAGE_SIZE, INBOX_PAGE_SIZE, get_inbox_page, mark_all_read, mark_read
+from users.services.notifications import notification_payload
+from django.http import JsonResponse
+from django.views.decorators.http import require_POST
+import json
 from django.template.loader import render_to_string
 from django.contrib.admin.views.decorators import staff_member_required
 
@@ -164,10 +171,11 @@ def admin_dashboard_view(request):
     player_count = Player.objects.all().count()
 
     # Get the season progress
-    season_progress = get_season_progress()
+    latest_league = get_latest_league()
+    season_progress = get_season_progress(latest_league)
 
     #Get the matches completed
-    matches_completed = get_matches_completed()
+    matches_completed = get_matches_completed(latest_league)
 
     #Get the latest match
     latest_match = Match.objects.order_by('-date').first()
@@ -206,7 +214,7 @@ def bulk_upload_players_view(request):
             else:
                 messages.success(
                     request,
-                    f"Users created: {result.created_users}, attached: {result.existing_attached}, emails sent: {result.emails_sent}."
+                    f"Users created: {result.created_users}, attached: {result.existing_attached}, welcome emails queued: {result.emails_sent}."
                 )
                 return redirect('admin_dashboard')
     else:
@@ -222,7 +230,7 @@ def coach_dashboard_view(request):
         return redirect('login')
 
     #Get the coach profile
-    coach_profile = UserProfile.objects.filter(user=request.user).first()
+    coach_profile = UserProfile.objects.filter(user=request.user).select_related('user', 'coach').first()
     logger.info(f"Coach profile: {coach_profile.user if coach_profile else 'None'}")
     logger.info(f"Profile coach: {coach_profile.coach if coach_profile and coach_profile.coach else 'None'}")
     if not coach_profile or not coach_profile.coach:
@@ -230,20 +238,19 @@ def coach_dashboard_view(request):
         messages.error(request, "Coach profile not found.")
 
     #Get the latest league
-    latest_league = League.objects.order_by('-created_at').first()
+    latest_league = get_latest_league()
 
     #Get the coach's team
-    coach_team = CoachSeasonParticipation.objects.filter(coach=coach_profile.coach, league=latest_league).first()
+    coach_team = CoachSeasonParticipation.objects.filter(coach=coach_profile.coach, league=latest_league).select_related('team').first()
     logger.info(f"Coach team: {coach_team.team.name if coach_team else 'None'}")
 
     #Get all teams the coach has coached
-    all_teams = CoachSeasonParticipation.objects.filter(coach=coach_profile.coach).values_list('team__name', flat=True)
-    logger.info(f"All teams for coach {coach_profile.user.username}: {list(all_teams)}")
+    all_teams = list(CoachSeasonParticipation.objects.filter(coach=coach_profile.coach).values_list('team__name', flat=True))
+    logger.info(f"All teams for coach {coach_profile.user.username}: {all_teams}")
 
-    #Get the coach team season participation object
+    #Get the coach team's season summary
     team_stats = None
     upcoming_matches = []
-    completed_matches = []
     latest_completed_match = None
     wins = []
     losses = []
@@ -257,61 +264,37 @@ def coach_dashboard_view(request):
         logger.info(f"Coach team not found for user: {request.user.username}. Dashboard will show limited view.")
         messages.info(request, "You are not currently assigned to a team for this season.")
     else:
-        team_stats = TeamSeasonParticipation.objects.filter(team=coach_team.team, league=latest_league).first()
-        logger.info(f"Team stats: {team_stats} for team {coach_team.team.name if coach_team.team else 'None'} in league {latest_league.year if latest_league else 'None'}")
-
-        # --- New/Modified Query for Upcoming Matches ---
-        now = timezone.now()  # Get the current time in the active timezone     
-        upcoming_matches = Match.objects.filter(
-            Q(home_team=coach_team.team) | Q(away_team=coach_team.team), season=latest_league, status=MatchStatus.SCHEDULED)
-        logger.info(f"Upcoming matches for coach {coach_profile.user.username}: {upcoming_matches.count()} matches found")
-
-
-        #Get all completed matches for the coach's team
-        completed_matches = Match.objects.filter(
-            Q(home_team=coach_team.team) | Q(away_team=coach_team.team), season=latest_league, status=MatchStatus.FINISHED)
-        # Get the latest *completed* match for the coach
-        latest_completed_match = completed_matches.order_by('-date').first()
-        logger.debug(f"Latest completed match for coach {coach_profile.user.username}: {latest_completed_match.id if latest_completed_match else 'None'}")
-
-        #Get all matches won by the coach's team
-        wins = completed_matches.filter(
-            Q(home_team=coach_team.team, home_score__gt=F('away_score')) |
-            Q(away_team=coach_team.team, away_score__gt=F('home_score'))
-        )
-        logger.info(f"Total wins for coach {coach_profile.user.username}: {wins.count()}")
-
-        #Get all matches lost by the coach's team
-        losses = completed_matches.filter(
-            Q(home_team=coach_team.team, home_score__lt=F('away_score')) |
-            Q(away_team=coach_team.team, away_score__lt=F('home_score'))
-        )
-        logger.info(f"Total losses for coach {coach_profile.user.username}: {losses.count()}")
-
-        #Get all matches drawn by the coach's team
-        draws = completed_matches.filter(
-            Q(home_team=coach_team.team, home_score=F('away_score')) |
-            Q(away_team=coach_team.team, away_score=F('home_score'))
+        team_stats = get_team_season_summary(coach_team.team, latest_league)
+        logger.info(
+            f"Team summary for {coach_team.team.name}: {team_stats.wins}W {team_stats.draws}D {team_stats.losses}L, "
+            f"form {team_stats.form or '-'}"
         )
-        logger.info(f"Total draws for coach {coach_profile.user.username}: {draws.count()}")
 
-
-
-        # Get the latest match for the coach
-        latest_match = upcoming_matches.first()
+        upcoming_matches = Match.objects.filter(
+            Q(home_team=coach_team.team) | Q(away_team=coach_team.team), season=latest_league, status=MatchStatus.SCHEDULED
+        ).select_related('home_team', 'away_team').order_by('date')
+
+        # Recent results, split by outcome for the dashboard
+        recent_results = team_stats.recent_results
+        latest_completed_match = recent_results[0] if recent_results else None
+        wins = [match for match in recent_results if match.result == 'W']
+        losses = [match for match in recent_results if match.result == 'L']
+        draws = [match for match in recent_results if match.result == 'D']
+
+        # Get the next match for the coach
+        latest_match = team_stats.next_match
         logger.info(f"Latest match for coach {coach_profile.user.username}: {latest_match.id if latest_match else 'None'}")
         if not latest_match:
             logger.error(f"No matches found for coach: {coach_profile.user.username}")
         
         #Get players from the coach's team
         players = PlayerSeasonParticipation.objects.filter(team=coach_team.team, league=latest_league).select_related('player')[:10]
-        logger.info(f"Players coached by {coach_profile.user.username}: {[player.player.last_name for player in players]}")
-        
-        team_progress = get_team_season_progress(team=coach_team.team)
-        win_ratio = get_win_ratio(team=coach_team.team)
+
+        team_progress = team_stats.progress
+        win_ratio = team_stats.win_ratio
 
     #Tracking Stats
-    season_progress = get_season_progress()
+    season_progress = get_season_progress(latest_league)
 
 
     context = {
@@ -409,7 +392,7 @@ def player_dashboard_view(request):
             .order_by('date')
         )
         
-        next_match = upcoming_matches.first()
+        next_match = get_next_matches([player_team.team_id], league=latest_league).get(player_team.team_id)
         logger.info(
             f"Next match for player {player_profile.user.username}: {getattr(next_match, 'id', None)}"
         )
@@ -456,11 +439,7 @@ def player_dashboard_view(request):
 
 
     # Mini league table
-    team_table = (
-        TeamSeasonParticipation.objects.filter(league=latest_league)
-        .select_related('team')
-        .all()
-    )
+    team_table = get_league_standings(latest_league) if latest_league else []
 
     # Lightweight notifications
     notifications = []
@@ -585,11 +564,11 @@ def create_user_view(request):
                     recipient_list = [user.email]
                     
                     try:
-                        send_mail(subject, plain_message, from_email, recipient_list, html_message=html_message)
-                        messages.success(request, f"User {user.username} created successfully! An email with login details has been sent.")
+                        enqueue_email(subject, plain_message, recipient_list, html_body=html_message, from_email=from_email)
+                        messages.success(request, f"User {user.username} created successfully! An email with login details has been queued for delivery.")
                     except Exception as mail_e:
-                        logger.error(f"Failed to send email to {user.email}: {mail_e}")
-                        messages.warning(request, f"User {user.username} created successfully, but failed to send login details email. Please inform the user manually. Temporary password: {password}")
+                        logger.error(f"Failed to queue email to {user.email}: {mail_e}")
+                        messages.warning(request, f"User {user.username} created successfully, but the login details email could not be queued. Please inform the user manually. Temporary password: {password}")
 
                 return redirect('admin_dashboard')
             except Exception as e:
@@ -735,11 +714,11 @@ def add_player_view(request):
                     recipient_list = [user.email]
                     
                     try:
-                        send_mail(subject, plain_message, from_email, recipient_list, html_message=html_message)
-                        messages.success(request, f"Player {user.first_name} {user.last_name} has been created and added to your team. An email with login details has been sent to {user.email}.")
+                        enqueue_email(subject, plain_message, recipient_list, html_body=html_message, from_email=from_email)
+                        messages.success(request, f"Player {user.first_name} {user.last_name} has been created and added to your team. An email with login details has been queued for delivery to {user.email}.")
                     except Exception as mail_e:
-                        logger.error(f"Failed to send email to {user.email}: {mail_e}")
-                        messages.warning(request, f"Player {user.first_name} {user.last_name} has been created and added to your team, but failed to send login details email. Please inform the player manually. Temporary password: {password}")
+                        logger.error(f"Failed to queue email to {user.email}: {mail_e}")
+                        messages.warning(request, f"Player {user.first_name} {user.last_name} has been created and added to your team, but the login details email could not be queued. Please inform the player manually. Temporary password: {password}")
 
                 return redirect('coach_dashboard')
             except Exception as e:
@@ -751,4 +730,45 @@ def add_player_view(request):
     return render(request, 'add_player.html', {'form': form})
 
 def coming_soon(request):
-    return render(request, 'coming_soon.html')
\ No newline at end of file
+    return render(request, 'coming_soon.html')
+
+@login_required
+def notification_inbox_view(request):
+    """The user's notifications as JSON, one keyset page at a time, with the unread count.
+
+    Query parameters: cursor (next_cursor of the previous page), limit and unread=1.
+    """
+    try:
+        limit = min(max(int(request.GET.get('limit') or INBOX_PAGE_SIZE), 1), INBOX_MAX_PAGE_SIZE)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid limit'}, status=400)
+
+    page = get_inbox_page(
+        request.user,
+        cursor=request.GET.get('cursor'),
+        limit=limit,
+        unread_only=request.GET.get('unread') == '1',
+    )
+    return JsonResponse({
+        'unread': page.unread,
+        'next_cursor': page.next_cursor,
+        'results': [
+            {**notification_payload(notification), 'is_read': notification.is_read}
+            for notification in page.notifications
+        ],
+    })
+
+
+@login_required
+@require_POST
+def mark_notifications_read_view(request):
+    """Mark notifications read: {"ids": [...]} for some, {"all": true} for every unread one."""
+    try:
+        data = json.loads(request.body or '{}')
+        ids = [int(notification_id) for notification_id in data.get('ids', [])]
+    except (ValueError, TypeError, AttributeError):
+        return JsonResponse({'error': 'Invalid data'}, status=400)
+
+    updated = mark_all_read(request.user) if data.get('all') else mark_read(request.user, ids)
+    # The new count reaches the client as an unread delta over the notifications socket
+    return JsonResponse({'updated': updated})